@@ -0,0 +1,336 @@
+"""Shared client of Auth0 Management API."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from auth0.v3.authentication import GetToken
+from auth0.v3.exceptions import Auth0Error
+from auth0.v3.management import Auth0
+from auth0.v3.management.rest import RestClient
+import requests
+from requests.adapters import HTTPAdapter
+
+from api import settings
+from api.cache import TTLCache, user_profile_cache
+
+
+class PooledRestClient(RestClient):
+    """RestClient of Auth0 sending requests through a shared session."""
+
+    def __init__(self, jwt: str, session: requests.Session, timeout: float = 5.0, **kwargs):
+        super().__init__(jwt, timeout=timeout, **kwargs)
+        self.session = session
+
+    def _request(self, method: str, url: str, headers: Optional[Dict] = None, **kwargs):
+        request_headers = self.base_headers.copy()
+        request_headers.update(headers or {})
+        response = self.session.request(method, url, headers=request_headers, timeout=self.timeout, **kwargs)
+        return self._process_response(response)
+
+    def get(self, url, params=None, headers=None):
+        return self._request('GET', url, headers=headers, params=params)
+
+    def post(self, url, data=None, headers=None):
+        return self._request('POST', url, headers=headers, json=data)
+
+    def patch(self, url, data=None, headers=None):
+        return self._request('PATCH', url, headers=headers, json=data)
+
+    def put(self, url, data=None, headers=None):
+        return self._request('PUT', url, headers=headers, json=data)
+
+    def delete(self, url, params=None, data=None, headers=None):
+        return self._request('DELETE', url, headers=headers, params=params or {}, json=data)
+
+
+class Auth0TokenManager:
+    """Cache of Management API token.
+
+    The token is reused until ``refresh_margin`` seconds before it expires,
+    and concurrent callers share a single refresh.
+
+    """
+
+    def __init__(
+        self,
+        fetch_token: Callable[[], Dict],
+        refresh_margin: float,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize token manager.
+
+        Args:
+            fetch_token (Callable[[], Dict]): Returns a response of client credentials grant.
+            refresh_margin (float): Seconds before expiration to refresh the token.
+            timer (Callable[[], float]): Clock used for expiration.
+
+        """
+        self.refresh_margin = refresh_margin
+        self._fetch_token = fetch_token
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and self._timer() < self._expires_at
+
+    def get_token(self) -> str:
+        """Returns a valid token, fetching it if needed.
+
+        Returns:
+            (str): Access token.
+
+        """
+        if self._is_valid():
+            return self._token
+        with self._lock:
+            if not self._is_valid():
+                fetched_at = self._timer()
+                response = self._fetch_token()
+                self._token = response['access_token']
+                self._expires_at = fetched_at + max(0.0, response.get('expires_in', 0) - self.refresh_margin)
+            return self._token
+
+    def invalidate(self):
+        """Discard the cached token."""
+        with self._lock:
+            self._token = None
+
+
+class Auth0ClientManager:
+    """Shared Auth0 client rebuilt only when the token changes."""
+
+    def __init__(
+        self,
+        domain: str,
+        token_manager: Auth0TokenManager,
+        session: requests.Session,
+        timeout: float,
+        protocol: str = 'https',
+    ):
+        """Initialize client manager.
+
+        Args:
+            domain (str): Domain of Auth0.
+            token_manager (Auth0TokenManager)
+            session (requests.Session): Session shared by all requests to Management API.
+            timeout (float): Timeout of requests in seconds.
+            protocol (str): 'http' only for a local stand-in of Auth0.
+
+        """
+        self.domain = domain
+        self.token_manager = token_manager
+        self.session = session
+        self.timeout = timeout
+        self.protocol = protocol
+        self._lock = threading.Lock()
+        self._client: Optional[Auth0] = None
+        self._client_token: Optional[str] = None
+
+    def _build_client(self, token: str) -> Auth0:
+        client = Auth0(self.domain, token)
+        for endpoint in vars(client).values():
+            if isinstance(getattr(endpoint, 'client', None), RestClient):
+                endpoint.client = PooledRestClient(token, session=self.session, timeout=self.timeout)
+            if hasattr(endpoint, 'protocol'):
+                endpoint.protocol = self.protocol
+        return client
+
+    def get_client(self) -> Auth0:
+        """Returns the shared client with a valid token.
+
+        Returns:
+            (Auth0)
+
+        """
+        token = self.token_manager.get_token()
+        with self._lock:
+            if self._client is None or self._client_token != token:
+                self._client = self._build_client(token)
+                self._client_token = token
+            return self._client
+
+
+class _CachedAuth0Error(NamedTuple):
+    """Error of Auth0 kept in the profile cache, raised as a new Auth0Error on each hit."""
+
+    status_code: int
+    error_code: str
+    message: str
+
+
+class AsyncAuth0Users:
+    """Users endpoints of Auth0 called without blocking the event loop.
+
+    Calls including token refreshes run in a bounded thread pool,
+    so at most ``max_workers`` requests to Auth0 are in flight.
+    Profiles are cached, and unknown user ids are cached for ``negative_ttl``.
+
+    """
+
+    def __init__(
+        self,
+        client_manager: Auth0ClientManager,
+        executor: ThreadPoolExecutor,
+        profile_cache: Optional[TTLCache] = None,
+        negative_ttl: float = 0,
+    ):
+        """Initialize endpoints.
+
+        Args:
+            client_manager (Auth0ClientManager)
+            executor (ThreadPoolExecutor): Executor running blocking calls.
+            profile_cache (Optional[TTLCache]): Cache of profiles keyed by user id.
+            negative_ttl (float): Time-to-live of cached 404 errors in seconds.
+
+        """
+        self.client_manager = client_manager
+        self.executor = executor
+        self.profile_cache = profile_cache
+        self.negative_ttl = negative_ttl
+
+    async def _run(self, method: str, **kwargs) -> Any:
+        def call():
+            return getattr(self.client_manager.get_client().users, method)(**kwargs)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, call)
+
+    async def list(self, **kwargs) -> Dict:
+        """List or search users. See auth0.v3.management.users.Users.list."""
+        return await self._run('list', **kwargs)
+
+    async def get(self, id: str, **kwargs) -> Dict:
+        """Get a user. See auth0.v3.management.users.Users.get.
+
+        Only requests without extra arguments go through the profile cache.
+        The returned dict is a copy that callers may modify.
+
+        """
+        if self.profile_cache is None or kwargs:
+            return await self._run('get', id=id, **kwargs)
+
+        cached = self.profile_cache.get(id)
+        if isinstance(cached, _CachedAuth0Error):
+            raise Auth0Error(*cached)
+        if cached is not None:
+            return dict(cached)
+
+        version = self.profile_cache.version
+        try:
+            user = await self._run('get', id=id)
+        except Auth0Error as e:
+            if e.status_code == 404 and self.negative_ttl > 0:
+                self.profile_cache.set(
+                    id,
+                    _CachedAuth0Error(e.status_code, e.error_code, e.message),
+                    version=version,
+                    ttl=self.negative_ttl,
+                )
+            raise
+        self.profile_cache.set(id, user, version=version)
+        return dict(user)
+
+
+def parse_domain(domain: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Split the protocol from a domain of Auth0.
+
+    A domain may start with 'http://' to use a local stand-in of Auth0, e.g. ``http://localhost:8081``.
+
+    Args:
+        domain (Optional[str]): Value of AUTH0_DOMAIN.
+
+    Returns:
+        protocol (str): 'https' unless specified.
+        domain (Optional[str]): Domain without the protocol.
+
+    """
+    if domain:
+        for protocol in ('http', 'https'):
+            prefix = '{}://'.format(protocol)
+            if domain.startswith(prefix):
+                return protocol, domain[len(prefix):].rstrip('/')
+    return 'https', domain
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """Create a session with a connection pool.
+
+    Args:
+        pool_size (int): Maximum number of connections kept per host.
+
+    Returns:
+        (requests.Session)
+
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_client_manager: Optional[Auth0ClientManager] = None
+_client_manager_lock = threading.Lock()
+_async_users: Optional[AsyncAuth0Users] = None
+
+
+def get_auth0_client_manager() -> Auth0ClientManager:
+    """Returns the client manager configured by environment variables.
+
+    Returns:
+        (Auth0ClientManager)
+
+    """
+    global _client_manager
+    with _client_manager_lock:
+        if _client_manager is None:
+            # env variables should be defined docker-compose.yaml or .env or ...
+            protocol, domain = parse_domain(os.environ.get('AUTH0_DOMAIN'))
+            non_interactive_client_id = os.environ.get('AUTH0_CLIENT_ID')
+            non_interactive_client_secret = os.environ.get('AUTH0_CLIENT_SECRET')
+
+            def fetch_token() -> Dict:
+                get_token = GetToken(domain, timeout=settings.AUTH0['TIMEOUT'], protocol=protocol)
+                return get_token.client_credentials(
+                    non_interactive_client_id,
+                    non_interactive_client_secret,
+                    'https://{}/api/v2/'.format(domain),
+                )
+
+            _client_manager = Auth0ClientManager(
+                domain,
+                Auth0TokenManager(fetch_token, settings.AUTH0['TOKEN_REFRESH_MARGIN']),
+                create_session(settings.AUTH0['POOL_SIZE']),
+                settings.AUTH0['TIMEOUT'],
+                protocol=protocol,
+            )
+        return _client_manager
+
+
+def get_async_auth0_users() -> AsyncAuth0Users:
+    """Returns the shared asynchronous users endpoints.
+
+    Returns:
+        (AsyncAuth0Users)
+
+    """
+    global _async_users
+    client_manager = get_auth0_client_manager()
+    with _client_manager_lock:
+        if _async_users is None:
+            _async_users = AsyncAuth0Users(
+                client_manager,
+                ThreadPoolExecutor(
+                    max_workers=settings.AUTH0['MAX_CONCURRENCY'],
+                    thread_name_prefix='auth0',
+                ),
+                profile_cache=user_profile_cache,
+                negative_ttl=settings.USER_PROFILE_CACHE['NEGATIVE_TTL'],
+            )
+        return _async_users
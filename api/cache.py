@@ -0,0 +1,196 @@
+"""In-process caches."""
+
+from collections import OrderedDict
+import time
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+from api import settings
+
+
+class TTLCache:
+    """LRU cache whose entries expire after a time-to-live.
+
+    Every invalidation bumps ``version``. Loaders read the version before
+    querying the database and pass it to ``set`` so that a value loaded
+    before a concurrent invalidation is not stored.
+
+    """
+
+    def __init__(self, max_size: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        """Initialize cache.
+
+        Args:
+            max_size (int): Maximum number of entries. Caching is disabled if 0.
+            ttl (float): Time-to-live of entries in seconds.
+            timer (Callable[[], float]): Clock used for expiration.
+
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self._timer = timer
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns cached value.
+
+        Args:
+            key (Hashable)
+            default (Any): Value returned if the key is missing or expired.
+
+        Returns:
+            (Any)
+
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= self._timer():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None, ttl: Optional[float] = None):
+        """Store value.
+
+        Args:
+            key (Hashable)
+            value (Any)
+            version (Optional[int]): Cache version read before loading the value.
+                The value is discarded if the cache has been invalidated since then.
+            ttl (Optional[float]): Time-to-live overriding the default one.
+
+        """
+        if self.max_size <= 0 or (version is not None and version != self.version):
+            return
+        self._entries[key] = (self._timer() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Remove an entry.
+
+        Args:
+            key (Hashable)
+
+        """
+        self.version += 1
+        self._entries.pop(key, None)
+
+    def invalidate_many(self, keys: Iterable[Hashable]):
+        """Remove entries.
+
+        Args:
+            keys (Iterable[Hashable])
+
+        """
+        self.version += 1
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        self.version += 1
+        self._entries.clear()
+
+
+class GenerationWatermark:
+    """Generation of shared data last seen by this process.
+
+    The generation is checked against the database at most once per interval.
+
+    """
+
+    def __init__(self, check_interval: float, timer: Callable[[], float] = time.monotonic):
+        """Initialize watermark.
+
+        Args:
+            check_interval (float): Minimum seconds between checks.
+            timer (Callable[[], float]): Clock used for intervals.
+
+        """
+        self.check_interval = check_interval
+        self.generation: Optional[int] = None
+        self._timer = timer
+        self._checked_at: Optional[float] = None
+
+    def is_check_due(self) -> bool:
+        """Returns if the generation should be checked now.
+
+        Returns:
+            (bool)
+
+        """
+        return self._checked_at is None or self._timer() - self._checked_at >= self.check_interval
+
+    def update(self, generation: int):
+        """Store the generation checked now.
+
+        Args:
+            generation (int)
+
+        """
+        self.generation = generation
+        self._checked_at = self._timer()
+
+    def advance(self, generation: int):
+        """Store a generation made by this process.
+
+        The generation is stored only if it directly follows the current one.
+        Otherwise changes of other processes may be in between, and a check becomes due.
+
+        Args:
+            generation (int)
+
+        """
+        if self.generation is not None and generation == self.generation + 1:
+            self.update(generation)
+        else:
+            self._checked_at = None
+
+    def reset(self):
+        """Forget the generation."""
+        self.generation = None
+        self._checked_at = None
+
+
+_MISSING = object()
+
+# Compiled policies keyed by user id
+policy_cache = TTLCache(
+    max_size=settings.POLICY_CACHE['MAX_SIZE'],
+    ttl=settings.POLICY_CACHE['TTL'],
+)
+
+# Generation of policy changes reflected in policy_cache
+policy_generation = GenerationWatermark(
+    check_interval=settings.POLICY_CACHE['GENERATION_CHECK_INTERVAL'],
+)
+
+# Profiles of Auth0 users keyed by user id
+user_profile_cache = TTLCache(
+    max_size=settings.USER_PROFILE_CACHE['MAX_SIZE'],
+    ttl=settings.USER_PROFILE_CACHE['TTL'],
+)
+
+# Numbers of roles keyed by search term
+role_count_cache = TTLCache(
+    max_size=settings.ROLE_COUNT_CACHE['MAX_SIZE'],
+    ttl=settings.ROLE_COUNT_CACHE['TTL'],
+)
+
+# Inverted index of database patterns to roles under ROLE_INDEX_KEY
+ROLE_INDEX_KEY = 'role_index'
+role_index_cache = TTLCache(
+    max_size=1,
+    ttl=settings.ROLE_INDEX['TTL'],
+)
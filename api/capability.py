@@ -0,0 +1,220 @@
+"""Signed capability tokens embedding effective permissions of a user.
+
+Tokens are JWTs signed with HS256. Other services verify them with
+``CapabilityVerifier`` or any JWT library and authorize requests locally.
+
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from api.policy import CompiledPolicy
+from api.settings import ActionType
+
+Key = Union[str, bytes]
+
+HEADER = {'alg': 'HS256', 'typ': 'JWT'}
+
+
+class InvalidCapabilityToken(ValueError):
+    """Raised if a capability token is malformed, forged or expired."""
+
+
+def _encode_segment(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _decode_segment(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+def _sign(signing_input: bytes, key: Key) -> bytes:
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, signing_input, hashlib.sha256).digest()
+
+
+def issue_capability_token(
+    user_id: str,
+    pattern_masks: Dict[str, int],
+    key: Key,
+    ttl: float,
+    generation: Optional[int] = None,
+    now: Optional[float] = None,
+) -> str:
+    """Issue a capability token.
+
+    Args:
+        user_id (str)
+        pattern_masks (Dict[str, int]): Masks of permitted actions keyed by database pattern.
+        key (Key): Secret key of HMAC.
+        ttl (float): Seconds until the token expires.
+        generation (Optional[int]): Policy generation the permissions were read at.
+        now (Optional[float]): Current UNIX time.
+
+    Returns:
+        (str): Token.
+
+    """
+    now = time.time() if now is None else now
+    payload = {
+        'sub': user_id,
+        'iat': int(now),
+        'exp': int(now + ttl),
+        'gen': generation,
+        # Names of action bits, so that tokens stay valid if ActionType changes
+        'actions': ActionType.keys(),
+        'permissions': pattern_masks,
+    }
+    signing_input = '{}.{}'.format(
+        _encode_segment(json.dumps(HEADER, separators=(',', ':')).encode()),
+        _encode_segment(json.dumps(payload, separators=(',', ':')).encode()),
+    )
+    return '{}.{}'.format(signing_input, _encode_segment(_sign(signing_input.encode(), key)))
+
+
+def remap_mask(mask: int, action_ids: Sequence[str]) -> int:
+    """Convert a mask whose bits are named by action_ids into a mask of ActionType.
+
+    Args:
+        mask (int)
+        action_ids (Sequence[str]): Action id of each bit. Unknown action ids are ignored.
+
+    Returns:
+        (int)
+
+    """
+    remapped = 0
+    for i, action_id in enumerate(action_ids):
+        if mask & (1 << i) and action_id in ActionType.__members__:
+            remapped |= ActionType[action_id].bit
+    return remapped
+
+
+class Capability:
+    """Permissions of a user read from a verified capability token."""
+
+    def __init__(self, user_id: str, expires_at: int, generation: Optional[int], policy: CompiledPolicy):
+        """Initialize capability.
+
+        Args:
+            user_id (str)
+            expires_at (int): UNIX time the token expires at.
+            generation (Optional[int]): Policy generation the permissions were read at.
+            policy (CompiledPolicy)
+
+        """
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.generation = generation
+        self.policy = policy
+
+    def get_permitted_actions(self, database_id: str) -> List[ActionType]:
+        """Returns permitted actions on the database.
+
+        Args:
+            database_id (str)
+
+        Returns:
+            (List[ActionType])
+
+        """
+        return self.policy.get_permitted_actions(database_id)
+
+    def is_user_permitted_action(self, action: ActionType, database_id: str) -> bool:
+        """Returns if the user has permission for the action on the database.
+
+        Args:
+            action (ActionType)
+            database_id (str)
+
+        Returns:
+            (bool)
+
+        """
+        return self.policy.is_permitted(action, database_id)
+
+    def filter_permitted_databases(self, action: ActionType, database_ids: List[str]) -> Tuple[List[str], List[int]]:
+        """Returns permitted database ids from input list.
+
+        Args:
+            action (ActionType)
+            database_ids (List[str])
+
+        Returns:
+            permitted_database_ids (List[str]): Ids of permitted databases.
+            permitted_indices (List [int]): Indices of permitted databases in input.
+
+        """
+        return self.policy.filter_permitted_databases(action, database_ids)
+
+
+class CapabilityVerifier:
+    """Verifier of capability tokens without any network call."""
+
+    def __init__(self, key: Key, leeway: float = 0, timer: Callable[[], float] = time.time):
+        """Initialize verifier.
+
+        Args:
+            key (Key): Secret key of HMAC shared with the issuer.
+            leeway (float): Seconds of tolerated clock skew.
+            timer (Callable[[], float]): Clock returning UNIX time.
+
+        """
+        self.key = key
+        self.leeway = leeway
+        self._timer = timer
+
+    def verify(self, token: str) -> Capability:
+        """Check the signature and expiry of a token.
+
+        Args:
+            token (str)
+
+        Returns:
+            (Capability)
+
+        Raises:
+            InvalidCapabilityToken: If the token is malformed, forged or expired.
+
+        """
+        try:
+            header_segment, payload_segment, signature_segment = token.split('.')
+            header = json.loads(_decode_segment(header_segment))
+            signature = _decode_segment(signature_segment)
+        except (ValueError, binascii.Error) as e:
+            raise InvalidCapabilityToken('Malformed token: {}'.format(e))
+        if not isinstance(header, dict):
+            raise InvalidCapabilityToken('Malformed token: header is not an object')
+        if header.get('alg') != HEADER['alg']:
+            raise InvalidCapabilityToken('Unsupported algorithm: {}'.format(header.get('alg')))
+
+        signing_input = '{}.{}'.format(header_segment, payload_segment).encode()
+        if not hmac.compare_digest(signature, _sign(signing_input, self.key)):
+            raise InvalidCapabilityToken('Invalid signature')
+
+        try:
+            payload = json.loads(_decode_segment(payload_segment))
+            if not isinstance(payload, dict):
+                raise ValueError('payload is not an object')
+            expires_at = int(payload['exp'])
+            action_ids = payload['actions']
+            pattern_masks = {
+                database_pattern: int(mask) for database_pattern, mask in payload['permissions'].items()
+            }
+            user_id = payload['sub']
+        except (ValueError, binascii.Error, KeyError, TypeError, AttributeError) as e:
+            raise InvalidCapabilityToken('Malformed payload: {}'.format(e))
+        if self._timer() > expires_at + self.leeway:
+            raise InvalidCapabilityToken('Token expired')
+
+        if action_ids != ActionType.keys():
+            pattern_masks = {
+                database_pattern: remap_mask(mask, action_ids) for database_pattern, mask in pattern_masks.items()
+            }
+        return Capability(user_id, expires_at, payload.get('gen'), CompiledPolicy(pattern_masks=pattern_masks))
@@ -1,10 +1,25 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import NoValuesFetched
+from tortoise.expressions import F, Subquery
 from tortoise.models import Model
 from tortoise import fields
+from tortoise.query_utils import Q
+from tortoise.queryset import QuerySet
+from tortoise.transactions import in_transaction
 
+from api import settings
+from api.cache import (
+    ROLE_INDEX_KEY,
+    policy_cache,
+    policy_generation,
+    role_count_cache,
+    role_index_cache,
+)
+from api.policy import CompiledPolicy, RoleIndex, get_pattern_masks
 from api.settings import ActionType
-from api.utils import match_exist_in_databases
+from api.sql_evaluation import filter_permitted_databases_in_sql
 
 
 class UserModel(Model):
@@ -18,6 +33,230 @@ class UserModel(Model):
     def __str__(self):
         return self.name
 
+    async def get_compiled_policy(self) -> CompiledPolicy:
+        """Returns the effective policy compiled from all roles of the user.
+
+        Args:
+            None
+
+        Returns:
+            (CompiledPolicy)
+
+        """
+        policies = await self.get_compiled_policies([self.id])
+        return policies[self.id]
+
+    @classmethod
+    async def get_compiled_policies(cls, user_ids: Iterable[str]) -> Dict[str, CompiledPolicy]:
+        """Returns effective policies of users from materialized effective permissions.
+
+        Args:
+            user_ids (Iterable[str])
+
+        Returns:
+            (Dict[str, CompiledPolicy]): Policies keyed by user id. Unknown users get an empty policy.
+
+        """
+        pattern_masks = await EffectivePermissionModel.load_pattern_masks(user_ids)
+        return {
+            user_id: CompiledPolicy(pattern_masks=user_pattern_masks)
+            for user_id, user_pattern_masks in pattern_masks.items()
+        }
+
+    @classmethod
+    async def get_cached_policies(cls, user_ids: Iterable[str]) -> Dict[str, CompiledPolicy]:
+        """Returns effective policies of users through the policy cache.
+
+        Args:
+            user_ids (Iterable[str])
+
+        Returns:
+            (Dict[str, CompiledPolicy]): Policies keyed by user id.
+
+        """
+        await PolicyChangeModel.sync_policy_cache()
+
+        policies: Dict[str, CompiledPolicy] = {}
+        missing_user_ids: List[str] = []
+        for user_id in set(user_ids):
+            policy = policy_cache.get(user_id)
+            if policy is None:
+                missing_user_ids.append(user_id)
+            else:
+                policies[user_id] = policy
+
+        if missing_user_ids:
+            version = policy_cache.version
+            loaded_policies = await cls.get_compiled_policies(missing_user_ids)
+            for user_id, policy in loaded_policies.items():
+                policy_cache.set(user_id, policy, version=version)
+            policies.update(loaded_policies)
+
+        return policies
+
+    @classmethod
+    async def get_cached_policy(cls, user_id: str) -> CompiledPolicy:
+        """Returns effective policy of the user through the policy cache.
+
+        Args:
+            user_id (str)
+
+        Returns:
+            (CompiledPolicy): Empty policy if the user does not exist.
+
+        """
+        policies = await cls.get_cached_policies([user_id])
+        return policies[user_id]
+
+    @classmethod
+    async def filter_permitted_databases_of_user(
+        cls,
+        user_id: str,
+        action: ActionType,
+        database_ids: List[str],
+    ) -> Tuple[List[str], List[int]]:
+        """Returns permitted database ids from input list.
+
+        Evaluated with the cached policy, or in the database if
+        ``settings.PERMITTED_DATABASES['EVALUATION']`` is 'sql'.
+
+        Args:
+            user_id (str)
+            action (ActionType)
+            database_ids (List[str])
+
+        Returns:
+            permitted_database_ids (List[str]): Ids of permitted databases.
+            permitted_indices (List [int]): Indices of permitted databases in input.
+
+        """
+        if settings.PERMITTED_DATABASES['EVALUATION'] == 'sql':
+            return await filter_permitted_databases_in_sql(user_id, action, database_ids)
+        policy = await cls.get_cached_policy(user_id)
+        return policy.filter_permitted_databases(action, database_ids)
+
+    @classmethod
+    async def get_user_ids_with_role(cls, role_id: int, using_db: Optional[BaseDBAsyncClient] = None) -> List[str]:
+        """Returns ids of users holding the role.
+
+        Args:
+            role_id (int)
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+
+        Returns:
+            (List[str])
+
+        """
+        return await cls.filter(roles__id=role_id).using_db(using_db).values_list('id', flat=True)
+
+    @classmethod
+    async def lock(cls, user_ids: Optional[Iterable[str]], using_db: BaseDBAsyncClient):
+        """Lock rows of users until the end of the running transaction.
+
+        Rows are locked in the order of ids to avoid deadlocks. SQLite serializes
+        transactions by itself and does not support row locks, so nothing is done there.
+
+        Args:
+            user_ids (Optional[Iterable[str]]): None means all users.
+            using_db (BaseDBAsyncClient): Connection of the running transaction.
+
+        """
+        if not using_db.capabilities.support_for_update:
+            return
+        users = cls.all() if user_ids is None else cls.filter(id__in=list(user_ids))
+        await users.select_for_update().using_db(using_db).order_by('id').only('id')
+
+    @classmethod
+    async def get_user_ids_with_roles(
+        cls,
+        role_ids: List[int],
+        search: str = '',
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[str], int]:
+        """Returns a page of ids of users holding any of the roles.
+
+        Args:
+            role_ids (List[int])
+            search (str): Only user ids containing the search term are returned if not empty.
+            offset (int)
+            limit (Optional[int]): All users after the offset if None.
+
+        Returns:
+            user_ids (List[str]): Sorted user ids in the page.
+            number_of_total_users (int): Number of users regardless of the page.
+
+        """
+        if not role_ids:
+            return [], 0
+
+        def filter_users() -> QuerySet:
+            users = cls.filter(id__in=Subquery(cls.filter(roles__id__in=role_ids).values('id')))
+            if search:
+                users = users.filter(id__contains=search)
+            return users
+
+        number_of_total_users = await filter_users().count()
+        users = filter_users().order_by('id')
+        if limit is not None:
+            users = users.offset(offset).limit(limit)
+        return await users.values_list('id', flat=True), number_of_total_users
+
+    @classmethod
+    async def get_role_summaries(cls, user_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Returns id, name and description of roles of users in a single query.
+
+        Args:
+            user_ids (Iterable[str])
+
+        Returns:
+            (Dict[str, List[Dict]]): Roles keyed by user id. Users without roles are omitted.
+
+        """
+        rows = await RoleModel.filter(
+            roles__id__in=list(user_ids),
+        ).order_by('id').values(
+            user_id='roles__id',
+            id='id',
+            name='name',
+            description='description',
+        )
+        role_summaries: Dict[str, List[Dict]] = {}
+        for row in rows:
+            role_summaries.setdefault(row.pop('user_id'), []).append(row)
+        return role_summaries
+
+    async def set_roles(self, roles: List['RoleModel'], using_db: Optional[BaseDBAsyncClient] = None):
+        """Replace roles of the user.
+
+        Only the difference from the current roles is written, in a single transaction.
+        The row of the user is locked until the end of the transaction.
+
+        Args:
+            roles (List[RoleModel])
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+                A new transaction is used if None.
+
+        """
+        if using_db is None:
+            async with in_transaction(self._meta.default_connection) as connection:
+                return await self.set_roles(roles, using_db=connection)
+
+        # Locked before reading the current roles, so that concurrent updates of the user are serialized
+        # and do not deadlock on the locks the inserted rows take on the user
+        await UserModel.lock([self.id], using_db)
+        current_roles = await RoleModel.filter(roles__id=self.id).only('id').using_db(using_db)
+        current_role_ids = {role.id for role in current_roles}
+        new_role_ids = {role.id for role in roles}
+
+        roles_to_remove = [role for role in current_roles if role.id not in new_role_ids]
+        if roles_to_remove:
+            await self.roles.remove(*roles_to_remove, using_db=using_db)
+
+        roles_to_add = [role for role in roles if role.id not in current_role_ids]
+        if roles_to_add:
+            await self.roles.add(*roles_to_add, using_db=using_db)
+
     async def get_permitted_actions(self, database_id: str) -> List[ActionType]:
         """Returns permitted actions for the user on the database.
 
@@ -28,28 +267,8 @@ class UserModel(Model):
             (List[ActionType])
 
         """
-        # Get roles for user
-        await self.fetch_related('roles')
-        roles = self.roles
-
-        # Return empty list if no roles
-        if not roles:
-            return []
-
-        # TODO: Make it faster by memo
-        permitted_actions: Dict[ActionType] = {}
-        for role in roles:
-            for permission in role.permissions:
-                database_patterns = permission['databases']
-                # Check if there's match in database patterns
-                database_match: bool = match_exist_in_databases(database_id, database_patterns)
-                if not database_match:
-                    continue
-                # Add action to permitted_actions
-                for action in permission['action_ids']:
-                    permitted_actions[ActionType[action]] = True
-
-        return permitted_actions.keys()
+        policy = await self.get_compiled_policy()
+        return policy.get_permitted_actions(database_id)
 
     async def is_user_permitted_action(self, action: ActionType, database_id: str) -> bool:
         """Returns if the user has permission for the action on the database.
@@ -62,15 +281,8 @@ class UserModel(Model):
             (bool)
 
         """
-        # Get permitted-actions
-        permitted_actions = await self.get_permitted_actions(database_id)
-
-        # Look over the permitted-actions
-        for permitted_action in permitted_actions:
-            if action.name.startswith(permitted_action.name):
-                return True
-
-        return False
+        policy = await self.get_compiled_policy()
+        return policy.is_permitted(action, database_id)
 
     async def filter_permitted_databases(
         self,
@@ -87,24 +299,619 @@ class UserModel(Model):
             permitted_indices (List [int]): Indices of permitted databases in input.
 
         """
-        permitted_indices = [
-            i
-            for i, database_id in enumerate(database_ids)
-            if await self.is_user_permitted_action(action, database_id)
-        ]
-        permitted_database_ids = [database_ids[i] for i in permitted_indices]
-        return permitted_database_ids, permitted_indices
+        policy = await self.get_compiled_policy()
+        return policy.filter_permitted_databases(action, database_ids)
 
 
 class RoleModel(Model):
     id = fields.IntField(pk=True)
     name = fields.CharField(max_length=255)
     description = fields.TextField(default='')
-    permissions = fields.JSONField(
-        default=[{
-            'databases': [],
-            'action_ids': [],
-        }]
-    )
 
     users: fields.ManyToManyRelation
+    permission_rules: fields.ReverseRelation['PermissionModel']
+
+    # Permissions loaded by fetch_permissions or set_permissions
+    _permissions: Optional[List[Dict]] = None
+
+    @property
+    def permissions(self) -> List[Dict]:
+        """Permissions in the shape of ``RoleBaseSchema``.
+
+        Returns:
+            (List[Dict]): A copy that callers may modify.
+
+        Raises:
+            NoValuesFetched: If permissions have not been loaded.
+
+        """
+        if self._permissions is None:
+            raise NoValuesFetched('Permissions of the role are not loaded. Call RoleModel.fetch_permissions first.')
+        return [
+            {'databases': list(permission['databases']), 'action_ids': list(permission['action_ids'])}
+            for permission in self._permissions
+        ]
+
+    @classmethod
+    async def create(cls, permissions: Optional[List[Dict]] = None, **kwargs) -> 'RoleModel':
+        """Create a role and its permissions in a single transaction.
+
+        Args:
+            permissions (Optional[List[Dict]]): Permissions in the shape of ``RoleBaseSchema``.
+                A rule without databases and actions if None.
+            **kwargs: Fields of the role.
+
+        Returns:
+            (RoleModel)
+
+        """
+        if permissions is None:
+            permissions = [{'databases': [], 'action_ids': []}]
+        using_db = kwargs.pop('using_db', None)
+        if using_db is None:
+            async with in_transaction(cls._meta.default_connection) as connection:
+                return await cls.create(permissions, using_db=connection, **kwargs)
+
+        role = await super().create(using_db=using_db, **kwargs)
+        await role.set_permissions(permissions, using_db=using_db)
+        return role
+
+    async def set_permissions(self, permissions: List[Dict], using_db: Optional[BaseDBAsyncClient] = None):
+        """Replace permissions of the role.
+
+        Args:
+            permissions (List[Dict]): Permissions in the shape of ``RoleBaseSchema``.
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+                A new transaction is used if None.
+
+        """
+        if using_db is None:
+            async with in_transaction(self._meta.default_connection) as connection:
+                return await self.set_permissions(permissions, using_db=connection)
+
+        # Databases and actions of old rules are deleted by cascade
+        await PermissionModel.filter(role_id=self.id).using_db(using_db).delete()
+
+        databases: List[PermissionDatabaseModel] = []
+        actions: List[PermissionActionModel] = []
+        for position, permission in enumerate(permissions):
+            rule = await PermissionModel.create(role_id=self.id, position=position, using_db=using_db)
+            databases.extend(
+                PermissionDatabaseModel(permission_id=rule.id, database_pattern=database_pattern, position=i)
+                for i, database_pattern in enumerate(permission['databases'])
+            )
+            actions.extend(
+                PermissionActionModel(permission_id=rule.id, action_id=action_id, position=i)
+                for i, action_id in enumerate(permission['action_ids'])
+            )
+        if databases:
+            await PermissionDatabaseModel.bulk_create(databases, using_db=using_db)
+        if actions:
+            await PermissionActionModel.bulk_create(actions, using_db=using_db)
+
+        self._permissions = [
+            {'databases': list(permission['databases']), 'action_ids': list(permission['action_ids'])}
+            for permission in permissions
+        ]
+
+    @classmethod
+    async def get_permissions(
+        cls,
+        role_ids: Iterable[int],
+        using_db: Optional[BaseDBAsyncClient] = None,
+    ) -> Dict[int, List[Dict]]:
+        """Returns permissions of roles in three queries regardless of the number of roles.
+
+        Args:
+            role_ids (Iterable[int])
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+
+        Returns:
+            (Dict[int, List[Dict]]): Permissions in the shape of ``RoleBaseSchema`` keyed by role id.
+
+        """
+        role_ids = list(role_ids)
+        permissions: Dict[int, List[Dict]] = {role_id: [] for role_id in role_ids}
+        if not role_ids:
+            return permissions
+
+        rules = await PermissionModel.filter(
+            role_id__in=role_ids,
+        ).using_db(using_db).order_by('role_id', 'position').values('id', 'role_id')
+        permissions_by_rule_id: Dict[int, Dict] = {}
+        for rule in rules:
+            permission = {'databases': [], 'action_ids': []}
+            permissions_by_rule_id[rule['id']] = permission
+            permissions[rule['role_id']].append(permission)
+        if not permissions_by_rule_id:
+            return permissions
+
+        rule_ids = list(permissions_by_rule_id.keys())
+        databases = await PermissionDatabaseModel.filter(
+            permission_id__in=rule_ids,
+        ).using_db(using_db).order_by('position').values('permission_id', 'database_pattern')
+        for database in databases:
+            permissions_by_rule_id[database['permission_id']]['databases'].append(database['database_pattern'])
+
+        actions = await PermissionActionModel.filter(
+            permission_id__in=rule_ids,
+        ).using_db(using_db).order_by('position').values('permission_id', 'action_id')
+        for action in actions:
+            permissions_by_rule_id[action['permission_id']]['action_ids'].append(action['action_id'])
+
+        return permissions
+
+    @classmethod
+    async def fetch_permissions(cls, roles: Iterable['RoleModel']):
+        """Load permissions of roles.
+
+        Args:
+            roles (Iterable[RoleModel])
+
+        """
+        roles = list(roles)
+        permissions = await cls.get_permissions({role.id for role in roles})
+        for role in roles:
+            role._permissions = permissions[role.id]
+
+    @classmethod
+    def search(cls, search: str) -> QuerySet:
+        """Returns roles whose name or description contains the search term.
+
+        Args:
+            search (str): Search term. All roles are returned if empty.
+
+        Returns:
+            (QuerySet)
+
+        """
+        roles = cls.all()
+        if search:
+            roles = roles.filter(Q(name__contains=search) | Q(description__contains=search))
+        return roles
+
+    @classmethod
+    async def get_role_index(cls) -> RoleIndex:
+        """Returns the inverted index of database patterns to roles through the role index cache.
+
+        Args:
+            None
+
+        Returns:
+            (RoleIndex)
+
+        """
+        await PolicyChangeModel.sync_policy_cache()
+        role_index = role_index_cache.get(ROLE_INDEX_KEY)
+        if role_index is None:
+            version = role_index_cache.version
+            databases = await PermissionDatabaseModel.all().values(
+                'permission_id',
+                'database_pattern',
+                role_id='permission__role_id',
+            )
+            actions = await PermissionActionModel.all().values('permission_id', 'action_id')
+            masks: Dict[int, int] = {}
+            for action in actions:
+                mask = ActionType[action['action_id']].bit
+                masks[action['permission_id']] = masks.get(action['permission_id'], 0) | mask
+            role_index = RoleIndex(
+                (database['role_id'], database['database_pattern'], masks.get(database['permission_id'], 0))
+                for database in databases
+            )
+            role_index_cache.set(ROLE_INDEX_KEY, role_index, version=version)
+        return role_index
+
+    @classmethod
+    async def count_cached(cls, search: str) -> int:
+        """Returns number of roles matching the search term through the role count cache.
+
+        Args:
+            search (str)
+
+        Returns:
+            (int)
+
+        """
+        await PolicyChangeModel.sync_policy_cache()
+        number_of_roles = role_count_cache.get(search)
+        if number_of_roles is None:
+            version = role_count_cache.version
+            number_of_roles = await cls.search(search).count()
+            role_count_cache.set(search, number_of_roles, version=version)
+        return number_of_roles
+
+
+class PermissionModel(Model):
+    """Rule of a role permitting actions on databases."""
+    id = fields.IntField(pk=True)
+    role: fields.ForeignKeyRelation[RoleModel] = fields.ForeignKeyField(
+        'models.RoleModel',
+        related_name='permission_rules',
+        index=True,
+    )
+    # Order of rules in the role
+    position = fields.IntField()
+
+    databases: fields.ReverseRelation['PermissionDatabaseModel']
+    actions: fields.ReverseRelation['PermissionActionModel']
+
+
+class PermissionDatabaseModel(Model):
+    """Database pattern of a permission rule."""
+    id = fields.IntField(pk=True)
+    permission: fields.ForeignKeyRelation[PermissionModel] = fields.ForeignKeyField(
+        'models.PermissionModel',
+        related_name='databases',
+        index=True,
+    )
+    database_pattern = fields.CharField(max_length=255, index=True)
+    position = fields.IntField()
+
+
+class PermissionActionModel(Model):
+    """Action id of a permission rule."""
+    id = fields.IntField(pk=True)
+    permission: fields.ForeignKeyRelation[PermissionModel] = fields.ForeignKeyField(
+        'models.PermissionModel',
+        related_name='actions',
+        index=True,
+    )
+    action_id = fields.CharField(max_length=255, index=True)
+    position = fields.IntField()
+
+
+class EffectivePermissionModel(Model):
+    """Effective permissions of users materialized from their roles.
+
+    Rows of users whose permissions may have changed are recomputed when
+    the change is recorded by ``PolicyChangeModel.record``.
+
+    """
+    id = fields.IntField(pk=True)
+    user: fields.ForeignKeyRelation[UserModel] = fields.ForeignKeyField(
+        'models.UserModel',
+        related_name='effective_permissions',
+    )
+    database_pattern = fields.CharField(max_length=255)
+    # Ids of actions permitted on the database pattern. Ids are stored rather than bits of ActionType,
+    # so that adding or reordering actions does not change the meaning of stored rows.
+    action_ids = fields.JSONField()
+
+    class Meta:
+        unique_together = (('user', 'database_pattern'),)
+
+    @classmethod
+    async def compute_pattern_masks(
+        cls,
+        user_ids: Iterable[str],
+        using_db: Optional[BaseDBAsyncClient] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """Returns masks of actions of users computed from their roles.
+
+        Args:
+            user_ids (Iterable[str])
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+
+        Returns:
+            (Dict[str, Dict[str, int]]): Masks keyed by user id and database pattern.
+
+        """
+        user_ids = set(user_ids)
+        rows = await RoleModel.filter(
+            roles__id__in=list(user_ids),
+        ).using_db(using_db).values(user_id='roles__id', role_id='id')
+        permissions = await RoleModel.get_permissions({row['role_id'] for row in rows}, using_db=using_db)
+
+        user_permissions: Dict[str, List[Dict]] = {user_id: [] for user_id in user_ids}
+        for row in rows:
+            user_permissions[row['user_id']].extend(permissions[row['role_id']])
+        return {user_id: get_pattern_masks(permissions) for user_id, permissions in user_permissions.items()}
+
+    @classmethod
+    async def load_pattern_masks(cls, user_ids: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """Returns materialized masks of actions of users.
+
+        Args:
+            user_ids (Iterable[str])
+
+        Returns:
+            (Dict[str, Dict[str, int]]): Masks keyed by user id and database pattern.
+                Unknown users get no masks.
+
+        """
+        user_ids = set(user_ids)
+        rows = await cls.filter(user_id__in=list(user_ids)).values_list('user_id', 'database_pattern', 'action_ids')
+        # Actions removed from settings grant nothing
+        known_action_ids = set(ActionType.keys())
+        pattern_masks: Dict[str, Dict[str, int]] = {user_id: {} for user_id in user_ids}
+        for user_id, database_pattern, action_ids in rows:
+            pattern_masks[user_id][database_pattern] = ActionType.to_mask(
+                ActionType[action_id] for action_id in action_ids if action_id in known_action_ids
+            )
+        return pattern_masks
+
+    @classmethod
+    async def refresh(cls, user_ids: Iterable[str], using_db: Optional[BaseDBAsyncClient] = None):
+        """Recompute effective permissions of users.
+
+        Args:
+            user_ids (Iterable[str])
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+                A new transaction is used if None.
+
+        """
+        if using_db is None:
+            async with in_transaction(cls._meta.default_connection) as connection:
+                return await cls.refresh(user_ids, using_db=connection)
+
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return
+        # Concurrent refreshes of the same users wait here, so that rows are not inserted twice
+        await UserModel.lock(user_ids, using_db)
+        pattern_masks = await cls.compute_pattern_masks(user_ids, using_db=using_db)
+        await cls.filter(user_id__in=user_ids).using_db(using_db).delete()
+        effective_permissions = [
+            cls(
+                user_id=user_id,
+                database_pattern=database_pattern,
+                action_ids=[action.name for action in ActionType.from_mask(action_mask)],
+            )
+            for user_id, user_pattern_masks in pattern_masks.items()
+            for database_pattern, action_mask in user_pattern_masks.items()
+        ]
+        if effective_permissions:
+            await cls.bulk_create(effective_permissions, using_db=using_db)
+
+    @classmethod
+    async def rebuild(cls, using_db: Optional[BaseDBAsyncClient] = None):
+        """Recompute effective permissions of all users from scratch.
+
+        Args:
+            using_db (Optional[BaseDBAsyncClient]): Connection of the running transaction.
+                A new transaction is used if None.
+
+        """
+        if using_db is None:
+            async with in_transaction(cls._meta.default_connection) as connection:
+                return await cls.rebuild(using_db=connection)
+
+        await UserModel.lock(None, using_db)
+        await cls.all().using_db(using_db).delete()
+        user_ids = await UserModel.filter(
+            roles__id__isnull=False,
+        ).distinct().using_db(using_db).values_list('id', flat=True)
+        await cls.refresh(user_ids, using_db=using_db)
+
+
+class PolicyGenerationModel(Model):
+    """Counter of policy generations, a single row.
+
+    Changes take their ids from the counter. Incrementing it locks the row until the transaction ends,
+    so changes are committed in the order of their ids and readers never skip a change committed late.
+
+    """
+    id = fields.IntField(pk=True)
+    generation = fields.IntField(default=0)
+
+    @classmethod
+    async def advance(cls, using_db: BaseDBAsyncClient) -> int:
+        """Increment the generation in the running transaction.
+
+        Concurrent transactions wait here until the transaction ends.
+
+        Args:
+            using_db (BaseDBAsyncClient): Connection of the running transaction.
+
+        Returns:
+            (int): New generation.
+
+        """
+        updated = await cls.filter(id=1).using_db(using_db).update(generation=F('generation') + 1)
+        if not updated:
+            # The row is inserted by the migration, or on the first change of a database created by generate_schemas
+            generation = await PolicyChangeModel.get_generation(using_db)
+            await cls.create(id=1, generation=generation + 1, using_db=using_db)
+        return (await cls.get(id=1).using_db(using_db)).generation
+
+
+class PolicyChangeModel(Model):
+    """Log of changes in roles and role assignments.
+
+    The largest id is the policy generation shared by all processes.
+    Ids are taken from ``PolicyGenerationModel``, so they increase in the order of commits.
+
+    """
+    id = fields.IntField(pk=True)
+    # Users whose permissions may have changed. None means all users.
+    user_ids = fields.JSONField(null=True)
+    # Roles created, updated or deleted
+    role_ids = fields.JSONField(default=list)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    @classmethod
+    async def record(cls, user_ids: Optional[Iterable[str]], role_ids: Iterable[int] = ()) -> int:
+        """Record a change, refresh effective permissions and invalidate caches of this process.
+
+        Effective permissions of the users are recomputed, and cached policies,
+        role counts and role index are invalidated.
+
+        Args:
+            user_ids (Optional[Iterable[str]]): Users whose permissions may have changed.
+                None means all users.
+            role_ids (Iterable[int]): Roles created, updated or deleted.
+
+        Returns:
+            (int): New policy generation.
+
+        """
+        async with in_transaction(cls._meta.default_connection) as connection:
+            change = await cls.write(user_ids, role_ids, using_db=connection)
+        change.invalidate_caches()
+        return change.id
+
+    @classmethod
+    async def write(
+        cls,
+        user_ids: Optional[Iterable[str]],
+        role_ids: Iterable[int],
+        using_db: BaseDBAsyncClient,
+    ) -> 'PolicyChangeModel':
+        """Log a change and refresh effective permissions in the transaction that made the change.
+
+        ``invalidate_caches`` must be called on the returned change after the transaction is committed.
+
+        Args:
+            user_ids (Optional[Iterable[str]]): Users whose permissions may have changed.
+                None means all users.
+            role_ids (Iterable[int]): Roles created, updated or deleted.
+            using_db (BaseDBAsyncClient): Connection of the running transaction.
+
+        Returns:
+            (PolicyChangeModel)
+
+        """
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        if user_ids is None:
+            await EffectivePermissionModel.rebuild(using_db=using_db)
+        else:
+            await EffectivePermissionModel.refresh(user_ids, using_db=using_db)
+        generation = await PolicyGenerationModel.advance(using_db)
+        return await cls.create(id=generation, user_ids=user_ids, role_ids=list(role_ids), using_db=using_db)
+
+    def invalidate_caches(self):
+        """Invalidate cached policies, role counts and role index of this process changed by this change."""
+        role_count_cache.clear()
+        role_index_cache.clear()
+        if self.user_ids is None:
+            policy_cache.clear()
+        else:
+            policy_cache.invalidate_many(self.user_ids)
+        policy_generation.advance(self.id)
+
+    @classmethod
+    async def get_generation(cls, using_db: Optional[BaseDBAsyncClient] = None) -> int:
+        """Returns the current policy generation.
+
+        Args:
+            using_db (Optional[BaseDBAsyncClient]): Connection of a running transaction.
+
+        Returns:
+            (int): 0 if nothing has been changed.
+
+        """
+        generations = await cls.all().using_db(using_db).order_by('-id').limit(1).values_list('id', flat=True)
+        return generations[0] if generations else 0
+
+    @classmethod
+    async def get_cached_generation(cls) -> int:
+        """Returns the policy generation reflected in caches of this process.
+
+        The database is queried at most once per ``settings.POLICY_CACHE['GENERATION_CHECK_INTERVAL']``
+        unless the caches are disabled.
+
+        Returns:
+            (int)
+
+        """
+        await cls.sync_policy_cache()
+        if policy_generation.generation is None:
+            return await cls.get_generation()
+        return policy_generation.generation
+
+    @classmethod
+    async def sync_policy_cache(cls, force: bool = False):
+        """Invalidate cached policies, role counts and role index changed by other processes.
+
+        The generation is checked at most once per
+        ``settings.POLICY_CACHE['GENERATION_CHECK_INTERVAL']`` unless forced.
+
+        Args:
+            force (bool): Check regardless of the interval.
+
+        """
+        caches = (policy_cache, role_count_cache, role_index_cache)
+        caches_enabled = any(cache.max_size > 0 for cache in caches)
+        if not caches_enabled or not (force or policy_generation.is_check_due()):
+            return
+
+        # Cached values cannot be trusted until the first check
+        if policy_generation.generation is None:
+            generation = await cls.get_generation()
+            for cache in caches:
+                cache.clear()
+            policy_generation.update(generation)
+            return
+
+        changes = await cls.filter(
+            id__gt=policy_generation.generation,
+        ).order_by('id').values('id', 'user_ids')
+        if not changes:
+            policy_generation.update(policy_generation.generation)
+            return
+
+        role_count_cache.clear()
+        role_index_cache.clear()
+        if any(change['user_ids'] is None for change in changes):
+            policy_cache.clear()
+        else:
+            policy_cache.invalidate_many(
+                user_id for change in changes for user_id in change['user_ids']
+            )
+        policy_generation.update(changes[-1]['id'])
+
+    @classmethod
+    async def get_snapshot(cls, since: Optional[int] = None) -> Dict:
+        """Returns roles and role assignments for evaluation outside of this service.
+
+        The document is loaded by ``api.snapshot.PolicySnapshotEvaluator``.
+        The version is read before the data, so a document may contain changes newer than its version,
+        which are applied again by the next delta.
+
+        Args:
+            since (Optional[int]): Version held by the client. Only roles and users changed
+                after the version are returned if the changes are known.
+
+        Returns:
+            (Dict): Snapshot document.
+
+        """
+        version = await cls.get_generation()
+        changes = []
+        if since is not None and 0 < since <= version:
+            changes = await cls.filter(id__gt=since).order_by('id').values('user_ids', 'role_ids')
+        full = since is None or not 0 < since <= version or any(change['user_ids'] is None for change in changes)
+
+        if full:
+            roles = await RoleModel.all().order_by('id')
+            user_roles = await RoleModel.filter(
+                roles__id__isnull=False,
+            ).order_by('id').values(user_id='roles__id', role_id='id')
+            user_ids = []
+        else:
+            changed_role_ids = sorted({role_id for change in changes for role_id in change['role_ids']})
+            user_ids = sorted({user_id for change in changes for user_id in change['user_ids']})
+            roles = await RoleModel.filter(id__in=changed_role_ids).order_by('id')
+            user_roles = await RoleModel.filter(
+                roles__id__in=user_ids,
+            ).order_by('id').values(user_id='roles__id', role_id='id')
+        await RoleModel.fetch_permissions(roles)
+
+        # Users in the delta without roles left are sent with an empty list
+        role_ids_by_user_id: Dict[str, List[int]] = {user_id: [] for user_id in user_ids}
+        for row in user_roles:
+            role_ids_by_user_id.setdefault(row['user_id'], []).append(row['role_id'])
+
+        existing_role_ids = {role.id for role in roles}
+        return {
+            'version': version,
+            'since': None if full else since,
+            'full': full,
+            'roles': [{'role_id': role.id, 'permissions': role.permissions} for role in roles],
+            'deleted_role_ids': [] if full else [
+                role_id for role_id in changed_role_ids if role_id not in existing_role_ids
+            ],
+            'user_roles': role_ids_by_user_id,
+        }
@@ -0,0 +1,298 @@
+"""Compiled permission policies."""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api.settings import ActionType
+from api.utils import DatabasePatternMatcher, get_database_pattern_matcher
+
+WILDCARD_CHARACTERS = frozenset('*?[')
+
+
+def is_literal_pattern(database_pattern: str) -> bool:
+    """Check if the database pattern contains no wildcard.
+
+    Args:
+        database_pattern (str)
+
+    Returns:
+        (bool)
+
+    """
+    return not WILDCARD_CHARACTERS.intersection(database_pattern)
+
+
+def is_prefix_pattern(database_pattern: str) -> bool:
+    """Check if the database pattern is a literal prefix followed by a single '*'.
+
+    Args:
+        database_pattern (str)
+
+    Returns:
+        (bool)
+
+    """
+    return database_pattern.endswith('*') and is_literal_pattern(database_pattern[:-1])
+
+
+def get_pattern_masks(permissions: Iterable[Dict]) -> Dict[str, int]:
+    """Returns masks of actions permitted by permissions keyed by database pattern.
+
+    Args:
+        permissions (Iterable[Dict]): Permissions in the shape of ``RoleModel.permissions``.
+
+    Returns:
+        (Dict[str, int]): Patterns without permitted actions are omitted.
+
+    """
+    pattern_masks: Dict[str, int] = {}
+    for permission in permissions:
+        mask = ActionType.to_mask(ActionType[action] for action in permission['action_ids'])
+        if not mask:
+            continue
+        for database_pattern in permission['databases']:
+            pattern_masks[database_pattern] = pattern_masks.get(database_pattern, 0) | mask
+    return pattern_masks
+
+
+def merge_pattern_masks(*pattern_masks_list: Dict[str, int]) -> Dict[str, int]:
+    """Merge masks of actions keyed by database pattern.
+
+    Args:
+        *pattern_masks_list (Dict[str, int])
+
+    Returns:
+        (Dict[str, int])
+
+    """
+    merged: Dict[str, int] = {}
+    for pattern_masks in pattern_masks_list:
+        for database_pattern, mask in pattern_masks.items():
+            if mask:
+                merged[database_pattern] = merged.get(database_pattern, 0) | mask
+    return merged
+
+
+class CompiledPolicy:
+    """Effective policy of a user compiled from all the user's roles.
+
+    Database patterns are split into exact database ids (hash lookup),
+    prefix wildcards such as ``project-*`` (lookup by prefix length) and
+    other glob patterns (a single combined pattern matcher).
+
+    """
+
+    def __init__(
+        self,
+        permissions: Iterable[Dict] = (),
+        pattern_masks: Optional[Dict[str, int]] = None,
+    ):
+        """Compile permissions.
+
+        Args:
+            permissions (Iterable[Dict]): Permissions in the shape of ``RoleModel.permissions``.
+            pattern_masks (Optional[Dict[str, int]]): Masks of actions keyed by database pattern,
+                merged with permissions.
+
+        """
+        pattern_masks = merge_pattern_masks(get_pattern_masks(permissions), pattern_masks or {})
+        exact: Dict[str, int] = {}
+        prefixes: Dict[str, int] = {}
+        globs: Dict[str, int] = {}
+        for database_pattern, mask in pattern_masks.items():
+            if is_literal_pattern(database_pattern):
+                exact[database_pattern] = mask
+            elif is_prefix_pattern(database_pattern):
+                prefix = database_pattern[:-1]
+                prefixes[prefix] = prefixes.get(prefix, 0) | mask
+            else:
+                globs[database_pattern] = mask
+
+        self._exact: Dict[str, int] = exact
+        self._prefixes: Dict[str, int] = prefixes
+        self._prefix_lengths: List[int] = sorted({len(prefix) for prefix in prefixes})
+        self._glob_matcher: DatabasePatternMatcher = get_database_pattern_matcher(tuple(globs.keys()))
+        self._glob_masks: List[int] = list(globs.values())
+
+    @classmethod
+    def from_roles(cls, roles: Iterable) -> 'CompiledPolicy':
+        """Compile policy from roles.
+
+        Args:
+            roles (Iterable[RoleModel]): Roles whose permissions are loaded.
+
+        Returns:
+            (CompiledPolicy)
+
+        """
+        return cls(permission for role in roles for permission in role.permissions)
+
+    def __bool__(self) -> bool:
+        return bool(self._exact or self._prefixes or self._glob_masks)
+
+    def get_permitted_mask(self, database_id: str) -> int:
+        """Returns mask of actions explicitly permitted on the database.
+
+        Args:
+            database_id (str)
+
+        Returns:
+            (int): Mask of ActionType bits.
+
+        """
+        mask = self._exact.get(database_id, 0)
+
+        for length in self._prefix_lengths:
+            if length > len(database_id):
+                break
+            mask |= self._prefixes.get(database_id[:length], 0)
+
+        if self._glob_masks:
+            for i in self._glob_matcher.matched_indices(database_id):
+                mask |= self._glob_masks[i]
+
+        return mask
+
+    def get_permitted_actions(self, database_id: str) -> List[ActionType]:
+        """Returns permitted actions on the database.
+
+        Args:
+            database_id (str)
+
+        Returns:
+            (List[ActionType]): Permitted actions in the order of ActionType.
+
+        """
+        return ActionType.from_mask(self.get_permitted_mask(database_id))
+
+    def is_permitted(self, action: ActionType, database_id: str) -> bool:
+        """Returns if the action on the database is permitted.
+
+        Args:
+            action (ActionType)
+            database_id (str)
+
+        Returns:
+            (bool)
+
+        """
+        return action.is_permitted_by(self.get_permitted_mask(database_id))
+
+    def filter_permitted_databases(
+        self,
+        action: ActionType,
+        database_ids: List[str],
+    ) -> Tuple[List[str], List[int]]:
+        """Returns permitted database ids from input list.
+
+        Only patterns granting the action are kept, so each database id is
+        checked by a set lookup, a few prefix lookups and at most one regex scan.
+
+        Args:
+            action (ActionType)
+            database_ids (List[str])
+
+        Returns:
+            permitted_database_ids (List[str]): Ids of permitted databases.
+            permitted_indices (List [int]): Indices of permitted databases in input.
+
+        """
+        granting_mask = action.implied_by_mask
+        exact = {database_id for database_id, mask in self._exact.items() if mask & granting_mask}
+        prefixes = {prefix for prefix, mask in self._prefixes.items() if mask & granting_mask}
+        prefix_lengths = sorted({len(prefix) for prefix in prefixes})
+        glob_matcher = get_database_pattern_matcher(tuple(
+            database_pattern
+            for database_pattern, mask in zip(self._glob_matcher.database_patterns, self._glob_masks)
+            if mask & granting_mask
+        ))
+
+        permitted_database_ids: List[str] = []
+        permitted_indices: List[int] = []
+        if not (exact or prefixes or len(glob_matcher)):
+            return permitted_database_ids, permitted_indices
+
+        for i, database_id in enumerate(database_ids):
+            if database_id in exact:
+                permitted = True
+            else:
+                permitted = any(database_id[:length] in prefixes for length in prefix_lengths)
+                if not permitted and len(glob_matcher):
+                    permitted = glob_matcher.matches(database_id)
+            if permitted:
+                permitted_database_ids.append(database_id)
+                permitted_indices.append(i)
+
+        return permitted_database_ids, permitted_indices
+
+
+class RoleIndex:
+    """Inverted index from database ids to roles granting actions.
+
+    Literal database patterns are looked up by the database id. Other patterns are
+    grouped by their literal prefix before the first wildcard, so only patterns
+    whose prefix is a prefix of the database id are matched.
+
+    """
+
+    def __init__(self, grants: Iterable[Tuple[int, str, int]]):
+        """Build index.
+
+        Args:
+            grants (Iterable[Tuple[int, str, int]]): Role id, database pattern and mask of actions.
+
+        """
+        exact: Dict[str, Dict[int, int]] = {}
+        prefixes: Dict[str, Dict[Tuple[int, str], int]] = {}
+        for role_id, database_pattern, mask in grants:
+            if not mask:
+                continue
+            if is_literal_pattern(database_pattern):
+                role_masks = exact.setdefault(database_pattern, {})
+                role_masks[role_id] = role_masks.get(role_id, 0) | mask
+            else:
+                prefix = database_pattern[:min(
+                    database_pattern.find(c) for c in WILDCARD_CHARACTERS if c in database_pattern
+                )]
+                pattern_masks = prefixes.setdefault(prefix, {})
+                key = (role_id, database_pattern)
+                pattern_masks[key] = pattern_masks.get(key, 0) | mask
+
+        self._exact: Dict[str, Dict[int, int]] = exact
+        # Patterns of a single trailing '*' need no matching
+        self._prefixes: Dict[str, List[Tuple[int, Optional[DatabasePatternMatcher], int]]] = {
+            prefix: [
+                (
+                    role_id,
+                    None if is_prefix_pattern(database_pattern) else DatabasePatternMatcher((database_pattern,)),
+                    mask,
+                )
+                for (role_id, database_pattern), mask in pattern_masks.items()
+            ]
+            for prefix, pattern_masks in prefixes.items()
+        }
+        self._prefix_lengths: List[int] = sorted({len(prefix) for prefix in prefixes})
+
+    def find_role_ids(self, action: ActionType, database_id: str) -> List[int]:
+        """Returns ids of roles granting the action on the database.
+
+        Args:
+            action (ActionType)
+            database_id (str)
+
+        Returns:
+            (List[int]): Sorted role ids.
+
+        """
+        granting_mask = action.implied_by_mask
+        role_ids = {
+            role_id for role_id, mask in self._exact.get(database_id, {}).items() if mask & granting_mask
+        }
+        for length in self._prefix_lengths:
+            if length > len(database_id):
+                break
+            for role_id, matcher, mask in self._prefixes.get(database_id[:length], []):
+                if role_id in role_ids or not mask & granting_mask:
+                    continue
+                if matcher is None or matcher.matches(database_id):
+                    role_ids.add(role_id)
+        return sorted(role_ids)
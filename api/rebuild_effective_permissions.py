@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# Copyright API authors
+"""Rebuild effective permissions of all users from their roles.
+
+Other processes drop their caches at the next generation check.
+
+"""
+
+from tortoise import Tortoise, run_async
+
+from api import settings
+from api.models import PolicyChangeModel
+
+
+async def rebuild_effective_permissions():
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+    generation = await PolicyChangeModel.record(None)
+    print('Rebuilt effective permissions. Policy generation: {}'.format(generation))
+
+
+if __name__ == '__main__':
+    run_async(rebuild_effective_permissions())
@@ -1,8 +1,17 @@
+import functools
+from typing import Type
+
 from marshmallow import Schema, fields, validate, pre_dump
 
 from api import settings
 
 
+@functools.lru_cache(maxsize=None)
+def get_schema(schema_class: Type[Schema], many: bool = False) -> Schema:
+    '''Returns a shared instance of the schema instead of building one per request.'''
+    return schema_class(many=many)
+
+
 class BasePaginationInputSchema(Schema):
     '''Base schema of pagination input.'''
     per_page = fields.Int(missing=settings.PAGINATION['DEFAULT_PER_PAGE'])
@@ -59,7 +68,9 @@ class RoleDetailSchema(RoleBaseSchema):
 
 
 class RolesResourceOnGetInputSchema(BasePaginationInputSchema):
-    pass
+    # Keyset pagination is used if cursor is given. 'start' means the first page.
+    cursor = fields.Str()
+    include_total = fields.Bool(missing=True)
 
 
 class UserSchema(Schema):
@@ -88,6 +99,23 @@ class PermittedActionsResourceOnGetInputSchema(Schema):
     user_id = fields.Str()
 
 
+class PermittedActionsBulkResourceOnPostInputSchema(Schema):
+    user_id = fields.Str()
+    action_id = fields.Str(
+        required=True,
+        validate=validate.OneOf(settings.ActionType.keys()),
+    )
+    database_id = fields.Str(required=True)
+
+
+class PermittedUsersResourceOnGetInputSchema(BasePaginationInputSchema):
+    action_id = fields.Str(
+        required=True,
+        validate=validate.OneOf(settings.ActionType.keys()),
+    )
+    database_id = fields.Str(required=True)
+
+
 class PermittedDatabasesResourceOnGetInputSchema(Schema):
     database_ids = fields.List(
         fields.Str(),
@@ -96,6 +124,10 @@ class PermittedDatabasesResourceOnGetInputSchema(Schema):
     user_id = fields.Str()
 
 
+class PermittedDatabasesResourceOnGetStreamInputSchema(Schema):
+    user_id = fields.Str()
+
+
 class PermittedDatabasesResourceOnGetResponseSchema(Schema):
     database_ids = fields.List(
         fields.Str(),
@@ -103,3 +135,7 @@ class PermittedDatabasesResourceOnGetResponseSchema(Schema):
     selected_indices = fields.List(
         fields.Integer(),
     )
+
+
+class PolicySnapshotResourceOnGetInputSchema(Schema):
+    since = fields.Int(validate=validate.Range(min=0))
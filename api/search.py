@@ -0,0 +1,136 @@
+"""Indexed full-text search of roles."""
+
+from typing import List, Optional
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from api.models import RoleModel
+
+# Trigram tokenizer of FTS5 matches substrings of 3 characters or more
+SQLITE_MINIMUM_SEARCH_LENGTH = 3
+
+SQLITE_ROLE_SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS \"rolemodel_fts\" USING fts5("
+    "name, description, content='rolemodel', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS \"rolemodel_fts_insert\" AFTER INSERT ON \"rolemodel\" BEGIN "
+    "INSERT INTO \"rolemodel_fts\"(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS \"rolemodel_fts_delete\" AFTER DELETE ON \"rolemodel\" BEGIN "
+    "INSERT INTO \"rolemodel_fts\"(\"rolemodel_fts\", rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS \"rolemodel_fts_update\" AFTER UPDATE ON \"rolemodel\" BEGIN "
+    "INSERT INTO \"rolemodel_fts\"(\"rolemodel_fts\", rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO \"rolemodel_fts\"(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO \"rolemodel_fts\"(\"rolemodel_fts\") VALUES ('rebuild')",
+]
+
+POSTGRES_ROLE_SEARCH_SCHEMA = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS "rolemodel_name_trgm_idx" ON "rolemodel" USING gin ("name" gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS "rolemodel_description_trgm_idx" ON "rolemodel" '
+    'USING gin ("description" gin_trgm_ops)',
+]
+
+
+def get_connection() -> BaseDBAsyncClient:
+    """Returns the connection of models.
+
+    Returns:
+        (BaseDBAsyncClient)
+
+    """
+    return RoleModel._meta.db
+
+
+async def create_role_search_index(connection: Optional[BaseDBAsyncClient] = None):
+    """Create the search index of roles if it does not exist.
+
+    Migrations create the index. This is for databases created by ``generate_schemas``.
+
+    Args:
+        connection (Optional[BaseDBAsyncClient])
+
+    """
+    connection = connection or get_connection()
+    dialect = connection.capabilities.dialect
+    if dialect == 'sqlite':
+        statements = SQLITE_ROLE_SEARCH_SCHEMA
+    elif dialect == 'postgres':
+        statements = POSTGRES_ROLE_SEARCH_SCHEMA
+    else:
+        return
+    for statement in statements:
+        await connection.execute_script(statement)
+
+
+async def has_role_search_index(connection: BaseDBAsyncClient) -> bool:
+    """Check if the search index of roles exists.
+
+    Args:
+        connection (BaseDBAsyncClient)
+
+    Returns:
+        (bool)
+
+    """
+    dialect = connection.capabilities.dialect
+    if dialect == 'sqlite':
+        rows = await connection.execute_query_dict(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rolemodel_fts'",
+        )
+    elif dialect == 'postgres':
+        rows = await connection.execute_query_dict(
+            "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'",
+        )
+    else:
+        return False
+    return bool(rows)
+
+
+def escape_like(search: str) -> str:
+    r"""Escape wildcards of LIKE with '\'.
+
+    Args:
+        search (str)
+
+    Returns:
+        (str)
+
+    """
+    return search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+async def find_ranked_role_ids(search: str) -> Optional[List[int]]:
+    """Returns ids of roles whose name or description contains the search term.
+
+    Ids are ranked by relevance, matches in name first.
+
+    Args:
+        search (str): Search term.
+
+    Returns:
+        (Optional[List[int]]): None if the index cannot answer the search,
+            e.g. the index does not exist or the search term is too short.
+
+    """
+    connection = get_connection()
+    dialect = connection.capabilities.dialect
+    if dialect == 'sqlite' and len(search) < SQLITE_MINIMUM_SEARCH_LENGTH:
+        return None
+    if not await has_role_search_index(connection):
+        return None
+
+    if dialect == 'sqlite':
+        rows = await connection.execute_query_dict(
+            'SELECT rowid AS id FROM "rolemodel_fts" WHERE "rolemodel_fts" MATCH ? '
+            'ORDER BY bm25("rolemodel_fts", 10.0, 1.0), rowid',
+            ['"{}"'.format(search.replace('"', '""'))],
+        )
+    else:
+        rows = await connection.execute_query_dict(
+            'SELECT "id" FROM "rolemodel" '
+            "WHERE \"name\" LIKE $1 ESCAPE '\\' OR \"description\" LIKE $1 ESCAPE '\\' "
+            'ORDER BY GREATEST(similarity("name", $2) * 10, similarity("description", $2)) DESC, "id"',
+            ['%{}%'.format(escape_like(search)), search],
+        )
+    return [row['id'] for row in rows]
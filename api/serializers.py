@@ -0,0 +1,157 @@
+"""Serialization of hot responses without marshmallow.
+
+Each function returns the same value as the dump of the corresponding schema in
+``api.schemas``, which stays the reference.
+Keys are in a fixed order, which schema dumps do not guarantee.
+
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Mapping
+
+from api.settings import ActionType
+
+# Descriptions shared by all serialized permissions. They must not be mutated.
+ACTION_DESCRIPTIONS: Dict[str, Dict[str, str]] = {action.name: action.describe() for action in ActionType}
+
+_MISSING = object()
+
+
+class StaticResponse:
+    """JSON response of constant data rendered once into bytes."""
+
+    def __init__(self, data: Any):
+        """Render data.
+
+        Args:
+            data (Any): Data serializable to JSON.
+
+        """
+        # Encoded like responder encodes media
+        self.body: bytes = json.dumps(data).encode()
+        self.etag: str = '"{}"'.format(hashlib.blake2b(self.body, digest_size=8).hexdigest())
+
+
+def _get_value(obj: Any, key: str) -> Any:
+    """Returns a value like marshmallow, by key of mappings or attribute of objects."""
+    if isinstance(obj, Mapping):
+        return obj.get(key, _MISSING)
+    return getattr(obj, key, _MISSING)
+
+
+def _dump_str(value: Any) -> Any:
+    """Returns a value like ``fields.Str``."""
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def dump_permission(permission: Mapping) -> Dict:
+    """Serialize a permission like ``PermissionDetailSchema``.
+
+    Args:
+        permission (Mapping): Permission in the shape of ``RoleModel.permissions``.
+
+    Returns:
+        (Dict)
+
+    """
+    return {
+        'databases': [_dump_str(database) for database in permission['databases']],
+        'actions': [ACTION_DESCRIPTIONS[action_id] for action_id in permission['action_ids']],
+    }
+
+
+def dump_role(role: Any) -> Dict:
+    """Serialize a role like ``RoleDetailSchema``.
+
+    Args:
+        role (RoleModel): Role whose permissions are loaded.
+
+    Returns:
+        (Dict)
+
+    """
+    return {
+        'name': _dump_str(role.name),
+        'description': _dump_str(role.description),
+        'permissions': [dump_permission(permission) for permission in role.permissions],
+        'role_id': role.id,
+    }
+
+
+def dump_roles(roles: Iterable[Any]) -> List[Dict]:
+    """Serialize roles like ``RoleDetailSchema(many=True)``.
+
+    Args:
+        roles (Iterable[RoleModel]): Roles whose permissions are loaded.
+
+    Returns:
+        (List[Dict])
+
+    """
+    return [dump_role(role) for role in roles]
+
+
+def dump_role_summary(role: Any) -> Dict:
+    """Serialize a role like ``RoleDetailSchema(only=['role_id', 'name', 'description'])``.
+
+    Args:
+        role (Any): Role, or dict with ``id``, ``name`` and ``description``.
+
+    Returns:
+        (Dict)
+
+    """
+    serialized = {}
+    role_id = _get_value(role, 'id')
+    if role_id is not _MISSING:
+        serialized['role_id'] = None if role_id is None else int(role_id)
+    for key in ('name', 'description'):
+        value = _get_value(role, key)
+        if value is not _MISSING:
+            serialized[key] = _dump_str(value)
+    return serialized
+
+
+def dump_user(user: Mapping) -> Dict:
+    """Serialize a user like ``UserSchema``.
+
+    Args:
+        user (Mapping): Auth0 user with ``roles``.
+
+    Returns:
+        (Dict)
+
+    """
+    serialized = {}
+    for key in ('user_id', 'name'):
+        value = _get_value(user, key)
+        if value is not _MISSING:
+            serialized[key] = _dump_str(value)
+    roles = _get_value(user, 'roles')
+    if roles is _MISSING:
+        serialized['roles'] = []
+    elif roles is None:
+        serialized['roles'] = None
+    else:
+        serialized['roles'] = [dump_role_summary(role) for role in roles]
+    return serialized
+
+
+def dump_permitted_databases(database_ids: List[str], selected_indices: List[int]) -> Dict:
+    """Serialize permitted databases like ``PermittedDatabasesResourceOnGetResponseSchema``.
+
+    Args:
+        database_ids (List[str])
+        selected_indices (List[int])
+
+    Returns:
+        (Dict)
+
+    """
+    return {
+        'database_ids': [_dump_str(database_id) for database_id in database_ids],
+        'selected_indices': list(selected_indices),
+    }
@@ -2,7 +2,11 @@
 # Copyright API authors
 """The API server."""
 
+import itertools
+import json
+import logging
 import os
+import time
 import urllib.parse
 
 from auth0.v3.exceptions import Auth0Error
@@ -11,29 +15,52 @@ import responder
 from marshmallow import ValidationError
 from tortoise import Tortoise
 from tortoise.exceptions import DoesNotExist
-from tortoise.query_utils import Q
+from tortoise.transactions import in_transaction
 
 from api import settings
+from api.cache import user_profile_cache
+from api.capability import issue_capability_token
 from api.models import (
     UserModel,
     RoleModel,
+    EffectivePermissionModel,
+    PolicyChangeModel,
 )
 from api.schemas import (
-    ActionSchema,
     RolesResourceOnGetInputSchema,
     RoleBaseSchema,
-    RoleDetailSchema,
-    UserSchema,
     UsersResourceInputSchema,
     UserResourceOnPatchInputSchema,
     PermittedActionsResourceOnGetInputSchema,
+    PermittedActionsBulkResourceOnPostInputSchema,
     PermittedDatabasesResourceOnGetInputSchema,
-    PermittedDatabasesResourceOnGetResponseSchema,
+    PermittedDatabasesResourceOnGetStreamInputSchema,
+    PermittedUsersResourceOnGetInputSchema,
+    PolicySnapshotResourceOnGetInputSchema,
+    get_schema,
 )
+from api.serializers import (
+    ACTION_DESCRIPTIONS,
+    StaticResponse,
+    dump_permitted_databases,
+    dump_role,
+    dump_role_summary,
+    dump_roles,
+    dump_user,
+)
+from api.auth0_client import get_async_auth0_users
+from api.search import find_ranked_role_ids
 from api.settings import ActionType
 from api.utils import (
-    get_auth0_client,
     build_search_query,
+    decode_cursor,
+    encode_cursor,
+    FIRST_PAGE_CURSOR,
+    is_etag_matched,
+    iterate_file,
+    iterate_ndjson_chunks,
+    make_etag,
+    spool_byte_stream,
 )
 
 # Metadata
@@ -69,6 +96,15 @@ api = responder.API(
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+@api.on_event('startup')
+async def check_settings():
+    if not settings.CAPABILITY_TOKEN['SECRET_KEY']:
+        logger.warning('CAPABILITY_TOKEN_SECRET_KEY is not set. /capability-token is not available.')
+
+
 @api.on_event('startup')
 async def start_db_connection():
     await Tortoise.init(config=settings.TORTOISE_ORM)
@@ -79,6 +115,69 @@ async def close_db_connection():
     await Tortoise.close_connections()
 
 
+# The action catalog never changes at runtime, so its responses are rendered once.
+# They are rendered from ACTION_DESCRIPTIONS, whose key order does not depend on the hash seed
+# like schema dumps do, so that all processes send the same ETag.
+ACTIONS_RESPONSE = StaticResponse({'actions': list(ACTION_DESCRIPTIONS.values())})
+ACTION_RESPONSES = {action_id: StaticResponse(description) for action_id, description in ACTION_DESCRIPTIONS.items()}
+
+
+def send_not_modified(resp: responder.Response):
+    """Send 304 Not Modified without a body.
+
+    Args:
+        resp (responder.Response): Response
+
+    """
+    resp.status_code = 304
+    # Without content, responder would send null as JSON, which 304 must not have
+    resp.content = b''
+
+
+async def is_policy_not_modified(req: responder.Request, resp: responder.Response, *parts: bytes) -> bool:
+    """Set ETag and Cache-Control of a response derived from roles and permissions.
+
+    The ETag combines the policy generation seen by this process with the request,
+    so it is checked without querying the database in most requests.
+
+    Args:
+        req (responder.Request): Request
+        resp (responder.Response): Response
+        *parts (bytes): Other inputs of the response, e.g. request body.
+
+    Returns:
+        (bool): True if the client has the response. The status code is set to 304.
+
+    """
+    generation = await PolicyChangeModel.get_cached_generation()
+    etag = make_etag(generation, req.full_url, req.headers.get('Authorization', ''), *parts)
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = settings.HTTP_CACHE['POLICY_CACHE_CONTROL']
+    resp.headers['Vary'] = 'Authorization'
+    if is_etag_matched(req.headers.get('If-None-Match'), etag):
+        send_not_modified(resp)
+        return True
+    return False
+
+
+def send_static_response(req: responder.Request, resp: responder.Response, static_response: StaticResponse):
+    """Send a pre-rendered response with its fixed ETag and a long-lived Cache-Control.
+
+    Args:
+        req (responder.Request): Request
+        resp (responder.Response): Response
+        static_response (StaticResponse)
+
+    """
+    resp.headers['ETag'] = static_response.etag
+    resp.headers['Cache-Control'] = 'public, max-age={}'.format(settings.HTTP_CACHE['ACTIONS_MAX_AGE'])
+    if is_etag_matched(req.headers.get('If-None-Match'), static_response.etag):
+        send_not_modified(resp)
+        return
+    resp.headers['Content-Type'] = 'application/json'
+    resp.content = static_response.body
+
+
 @api.route('/')
 def index(req, resp):
     """Index page."""
@@ -108,7 +207,7 @@ class UsersResource():
 
         """
         try:
-            req_param = UsersResourceInputSchema().load(req.params)
+            req_param = get_schema(UsersResourceInputSchema).load(req.params)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
@@ -117,8 +216,8 @@ class UsersResource():
         # Limit minimum page to 0
         page_for_auth0 = max(0, req_param['page'] - 1)
 
-        auth0 = get_auth0_client()
-        auth0_response = auth0.users.list(
+        auth0_users = get_async_auth0_users()
+        auth0_response = await auth0_users.list(
             page=page_for_auth0,
             per_page=req_param['per_page'],
             q=build_search_query(req_param['search']),
@@ -126,21 +225,12 @@ class UsersResource():
         users = auth0_response['users']
 
         # Add roles for each user if user exists in table
+        role_summaries = await UserModel.get_role_summaries(user['user_id'] for user in users)
         for user in users:
-            try:
-                user_data = await UserModel.get(id=user['user_id'])
-            except DoesNotExist:
-                user_data = None
-
-            if user_data:
-                await user_data.fetch_related('roles')
-                user['roles'] = user_data.roles
-            else:
-                user['roles'] = []
+            user['roles'] = role_summaries.get(user['user_id'], [])
 
         # Serialize user objects
-        users_schema = UserSchema(many=True)
-        serialized_users = users_schema.dump(users)
+        serialized_users = [dump_user(user) for user in users]
 
         resp.media = {
             'page': req_param['page'],
@@ -167,9 +257,9 @@ class UserResource():
         user_id = urllib.parse.unquote(user_id)
 
         # Get user info from auth0
-        auth0 = get_auth0_client()
+        auth0_users = get_async_auth0_users()
         try:
-            user = auth0.users.get(id=user_id)
+            user = await auth0_users.get(id=user_id)
         except Auth0Error as e:
             resp.status_code = 404
             resp.media = {'detail': str(e)}
@@ -187,8 +277,7 @@ class UserResource():
             user['roles'] = []
 
         # Serialize user object
-        user_schema = UserSchema()
-        serialized_user = user_schema.dump(user)
+        serialized_user = dump_user(user)
 
         resp.media = serialized_user
 
@@ -208,16 +297,16 @@ class UserResource():
         # Validate request parameters
         try:
             req_json = await req.media()
-            req_param = UserResourceOnPatchInputSchema().load(req_json)
+            req_param = get_schema(UserResourceOnPatchInputSchema).load(req_json)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
             return
 
         # Get user info from auth0
-        auth0 = get_auth0_client()
+        auth0_users = get_async_auth0_users()
         try:
-            user = auth0.users.get(id=user_id)
+            user = await auth0_users.get(id=user_id)
         except Auth0Error as e:
             resp.status_code = 404
             resp.media = {'detail': str(e)}
@@ -231,7 +320,9 @@ class UserResource():
             role_ids = req_param['role_ids']
 
             # Check if all role_ids exists
-            role_ids_not_exist = [role_id for role_id in role_ids if not await RoleModel.exists(id=role_id)]
+            roles = await RoleModel.filter(id__in=role_ids).order_by('id')
+            existing_role_ids = {role.id for role in roles}
+            role_ids_not_exist = [role_id for role_id in role_ids if role_id not in existing_role_ids]
             if role_ids_not_exist:
                 # Return error
                 resp.status_code = 404  # TODO: Check if status code suitable
@@ -239,17 +330,18 @@ class UserResource():
                 return
 
             # Update database
-            roles = [await RoleModel.get(id=role_id) for role_id in role_ids]
-            await user_data.roles.clear()
-            await user_data.roles.add(*roles)
+            async with in_transaction(UserModel._meta.default_connection) as connection:
+                await user_data.set_roles(roles, using_db=connection)
+                change = await PolicyChangeModel.write([user_id], [], using_db=connection)
+            change.invalidate_caches()
 
             # Update response
-            await user_data.fetch_related('roles')
-            user['roles'] = user_data.roles
+            user['roles'] = roles
+
+        user_profile_cache.invalidate(user_id)
 
         # Serialize user object
-        user_schema = UserSchema()
-        serialized_user = user_schema.dump(user)
+        serialized_user = dump_user(user)
 
         resp.media = serialized_user
 
@@ -266,27 +358,73 @@ class RolesResource():
         """
         # Validate request parameters
         try:
-            req_param = RolesResourceOnGetInputSchema().load(req.params)
+            req_param = get_schema(RolesResourceOnGetInputSchema).load(req.params)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
             return
+        if await is_policy_not_modified(req, resp):
+            return
 
-        # Get roles
-        roles = RoleModel.all()
+        # Search roles with the index if available
+        ranked_role_ids = None
         if req_param['search']:
-            roles = roles.filter(
-                Q(name__contains=req_param['search']) | Q(description__contains=req_param['search'])
-            )
-        number_of_total_roles = await roles.all().count()
-        if req_param['per_page'] > 0:
-            offset: int = req_param['per_page'] * (req_param['page'] - 1)
-            roles = roles.offset(offset).limit(req_param['per_page'])
-        roles = await roles.all()
+            ranked_role_ids = await find_ranked_role_ids(req_param['search'])
+
+        # Get roles
+        roles = RoleModel.search(req_param['search']).order_by('id')
+        if 'cursor' in req_param:
+            # Keyset pagination
+            if req_param['per_page'] <= 0:
+                resp.status_code = 400
+                resp.media = {'detail': 'per_page must be positive with cursor.'}
+                return
+            last_role_id = 0
+            if req_param['cursor'] != FIRST_PAGE_CURSOR:
+                try:
+                    last_role_id = int(decode_cursor(req_param['cursor'])['id'])
+                except (ValueError, KeyError, TypeError) as e:
+                    resp.status_code = 400
+                    resp.media = {'detail': str(e)}
+                    return
+            if ranked_role_ids is None:
+                roles = await roles.filter(id__gt=last_role_id).limit(req_param['per_page'] + 1)
+            else:
+                page_role_ids = sorted(role_id for role_id in ranked_role_ids if role_id > last_role_id)
+                roles = await RoleModel.filter(
+                    id__in=page_role_ids[:req_param['per_page'] + 1],
+                ).order_by('id')
+            if len(roles) > req_param['per_page']:
+                roles = roles[:req_param['per_page']]
+                next_cursor = encode_cursor({'id': roles[-1].id})
+            else:
+                next_cursor = None
+        elif ranked_role_ids is None:
+            if req_param['per_page'] > 0:
+                offset: int = req_param['per_page'] * (req_param['page'] - 1)
+                roles = roles.offset(offset).limit(req_param['per_page'])
+            roles = await roles
+        else:
+            # Keep ranked order
+            page_role_ids = ranked_role_ids
+            if req_param['per_page'] > 0:
+                offset: int = req_param['per_page'] * (req_param['page'] - 1)
+                page_role_ids = ranked_role_ids[offset:offset + req_param['per_page']]
+            roles_by_id = {role.id: role for role in await RoleModel.filter(id__in=page_role_ids)}
+            roles = [roles_by_id[role_id] for role_id in page_role_ids if role_id in roles_by_id]
+
+        # Count roles
+        if not req_param['include_total']:
+            number_of_total_roles = None
+        elif ranked_role_ids is not None:
+            number_of_total_roles = len(ranked_role_ids)
+        else:
+            number_of_total_roles = await RoleModel.count_cached(req_param['search'])
+
+        await RoleModel.fetch_permissions(roles)
 
         # Serialize role objects
-        roles_schema = RoleDetailSchema(many=True)
-        serialized_roles = roles_schema.dump(roles)
+        serialized_roles = dump_roles(roles)
 
         resp.media = {
             'page': req_param['page'],
@@ -295,6 +433,8 @@ class RolesResource():
             'total': number_of_total_roles,
             'roles': serialized_roles,
         }
+        if 'cursor' in req_param:
+            resp.media['next_cursor'] = next_cursor
 
     async def on_post(self, req: responder.Request, resp: responder.Response):
         """Create role.
@@ -307,18 +447,20 @@ class RolesResource():
         # Validate request parameters
         try:
             req_json = await req.media()
-            req_param = RoleBaseSchema().load(req_json)
+            req_param = get_schema(RoleBaseSchema).load(req_json)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
             return
 
         # Create role object
-        role = await RoleModel.create(**req_param)
+        async with in_transaction(RoleModel._meta.default_connection) as connection:
+            role = await RoleModel.create(using_db=connection, **req_param)
+            change = await PolicyChangeModel.write([], [role.id], using_db=connection)
+        change.invalidate_caches()
 
         # Serialize role objects
-        role_schema = RoleDetailSchema()
-        serialized_role = role_schema.dump(role)
+        serialized_role = dump_role(role)
 
         resp.media = serialized_role
 
@@ -335,16 +477,19 @@ class RoleResource():
             role_id (str): Role id
 
         """
+        if await is_policy_not_modified(req, resp):
+            return
+
         # Get role object
         role = await RoleModel.get_or_none(id=int(role_id))
         if role is None:
             resp.status_code = 404
             resp.media = {'detail': f'Role roleid={role_id} does not exist.'}
             return
+        await RoleModel.fetch_permissions([role])
 
         # Serialize role objects
-        role_schema = RoleDetailSchema()
-        serialized_role = role_schema.dump(role)
+        serialized_role = dump_role(role)
 
         resp.media = serialized_role
 
@@ -361,7 +506,7 @@ class RoleResource():
         # Validate request parameters
         try:
             req_json = await req.media()
-            req_param = RoleBaseSchema().load(req_json, partial=True)
+            req_param = get_schema(RoleBaseSchema).load(req_json, partial=True)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
@@ -377,14 +522,26 @@ class RoleResource():
             return
 
         # Update role object
-        await RoleModel.filter(id=role_id_int).update(**req_param)
-
-        # Re-get object
-        role = await RoleModel.get(id=role_id_int)
+        permissions = req_param.pop('permissions', None)
+        async with in_transaction(RoleModel._meta.default_connection) as connection:
+            if req_param:
+                await RoleModel.filter(id=role_id_int).using_db(connection).update(**req_param)
+
+            # Re-get object
+            role = await RoleModel.get(id=role_id_int).using_db(connection)
+            if permissions is None:
+                await RoleModel.fetch_permissions([role])
+            else:
+                await role.set_permissions(permissions, using_db=connection)
+            change = await PolicyChangeModel.write(
+                await UserModel.get_user_ids_with_role(role_id_int, using_db=connection),
+                [role_id_int],
+                using_db=connection,
+            )
+        change.invalidate_caches()
 
         # Serialize role objects
-        role_schema = RoleDetailSchema()
-        serialized_role = role_schema.dump(role)
+        serialized_role = dump_role(role)
 
         resp.media = serialized_role
 
@@ -408,7 +565,13 @@ class RoleResource():
             return
 
         # Delete object
-        await RoleModel.filter(id=role_id_int).delete()
+        async with in_transaction(RoleModel._meta.default_connection) as connection:
+            user_ids = await UserModel.get_user_ids_with_role(role_id_int, using_db=connection)
+            # Users are locked before the role, in the same order as updates of users
+            await UserModel.lock(user_ids, connection)
+            await RoleModel.filter(id=role_id_int).using_db(connection).delete()
+            change = await PolicyChangeModel.write(user_ids, [role_id_int], using_db=connection)
+        change.invalidate_caches()
 
 
 @api.route('/actions')
@@ -421,11 +584,7 @@ class ActionsResource:
             resp (responder.Response): Response
 
         """
-        actions_schema = ActionSchema(many=True)
-        result = actions_schema.dump(ActionType.list())
-        resp.media = {
-            'actions': result,
-        }
+        send_static_response(req, resp, ACTIONS_RESPONSE)
 
 
 @api.route('/actions/{action_id}')
@@ -440,18 +599,12 @@ class ActionResource:
             action_id (str): Action id
 
         """
-        try:
-            action_data = ActionType[action_id].describe()
-        except KeyError:
+        if action_id not in ACTION_RESPONSES:
             resp.status_code = 404
             resp.media = {'detail': f'Action {action_id} does not exist.'}
             return
 
-        resp.status_code = 200
-        action_schema = ActionSchema()
-
-        result = action_schema.dump(action_data)
-        resp.media = result
+        send_static_response(req, resp, ACTION_RESPONSES[action_id])
 
 
 @api.route('/permitted-actions')
@@ -465,7 +618,7 @@ class PermittedActionsResource:
 
         """
         try:
-            req_param = PermittedActionsResourceOnGetInputSchema().load(req.params)
+            req_param = get_schema(PermittedActionsResourceOnGetInputSchema).load(req.params)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
@@ -485,11 +638,11 @@ class PermittedActionsResource:
                 resp.media = {'detail': 'Invalid signature'}
                 return
 
-        user = await UserModel.get_or_none(id=user_id)
-        if user:
-            permitted_actions = await user.get_permitted_actions(req_param['database_id'])
-        else:
-            permitted_actions = []
+        if await is_policy_not_modified(req, resp):
+            return
+
+        policy = await UserModel.get_cached_policy(user_id)
+        permitted_actions = policy.get_permitted_actions(req_param['database_id'])
 
         resp.media = [action.name for action in permitted_actions]
 
@@ -506,7 +659,7 @@ class PermittedActionResource:
 
         """
         try:
-            req_param = PermittedActionsResourceOnGetInputSchema().load(req.params)
+            req_param = get_schema(PermittedActionsResourceOnGetInputSchema).load(req.params)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
@@ -532,19 +685,59 @@ class PermittedActionResource:
                 resp.media = {'detail': 'Invalid signature'}
                 return
 
+        if await is_policy_not_modified(req, resp):
+            return
+
         # Get whether permitted
-        user = await UserModel.get_or_none(id=user_id)
-        if user:
-            is_permitted = await user.is_user_permitted_action(
-                action_data,
-                req_param['database_id'],
-            )
-        else:
-            is_permitted = False
+        policy = await UserModel.get_cached_policy(user_id)
+        is_permitted = policy.is_permitted(action_data, req_param['database_id'])
 
         resp.media = is_permitted
 
 
+@api.route('/permitted-actions-bulk')
+class PermittedActionsBulkResource:
+    async def on_post(self, req: responder.Request, resp: responder.Response):
+        """Check if users are permitted to act to databases in bulk.
+
+        The request body is a list of ``{user_id, action_id, database_id}``.
+        The response is a list of booleans in the same order.
+
+        Args:
+            req (responder.Request): Request
+            resp (responder.Response): Response
+
+        """
+        # Validate request parameters
+        try:
+            req_json = await req.media()
+            checks = get_schema(PermittedActionsBulkResourceOnPostInputSchema, many=True).load(req_json)
+        except ValidationError as e:
+            resp.status_code = 400
+            resp.media = {'detail': str(e)}
+            return
+
+        # Get user id for checks without user id
+        if not all('user_id' in check for check in checks):
+            try:
+                jwt_payload = get_jwt_payload_from_request(req)
+                default_user_id: str = jwt_payload['sub']
+            except Exception:
+                resp.status_code = 403
+                resp.media = {'detail': 'Invalid signature'}
+                return
+            for check in checks:
+                check.setdefault('user_id', default_user_id)
+
+        # Get policy once per user
+        policies = await UserModel.get_cached_policies(check['user_id'] for check in checks)
+
+        resp.media = [
+            policies[check['user_id']].is_permitted(ActionType[check['action_id']], check['database_id'])
+            for check in checks
+        ]
+
+
 @api.route('/permitted-databases')
 class PermittedDatabasesResource():
     async def on_get(self, req: responder.Request, resp: responder.Response):
@@ -555,10 +748,14 @@ class PermittedDatabasesResource():
             resp (responder.Response): Response
 
         """
+        if req.mimetype.startswith(settings.PERMITTED_DATABASES['NDJSON_MIMETYPE']):
+            await self._on_get_ndjson(req, resp)
+            return
+
         # Validate request parameters
         try:
             req_json = await req.media()
-            req_param = PermittedDatabasesResourceOnGetInputSchema().load(req_json)
+            req_param = get_schema(PermittedDatabasesResourceOnGetInputSchema).load(req_json)
         except ValidationError as e:
             resp.status_code = 400
             resp.media = {'detail': str(e)}
@@ -576,25 +773,224 @@ class PermittedDatabasesResource():
                 resp.media = {'detail': 'Invalid signature'}
                 return
 
+        if await is_policy_not_modified(req, resp, await req.content):
+            return
+
         # Filter permitted databases
-        user = await UserModel.get_or_none(id=user_id)
-        if user:
-            permitted_database_ids, permitted_indices = await user.filter_permitted_databases(
-                getattr(ActionType, 'databases:read'),
-                req_param['database_ids'],
+        permitted_database_ids, permitted_indices = await UserModel.filter_permitted_databases_of_user(
+            user_id,
+            getattr(ActionType, 'databases:read'),
+            req_param['database_ids'],
+        )
+
+        # Serialize role objects
+        serialized_output = dump_permitted_databases(permitted_database_ids, permitted_indices)
+
+        resp.media = serialized_output
+
+    async def _on_get_ndjson(self, req: responder.Request, resp: responder.Response):
+        """Filter permitted databases streamed as NDJSON.
+
+        The request body has one database id per line as a JSON string.
+        Each permitted database is streamed back as soon as its chunk is evaluated,
+        as a line of ``{"database_id": ..., "selected_index": ...}``.
+        An invalid line ends the stream with a line of ``{"detail": ...}``,
+        after the lines preceding it are evaluated.
+
+        Args:
+            req (responder.Request): Request
+            resp (responder.Response): Response
+
+        """
+        # Validate request parameters
+        try:
+            req_param = get_schema(PermittedDatabasesResourceOnGetStreamInputSchema).load(req.params)
+        except ValidationError as e:
+            resp.status_code = 400
+            resp.media = {'detail': str(e)}
+            return
+
+        # Get user id if not specified
+        if 'user_id' in req_param:
+            user_id: str = req_param['user_id']
+        else:
+            try:
+                jwt_payload = get_jwt_payload_from_request(req)
+                user_id: str = jwt_payload['sub']
+            except Exception:
+                resp.status_code = 403
+                resp.media = {'detail': 'Invalid signature'}
+                return
+
+        action = getattr(ActionType, 'databases:read')
+        # The body is read before streaming starts. While a streaming response is sent,
+        # starlette listens for disconnection on the same channel and would consume the body.
+        # It is spooled to a temporary file so that memory does not grow with the number of ids.
+        # responder does not expose the body stream, so it is taken from the starlette request.
+        body_file = await spool_byte_stream(
+            req._starlette.stream(),
+            settings.PERMITTED_DATABASES['STREAM_SPOOL_MAX_SIZE'],
+        )
+
+        async def stream_permitted_databases():
+            offset = 0
+            try:
+                async for values in iterate_ndjson_chunks(
+                    iterate_file(body_file),
+                    settings.PERMITTED_DATABASES['STREAM_CHUNK_SIZE'],
+                ):
+                    database_ids = list(itertools.takewhile(lambda value: isinstance(value, str), values))
+                    permitted_database_ids, permitted_indices = await UserModel.filter_permitted_databases_of_user(
+                        user_id,
+                        action,
+                        database_ids,
+                    )
+                    lines = [
+                        json.dumps({'database_id': database_id, 'selected_index': offset + index}) + '\n'
+                        for database_id, index in zip(permitted_database_ids, permitted_indices)
+                    ]
+                    if lines:
+                        yield ''.join(lines).encode()
+                    offset += len(database_ids)
+                    if len(database_ids) < len(values):
+                        raise ValueError('Each line must be a database id string.')
+            except ValueError as e:
+                yield (json.dumps({'detail': str(e)}) + '\n').encode()
+            finally:
+                body_file.close()
+
+        resp.headers['Content-Type'] = settings.PERMITTED_DATABASES['NDJSON_MIMETYPE']
+        resp.stream(stream_permitted_databases)
+
+
+@api.route('/permitted-users')
+class PermittedUsersResource:
+    async def on_get(self, req: responder.Request, resp: responder.Response):
+        """Get roles and users permitted to act to a database.
+
+        Args:
+            req (responder.Request): Request
+            resp (responder.Response): Response
+
+        """
+        try:
+            req_param = get_schema(PermittedUsersResourceOnGetInputSchema).load(req.params)
+        except ValidationError as e:
+            resp.status_code = 400
+            resp.media = {'detail': str(e)}
+            return
+        if await is_policy_not_modified(req, resp):
+            return
+
+        # Find roles granting the action
+        role_index = await RoleModel.get_role_index()
+        role_ids = role_index.find_role_ids(ActionType[req_param['action_id']], req_param['database_id'])
+        roles = await RoleModel.filter(id__in=role_ids).order_by('id')
+
+        # Get users holding the roles
+        if req_param['per_page'] > 0:
+            user_ids, number_of_total_users = await UserModel.get_user_ids_with_roles(
+                role_ids,
+                search=req_param['search'],
+                offset=req_param['per_page'] * (req_param['page'] - 1),
+                limit=req_param['per_page'],
             )
         else:
-            permitted_database_ids = []
-            permitted_indices = []
+            user_ids, number_of_total_users = await UserModel.get_user_ids_with_roles(
+                role_ids,
+                search=req_param['search'],
+            )
 
         # Serialize role objects
-        output_schema = PermittedDatabasesResourceOnGetResponseSchema()
-        serialized_output = output_schema.dump({
-            'database_ids': permitted_database_ids,
-            'selected_indices': permitted_indices,
-        })
+        serialized_roles = [dump_role_summary(role) for role in roles]
 
-        resp.media = serialized_output
+        resp.media = {
+            'action_id': req_param['action_id'],
+            'database_id': req_param['database_id'],
+            'roles': serialized_roles,
+            'page': req_param['page'],
+            'per_page': req_param['per_page'],
+            'length': len(user_ids),
+            'total': number_of_total_users,
+            'user_ids': user_ids,
+        }
+
+
+@api.route('/capability-token')
+class CapabilityTokenResource:
+    async def on_post(self, req: responder.Request, resp: responder.Response):
+        """Issue a signed token embedding effective permissions of the user of the JWT.
+
+        Tokens are only issued for the caller's own permissions.
+        503 is returned if no signing key is configured.
+
+        Args:
+            req (responder.Request): Request
+            resp (responder.Response): Response
+
+        """
+        try:
+            jwt_payload = get_jwt_payload_from_request(req)
+            user_id: str = jwt_payload['sub']
+        except Exception:
+            resp.status_code = 403
+            resp.media = {'detail': 'Invalid signature'}
+            return
+
+        if not settings.CAPABILITY_TOKEN['SECRET_KEY']:
+            resp.status_code = 503
+            resp.media = {'detail': 'Capability tokens are not configured.'}
+            return
+
+        # Read the generation first, so that the token never claims newer permissions than it holds
+        generation = await PolicyChangeModel.get_generation()
+        pattern_masks = await EffectivePermissionModel.load_pattern_masks([user_id])
+        now = time.time()
+        token = issue_capability_token(
+            user_id,
+            pattern_masks.get(user_id, {}),
+            settings.CAPABILITY_TOKEN['SECRET_KEY'],
+            settings.CAPABILITY_TOKEN['TTL'],
+            generation=generation,
+            now=now,
+        )
+
+        resp.headers['Cache-Control'] = 'no-store'
+        resp.media = {
+            'token': token,
+            'user_id': user_id,
+            'expires_at': int(now + settings.CAPABILITY_TOKEN['TTL']),
+            'generation': generation,
+        }
+
+
+@api.route('/policy-snapshot')
+class PolicySnapshotResource:
+    async def on_get(self, req: responder.Request, resp: responder.Response):
+        """Get all roles and role assignments, or changes since a version.
+
+        Args:
+            req (responder.Request): Request
+            resp (responder.Response): Response
+
+        """
+        try:
+            req_param = get_schema(PolicySnapshotResourceOnGetInputSchema).load(req.params)
+        except ValidationError as e:
+            resp.status_code = 400
+            resp.media = {'detail': str(e)}
+            return
+
+        # The client holds the current version
+        etag = '"{}"'.format(await PolicyChangeModel.get_generation())
+        if is_etag_matched(req.headers.get('If-None-Match'), etag):
+            resp.headers['ETag'] = etag
+            send_not_modified(resp)
+            return
+
+        snapshot = await PolicyChangeModel.get_snapshot(req_param.get('since'))
+        resp.headers['ETag'] = '"{}"'.format(snapshot['version'])
+        resp.media = snapshot
 
 
 @api.route('/healthz')
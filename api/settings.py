@@ -1,11 +1,62 @@
 from enum import Enum, EnumMeta
 import os
-from typing import Dict, List
+from typing import Dict, Iterable, List
 
 PAGINATION = {
     'DEFAULT_PER_PAGE': 25,
 }
 
+PERMITTED_DATABASES = {
+    'NDJSON_MIMETYPE': 'application/x-ndjson',
+    'STREAM_CHUNK_SIZE': int(os.environ.get('PERMITTED_DATABASES_STREAM_CHUNK_SIZE', 1000)),
+    # NDJSON bodies larger than this number of bytes are spooled to a temporary file
+    'STREAM_SPOOL_MAX_SIZE': int(os.environ.get('PERMITTED_DATABASES_STREAM_SPOOL_MAX_SIZE', 1024 * 1024)),
+    # 'python' evaluates cached policies in the process, 'sql' matches patterns in the database
+    'EVALUATION': os.environ.get('PERMITTED_DATABASES_EVALUATION', 'python'),
+    # Larger lists of database ids are sent to the database through a temporary table
+    'SQL_VALUES_LIMIT': int(os.environ.get('PERMITTED_DATABASES_SQL_VALUES_LIMIT', 500)),
+}
+
+POLICY_CACHE = {
+    'MAX_SIZE': int(os.environ.get('POLICY_CACHE_MAX_SIZE', 10000)),
+    'TTL': float(os.environ.get('POLICY_CACHE_TTL', 60)),
+    'GENERATION_CHECK_INTERVAL': float(os.environ.get('POLICY_GENERATION_CHECK_INTERVAL', 1)),
+}
+
+AUTH0 = {
+    'TOKEN_REFRESH_MARGIN': float(os.environ.get('AUTH0_TOKEN_REFRESH_MARGIN', 60)),
+    'TIMEOUT': float(os.environ.get('AUTH0_TIMEOUT', 5)),
+    'POOL_SIZE': int(os.environ.get('AUTH0_POOL_SIZE', 10)),
+    'MAX_CONCURRENCY': int(os.environ.get('AUTH0_MAX_CONCURRENCY', 8)),
+}
+
+USER_PROFILE_CACHE = {
+    'MAX_SIZE': int(os.environ.get('USER_PROFILE_CACHE_MAX_SIZE', 1000)),
+    'TTL': float(os.environ.get('USER_PROFILE_CACHE_TTL', 300)),
+    'NEGATIVE_TTL': float(os.environ.get('USER_PROFILE_CACHE_NEGATIVE_TTL', 10)),
+}
+
+ROLE_COUNT_CACHE = {
+    'MAX_SIZE': int(os.environ.get('ROLE_COUNT_CACHE_MAX_SIZE', 1000)),
+    'TTL': float(os.environ.get('ROLE_COUNT_CACHE_TTL', 60)),
+}
+
+ROLE_INDEX = {
+    'TTL': float(os.environ.get('ROLE_INDEX_TTL', 60)),
+}
+
+HTTP_CACHE = {
+    # Responses derived from roles and permissions are revalidated with their ETag on every use
+    'POLICY_CACHE_CONTROL': 'private, no-cache',
+    'ACTIONS_MAX_AGE': int(os.environ.get('HTTP_CACHE_ACTIONS_MAX_AGE', 86400)),
+}
+
+CAPABILITY_TOKEN = {
+    # /capability-token answers 503 without it
+    'SECRET_KEY': os.environ.get('CAPABILITY_TOKEN_SECRET_KEY'),
+    'TTL': float(os.environ.get('CAPABILITY_TOKEN_TTL', 300)),
+}
+
 TORTOISE_ORM = {
     'connections': {
         'default': os.environ.get('DB_URL', 'sqlite://db.sqlite3')
@@ -58,12 +109,52 @@ class ActionTypeMeta(EnumMeta):
         classdict['job:write:update'] = 'Update jobs'
         classdict['job:write:delete'] = 'Delete jobs'
 
-        return super().__new__(mcs, cls, bases, classdict)
+        enum_class = super().__new__(mcs, cls, bases, classdict)
+
+        # Precompute bits and hierarchy masks of actions
+        for i, action in enumerate(enum_class):
+            action._bit = 1 << i
+        for action in enum_class:
+            action._implies_mask = 0
+            action._implied_by_mask = 0
+            for other in enum_class:
+                if other is action or other.name.startswith(action.name + ':'):
+                    action._implies_mask |= other._bit
+                if other is action or action.name.startswith(other.name + ':'):
+                    action._implied_by_mask |= other._bit
+
+        return enum_class
 
 
 class ActionType(Enum, metaclass=ActionTypeMeta):
     """List of actions."""
 
+    @property
+    def bit(self) -> int:
+        """Bit of the action in action masks."""
+        return self._bit
+
+    @property
+    def implies_mask(self) -> int:
+        """Mask of the action and all actions implied by it (e.g. metadata -> metadata:read)."""
+        return self._implies_mask
+
+    @property
+    def implied_by_mask(self) -> int:
+        """Mask of the action and all actions implying it (e.g. metadata:read -> metadata)."""
+        return self._implied_by_mask
+
+    def is_permitted_by(self, permitted_mask: int) -> bool:
+        """Returns if the action is permitted by the mask of permitted actions.
+
+        Args:
+            permitted_mask (int)
+
+        Returns:
+            (bool)
+        """
+        return bool(permitted_mask & self._implied_by_mask)
+
     def describe(self) -> Dict[str, str]:
         """Returns action as a dict object.
 
@@ -104,3 +195,30 @@ class ActionType(Enum, metaclass=ActionTypeMeta):
         """
         all_keys = list(map(lambda c: c.name, cls))
         return all_keys
+
+    @classmethod
+    def to_mask(cls, actions: Iterable['ActionType']) -> int:
+        """Returns mask of actions.
+
+        Args:
+            actions (Iterable[ActionType])
+
+        Returns:
+            mask (int)
+        """
+        mask = 0
+        for action in actions:
+            mask |= action.bit
+        return mask
+
+    @classmethod
+    def from_mask(cls, mask: int) -> List['ActionType']:
+        """Returns list of actions in the mask.
+
+        Args:
+            mask (int)
+
+        Returns:
+            actions (List[ActionType]): Actions in the order of definition.
+        """
+        return [action for action in cls if mask & action.bit]
@@ -0,0 +1,134 @@
+"""Evaluation of permissions in memory from policy snapshots.
+
+Snapshots are served by ``GET /policy-snapshot``. This module depends on neither
+the database nor the web framework, so other services can embed it.
+
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from api.policy import CompiledPolicy, get_pattern_masks, merge_pattern_masks
+from api.settings import ActionType
+
+
+class PolicySnapshotEvaluator:
+    """Evaluator of permissions reproducing ``UserModel`` semantics from a snapshot."""
+
+    def __init__(self, document: Optional[Dict] = None):
+        """Initialize evaluator.
+
+        Args:
+            document (Optional[Dict]): Full snapshot to load.
+
+        """
+        self.version: Optional[int] = None
+        self._role_pattern_masks: Dict[int, Dict[str, int]] = {}
+        self._user_role_ids: Dict[str, List[int]] = {}
+        self._policies: Dict[str, CompiledPolicy] = {}
+        if document is not None:
+            self.apply(document)
+
+    def apply(self, document: Dict):
+        """Load a full snapshot or apply a delta.
+
+        Args:
+            document (Dict): Snapshot returned by ``GET /policy-snapshot``.
+
+        Raises:
+            ValueError: If the delta does not start from the version of the evaluator.
+
+        """
+        if document['full']:
+            self._role_pattern_masks = {}
+            self._user_role_ids = {}
+        elif document['since'] != self.version:
+            raise ValueError('Delta since version {} cannot be applied to version {}'.format(
+                document['since'], self.version,
+            ))
+
+        for role in document['roles']:
+            self._role_pattern_masks[role['role_id']] = get_pattern_masks(
+                # Actions unknown to this version of the package are ignored
+                {
+                    'databases': permission['databases'],
+                    'action_ids': [
+                        action_id for action_id in permission['action_ids'] if action_id in ActionType.__members__
+                    ],
+                }
+                for permission in role['permissions']
+            )
+        for role_id in document['deleted_role_ids']:
+            self._role_pattern_masks.pop(role_id, None)
+        for user_id, role_ids in document['user_roles'].items():
+            if role_ids:
+                self._user_role_ids[user_id] = list(role_ids)
+            else:
+                self._user_role_ids.pop(user_id, None)
+
+        self._policies = {}
+        self.version = document['version']
+
+    def get_policy(self, user_id: str) -> CompiledPolicy:
+        """Returns the compiled policy of the user.
+
+        Args:
+            user_id (str)
+
+        Returns:
+            (CompiledPolicy): Empty if the user does not exist.
+
+        """
+        policy = self._policies.get(user_id)
+        if policy is None:
+            policy = CompiledPolicy(pattern_masks=merge_pattern_masks(*(
+                self._role_pattern_masks.get(role_id, {}) for role_id in self._user_role_ids.get(user_id, [])
+            )))
+            self._policies[user_id] = policy
+        return policy
+
+    def get_permitted_actions(self, user_id: str, database_id: str) -> List[ActionType]:
+        """Returns permitted actions of the user on the database.
+
+        Args:
+            user_id (str)
+            database_id (str)
+
+        Returns:
+            (List[ActionType])
+
+        """
+        return self.get_policy(user_id).get_permitted_actions(database_id)
+
+    def is_user_permitted_action(self, user_id: str, action: ActionType, database_id: str) -> bool:
+        """Returns if the user has permission for the action on the database.
+
+        Args:
+            user_id (str)
+            action (ActionType)
+            database_id (str)
+
+        Returns:
+            (bool)
+
+        """
+        return self.get_policy(user_id).is_permitted(action, database_id)
+
+    def filter_permitted_databases(
+        self,
+        user_id: str,
+        action: ActionType,
+        database_ids: List[str],
+    ) -> Tuple[List[str], List[int]]:
+        """Returns database ids on which the user is permitted the action from input list.
+
+        Args:
+            user_id (str)
+            action (ActionType)
+            database_ids (List[str])
+
+        Returns:
+            permitted_database_ids (List[str]): Ids of permitted databases.
+            permitted_indices (List [int]): Indices of permitted databases in input.
+
+        """
+        return self.get_policy(user_id).filter_permitted_databases(action, database_ids)
@@ -0,0 +1,387 @@
+"""Evaluation of permissions inside the database."""
+
+from typing import List, Optional, Sequence, Tuple, Union
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from api import settings
+from api.settings import ActionType
+
+# Tokens of parsed database patterns
+ANY_CHARACTERS = ('*',)
+ANY_CHARACTER = ('?',)
+NEVER = ('never',)
+
+# A character set is ('set', negated, items) where items are characters or (first, last) ranges
+CharacterSetItem = Union[str, Tuple[str, str]]
+
+
+def parse_database_pattern(database_pattern: str) -> List[tuple]:
+    """Parse a database pattern with the same rules as ``fnmatch.translate``.
+
+    Args:
+        database_pattern (str): Pattern in the format of fnmatch.
+
+    Returns:
+        (List[tuple]): Tokens. ('literal', character), ('set', negated, items),
+            ANY_CHARACTERS, ANY_CHARACTER or NEVER.
+
+    """
+    tokens: List[tuple] = []
+    i, n = 0, len(database_pattern)
+    while i < n:
+        c = database_pattern[i]
+        i += 1
+        if c == '*':
+            if not tokens or tokens[-1] is not ANY_CHARACTERS:
+                tokens.append(ANY_CHARACTERS)
+        elif c == '?':
+            tokens.append(ANY_CHARACTER)
+        elif c == '[':
+            j = i
+            if j < n and database_pattern[j] == '!':
+                j += 1
+            if j < n and database_pattern[j] == ']':
+                j += 1
+            while j < n and database_pattern[j] != ']':
+                j += 1
+            if j >= n:
+                # Unclosed bracket is a literal
+                tokens.append(('literal', '['))
+                continue
+            body = database_pattern[i:j]
+            i = j + 1
+            negated = body.startswith('!')
+            if negated:
+                body = body[1:]
+            items = _parse_character_set(body)
+            if items:
+                tokens.append(('set', negated, items))
+            else:
+                tokens.append(ANY_CHARACTER if negated else NEVER)
+        else:
+            tokens.append(('literal', c))
+    return tokens
+
+
+def _parse_character_set(body: str) -> List[CharacterSetItem]:
+    # A hyphen right after the first character or a range makes a range
+    chunks: List[str] = []
+    start, k = 0, 1
+    while True:
+        k = body.find('-', k)
+        if k < 0:
+            break
+        chunks.append(body[start:k])
+        start = k + 1
+        k += 3
+    chunk = body[start:]
+    if chunk:
+        chunks.append(chunk)
+    elif chunks:
+        chunks[-1] += '-'
+
+    # Remove empty ranges
+    for k in range(len(chunks) - 1, 0, -1):
+        if chunks[k - 1] and chunks[k] and chunks[k - 1][-1] > chunks[k][0]:
+            chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+            del chunks[k]
+
+    items: List[CharacterSetItem] = []
+    for k, chunk in enumerate(chunks):
+        characters = list(chunk)
+        if k > 0 and characters and items and isinstance(items[-1], str):
+            items[-1] = (items[-1], characters.pop(0))
+        items.extend(characters)
+    return items
+
+
+def to_sqlite_glob(database_pattern: str) -> Optional[str]:
+    """Translate a database pattern into an equivalent pattern of SQLite GLOB.
+
+    Args:
+        database_pattern (str): Pattern in the format of fnmatch.
+
+    Returns:
+        (Optional[str]): None if the pattern matches nothing.
+
+    """
+    parts: List[str] = []
+    for token in parse_database_pattern(database_pattern):
+        if token is NEVER:
+            return None
+        elif token is ANY_CHARACTERS:
+            parts.append('*')
+        elif token is ANY_CHARACTER:
+            parts.append('?')
+        elif token[0] == 'literal':
+            parts.append('[{}]'.format(token[1]) if token[1] in '*?[' else token[1])
+        else:
+            parts.append(_to_sqlite_character_set(token[1], token[2]))
+    return ''.join(parts)
+
+
+def _to_sqlite_character_set(negated: bool, items: List[CharacterSetItem]) -> str:
+    # GLOB has no escape: ']' must come first, '-' last and '^' anywhere but first
+    characters = set()
+    ranges: List[str] = []
+    for item in items:
+        if isinstance(item, str):
+            characters.add(item)
+            continue
+        first, last = item
+        while first <= last and first in ']-^':
+            characters.add(first)
+            first = chr(ord(first) + 1)
+        while first <= last and last in ']-^':
+            characters.add(last)
+            last = chr(ord(last) - 1)
+        if first < last:
+            ranges.append('{}-{}'.format(first, last))
+        elif first == last:
+            characters.add(first)
+
+    body = ''.join(
+        [']' if ']' in characters else '']
+        + ranges
+        + sorted(characters - set(']-^'))
+        + ['^' if '^' in characters else '']
+        + ['-' if '-' in characters else '']
+    )
+    if body == '^' and not negated:
+        return '^'
+    if body == '^-':
+        body = '-^'
+    return '[{}{}]'.format('^' if negated else '', body)
+
+
+def to_postgres_like(database_pattern: str) -> Optional[str]:
+    r"""Translate a database pattern into an equivalent pattern of LIKE with ESCAPE '\'.
+
+    Args:
+        database_pattern (str): Pattern in the format of fnmatch.
+
+    Returns:
+        (Optional[str]): None if the pattern has a character set, which LIKE cannot express.
+
+    """
+    parts: List[str] = []
+    for token in parse_database_pattern(database_pattern):
+        if token is ANY_CHARACTERS:
+            parts.append('%')
+        elif token is ANY_CHARACTER:
+            parts.append('_')
+        elif token[0] == 'literal':
+            parts.append('\\' + token[1] if token[1] in '\\%_' else token[1])
+        else:
+            return None
+    return ''.join(parts)
+
+
+def to_postgres_regex(database_pattern: str) -> Optional[str]:
+    """Translate a database pattern into an equivalent advanced regular expression of PostgreSQL.
+
+    Args:
+        database_pattern (str): Pattern in the format of fnmatch.
+
+    Returns:
+        (Optional[str]): None if the pattern matches nothing.
+
+    """
+    parts: List[str] = ['^']
+    for token in parse_database_pattern(database_pattern):
+        if token is NEVER:
+            return None
+        elif token is ANY_CHARACTERS:
+            parts.append('.*')
+        elif token is ANY_CHARACTER:
+            parts.append('.')
+        elif token[0] == 'literal':
+            parts.append(_escape_postgres_regex(token[1]))
+        else:
+            parts.append('[{}{}]'.format('^' if token[1] else '', ''.join(
+                _escape_postgres_regex(item) if isinstance(item, str)
+                else '{}-{}'.format(_escape_postgres_regex(item[0]), _escape_postgres_regex(item[1]))
+                for item in token[2]
+            )))
+    parts.append('$')
+    return ''.join(parts)
+
+
+def _escape_postgres_regex(character: str) -> str:
+    # Backslash followed by a non-alphanumeric character is the character itself, even in brackets
+    return character if character.isalnum() else '\\' + character
+
+
+async def get_permitted_database_patterns(
+    connection: BaseDBAsyncClient,
+    user_id: str,
+    action: ActionType,
+) -> List[str]:
+    """Returns distinct database patterns of the user's roles granting the action.
+
+    Args:
+        connection (BaseDBAsyncClient)
+        user_id (str)
+        action (ActionType)
+
+    Returns:
+        (List[str])
+
+    """
+    action_ids = [granting_action.name for granting_action in ActionType.from_mask(action.implied_by_mask)]
+    placeholders = _placeholders(connection, 2, len(action_ids))
+    rows = await connection.execute_query_dict(
+        'SELECT DISTINCT "database"."database_pattern" FROM "user_role" '
+        'JOIN "permissionmodel" "rule" ON "rule"."role_id" = "user_role"."rolemodel_id" '
+        'JOIN "permissionactionmodel" "action" ON "action"."permission_id" = "rule"."id" '
+        'JOIN "permissiondatabasemodel" "database" ON "database"."permission_id" = "rule"."id" '
+        'WHERE "user_role"."usermodel_id" = {} AND "action"."action_id" IN ({})'.format(
+            _placeholder(connection, 1),
+            ', '.join(placeholders),
+        ),
+        [user_id, *action_ids],
+    )
+    return [row['database_pattern'] for row in rows]
+
+
+async def filter_permitted_databases_in_sql(
+    user_id: str,
+    action: ActionType,
+    database_ids: Sequence[str],
+    values_limit: Optional[int] = None,
+) -> Tuple[List[str], List[int]]:
+    """Returns permitted database ids from input list, matching patterns in the database.
+
+    Patterns are matched by GLOB on SQLite, and by LIKE or regular expressions on PostgreSQL.
+    Candidate ids are sent as a VALUES list, or through a temporary table if there are more
+    than ``values_limit`` of them.
+
+    Args:
+        user_id (str)
+        action (ActionType)
+        database_ids (Sequence[str])
+        values_limit (Optional[int]): Defaults to ``settings.PERMITTED_DATABASES['SQL_VALUES_LIMIT']``.
+
+    Returns:
+        permitted_database_ids (List[str]): Ids of permitted databases.
+        permitted_indices (List [int]): Indices of permitted databases in input.
+
+    """
+    if values_limit is None:
+        values_limit = settings.PERMITTED_DATABASES['SQL_VALUES_LIMIT']
+    if not database_ids:
+        return [], []
+
+    # Imported here because api.models imports this module
+    from api.models import UserModel
+
+    async with in_transaction(UserModel._meta.default_connection) as connection:
+        dialect = connection.capabilities.dialect
+        database_patterns = await get_permitted_database_patterns(connection, user_id, action)
+        if dialect == 'postgres':
+            matchers = [
+                ('LIKE', to_postgres_like(database_pattern)) for database_pattern in database_patterns
+            ]
+            matchers = [
+                (operator, expression) if expression is not None else ('~', to_postgres_regex(database_pattern))
+                for database_pattern, (operator, expression) in zip(database_patterns, matchers)
+            ]
+        else:
+            matchers = [('GLOB', to_sqlite_glob(database_pattern)) for database_pattern in database_patterns]
+        matchers = [(operator, expression) for operator, expression in matchers if expression is not None]
+        if not matchers:
+            return [], []
+
+        if len(database_ids) <= values_limit:
+            indices = await _match_candidates(connection, matchers, database_ids, use_temporary_table=False)
+        else:
+            await _fill_candidate_table(connection, database_ids, values_limit)
+            indices = await _match_candidates(connection, matchers, database_ids, use_temporary_table=True)
+
+    return [database_ids[i] for i in indices], indices
+
+
+async def _fill_candidate_table(connection: BaseDBAsyncClient, database_ids: Sequence[str], chunk_size: int):
+    if connection.capabilities.dialect == 'postgres':
+        await connection.execute_script(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS "candidate_database" '
+            '("idx" INT PRIMARY KEY, "database_id" TEXT NOT NULL) ON COMMIT DELETE ROWS'
+        )
+    else:
+        await connection.execute_script(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS "candidate_database" '
+            '("idx" INTEGER PRIMARY KEY, "database_id" TEXT NOT NULL)'
+        )
+        await connection.execute_script('DELETE FROM "candidate_database"')
+
+    query = 'INSERT INTO "candidate_database" ("idx", "database_id") VALUES ({}, {})'.format(
+        *_placeholders(connection, 1, 2),
+    )
+    for offset in range(0, len(database_ids), chunk_size):
+        await connection.execute_many(query, [
+            [offset + i, database_id]
+            for i, database_id in enumerate(database_ids[offset:offset + chunk_size])
+        ])
+
+
+async def _match_candidates(
+    connection: BaseDBAsyncClient,
+    matchers: List[Tuple[str, str]],
+    database_ids: Sequence[str],
+    use_temporary_table: bool,
+) -> List[int]:
+    values: list = []
+
+    def add_value(value, postgres_type: str) -> str:
+        values.append(value)
+        placeholder = _placeholder(connection, len(values))
+        if connection.capabilities.dialect == 'postgres':
+            # Types of parameters in VALUES cannot be inferred
+            placeholder += '::' + postgres_type
+        return placeholder
+
+    tables = []
+    if use_temporary_table:
+        candidates = '"candidate_database"'
+    else:
+        candidates = '"candidate"'
+        tables.append('"candidate" ("idx", "database_id") AS (VALUES {})'.format(', '.join(
+            '({}, {})'.format(add_value(i, 'int'), add_value(database_id, 'text'))
+            for i, database_id in enumerate(database_ids)
+        )))
+
+    conditions = []
+    for operator, table in (('GLOB', '"glob_pattern"'), ('LIKE', '"like_pattern"'), ('~', '"regex_pattern"')):
+        expressions = [expression for matcher_operator, expression in matchers if matcher_operator == operator]
+        if not expressions:
+            continue
+        tables.append('{} ("expression") AS (VALUES {})'.format(
+            table,
+            ', '.join('({})'.format(add_value(expression, 'text')) for expression in expressions),
+        ))
+        conditions.append('EXISTS (SELECT 1 FROM {0} WHERE {1}."database_id" {2} {0}."expression"{3})'.format(
+            table,
+            candidates,
+            operator,
+            " ESCAPE '\\'" if operator == 'LIKE' else '',
+        ))
+
+    rows = await connection.execute_query_dict(
+        'WITH {} SELECT "idx" FROM {} WHERE {} ORDER BY "idx"'.format(
+            ', '.join(tables),
+            candidates,
+            ' OR '.join(conditions),
+        ),
+        values,
+    )
+    return [row['idx'] for row in rows]
+
+
+def _placeholder(connection: BaseDBAsyncClient, position: int) -> str:
+    return '${}'.format(position) if connection.capabilities.dialect == 'postgres' else '?'
+
+
+def _placeholders(connection: BaseDBAsyncClient, start: int, count: int) -> List[str]:
+    return [_placeholder(connection, position) for position in range(start, start + count)]
@@ -1,25 +1,25 @@
+import base64
+import binascii
 import fnmatch
-import os
-from typing import List
-
-from auth0.v3.authentication import GetToken
-from auth0.v3.management import Auth0
+import functools
+import hashlib
+import json
+import re
+import tempfile
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 
 
 def get_auth0_client():
-    # env variables should be defined docker-compose.yaml or .env or ...
-    domain = os.environ.get("AUTH0_DOMAIN")
-    non_interactive_client_id = os.environ.get("AUTH0_CLIENT_ID")
-    non_interactive_client_secret = os.environ.get("AUTH0_CLIENT_SECRET")
+    """Returns the shared Auth0 client with a cached Management API token.
 
-    get_token = GetToken(domain)
-    token = get_token.client_credentials(non_interactive_client_id,
-                                         non_interactive_client_secret, 'https://{}/api/v2/'.format(domain))
-    mgmt_api_token = token['access_token']
+    Returns:
+        (auth0.v3.management.Auth0)
 
-    auth0 = Auth0(domain, mgmt_api_token)
+    """
+    # Imported here so that policy evaluation does not require the Auth0 SDK
+    from api.auth0_client import get_auth0_client_manager
 
-    return auth0
+    return get_auth0_client_manager().get_client()
 
 
 def build_search_query(search: str):
@@ -39,6 +39,162 @@ def build_search_query(search: str):
     return built_query
 
 
+class DatabasePatternMatcher:
+    """Matcher of database ids against a list of database patterns.
+
+    All patterns are compiled into a single regular expression, so a database id
+    is scanned once regardless of the number of patterns.
+
+    """
+
+    def __init__(self, database_patterns: Sequence[str]):
+        """Compile database patterns.
+
+        Args:
+            database_patterns (Sequence[str]): Patterns in the format of fnmatch.
+
+        """
+        self.database_patterns: Tuple[str, ...] = tuple(database_patterns)
+        translated_patterns = [fnmatch.translate(pattern) for pattern in self.database_patterns]
+
+        # Alternation stops at the first matched pattern
+        self._match_any = re.compile('|'.join(translated_patterns) or '(?!)').match
+
+        # Optional lookaheads record every matched pattern by an empty marker group
+        regex_all = re.compile(''.join(
+            f'(?:(?={translated_pattern})(?P<p{i}>))?'
+            for i, translated_pattern in enumerate(translated_patterns)
+        ))
+        self._match_all = regex_all.match
+        self._marker_positions: List[int] = [
+            regex_all.groupindex[f'p{i}'] - 1 for i in range(len(translated_patterns))
+        ]
+
+    def __len__(self) -> int:
+        return len(self.database_patterns)
+
+    def matches(self, database_id: str) -> bool:
+        """Check if the database id matches any of the patterns.
+
+        Args:
+            database_id (str)
+
+        Returns:
+            (bool)
+
+        """
+        return self._match_any(database_id) is not None
+
+    def matched_indices(self, database_id: str) -> List[int]:
+        """Returns indices of all patterns matching the database id.
+
+        Args:
+            database_id (str)
+
+        Returns:
+            (List[int]): Indices in database_patterns.
+
+        """
+        groups = self._match_all(database_id).groups()
+        return [i for i, position in enumerate(self._marker_positions) if groups[position] is not None]
+
+
+@functools.lru_cache(maxsize=1024)
+def get_database_pattern_matcher(database_patterns: Tuple[str, ...]) -> DatabasePatternMatcher:
+    """Returns a cached matcher for the database patterns.
+
+    Args:
+        database_patterns (Tuple[str, ...])
+
+    Returns:
+        (DatabasePatternMatcher)
+
+    """
+    return DatabasePatternMatcher(database_patterns)
+
+
+# Cursor requesting the first page of keyset pagination. It never decodes as a position.
+FIRST_PAGE_CURSOR = 'start'
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Encode position of keyset pagination into an opaque cursor.
+
+    Args:
+        position (Dict[str, Any]): Keys of the last item in a page.
+
+    Returns:
+        cursor (str)
+
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode cursor of keyset pagination.
+
+    Args:
+        cursor (str)
+
+    Returns:
+        position (Dict[str, Any]): Keys of the last item in a page.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if not isinstance(position, dict):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return position
+
+
+def make_etag(version: Any, *parts: Union[str, bytes]) -> str:
+    """Build a strong ETag of a representation of data at a version.
+
+    Args:
+        version (Any): Version of the data, e.g. policy generation.
+        *parts (Union[str, bytes]): Values identifying the representation, e.g. URL and user.
+
+    Returns:
+        etag (str): Quoted entity tag.
+
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return '"{}-{}"'.format(version, digest.hexdigest())
+
+
+def is_etag_matched(if_none_match: Optional[str], etag: str) -> bool:
+    """Check if an If-None-Match header matches the ETag with weak comparison.
+
+    Args:
+        if_none_match (Optional[str]): Value of If-None-Match header.
+        etag (str)
+
+    Returns:
+        (bool)
+
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque_tag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith('W/') else candidate) == opaque_tag:
+            return True
+    return False
+
+
 def match_exist_in_databases(database_id_to_check: str, database_patterns: List[str]):
     """Check if the matched database_id exists in list of database pattern.
 
@@ -50,7 +206,84 @@ def match_exist_in_databases(database_id_to_check: str, database_patterns: List[
         (bool)
 
     """
-    for database_pattern in database_patterns:
-        if fnmatch.fnmatch(database_id_to_check, database_pattern):
-            return True
-    return False
+    return get_database_pattern_matcher(tuple(database_patterns)).matches(database_id_to_check)
+
+
+async def iterate_ndjson_chunks(byte_stream: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[List[Any]]:
+    """Parse NDJSON incrementally and yield values in chunks.
+
+    Args:
+        byte_stream (AsyncIterator[bytes]): Raw body of NDJSON.
+        chunk_size (int): Maximum number of values in a chunk.
+
+    Yields:
+        values (List[Any]): Decoded values. Blank lines are skipped.
+
+    Raises:
+        ValueError: If a line is not valid JSON. Values of preceding lines are yielded first.
+
+    """
+    async def iterate_lines() -> AsyncIterator[bytes]:
+        buffer = b''
+        async for data in byte_stream:
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line
+        yield buffer
+
+    values: List[Any] = []
+    async for line in iterate_lines():
+        if not line.strip():
+            continue
+        try:
+            values.append(json.loads(line))
+        except ValueError:
+            if values:
+                yield values
+            raise
+        if len(values) >= chunk_size:
+            yield values
+            values = []
+    if values:
+        yield values
+
+
+async def spool_byte_stream(byte_stream: AsyncIterator[bytes], max_size: int) -> IO[bytes]:
+    """Write a byte stream to a temporary file, kept in memory up to max_size bytes.
+
+    Args:
+        byte_stream (AsyncIterator[bytes])
+        max_size (int): Maximum number of bytes kept in memory before the file is moved to disk.
+
+    Returns:
+        (IO[bytes]): File positioned at its beginning. The caller closes it.
+
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        async for data in byte_stream:
+            file.write(data)
+    except BaseException:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+async def iterate_file(file: IO[bytes], block_size: int = 65536) -> AsyncIterator[bytes]:
+    """Read a file in blocks.
+
+    Args:
+        file (IO[bytes])
+        block_size (int): Maximum number of bytes in a block.
+
+    Yields:
+        data (bytes)
+
+    """
+    while True:
+        data = file.read(block_size)
+        if not data:
+            break
+        yield data
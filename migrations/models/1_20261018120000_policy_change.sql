@@ -0,0 +1,14 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "policychangemodel" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "user_ids" TEXT,
+    "created_at" TIMESTAMP NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS "policygenerationmodel" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "generation" INT NOT NULL  DEFAULT 0
+);
+INSERT INTO "policygenerationmodel" ("id", "generation") VALUES (1, 0);
+-- downgrade --
+DROP TABLE IF EXISTS "policygenerationmodel";
+DROP TABLE IF EXISTS "policychangemodel";
@@ -0,0 +1,11 @@
+-- upgrade --
+CREATE VIRTUAL TABLE IF NOT EXISTS "rolemodel_fts" USING fts5(name, description, content='rolemodel', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS "rolemodel_fts_insert" AFTER INSERT ON "rolemodel" BEGIN INSERT INTO "rolemodel_fts"(rowid, name, description) VALUES (new.id, new.name, new.description); END;
+CREATE TRIGGER IF NOT EXISTS "rolemodel_fts_delete" AFTER DELETE ON "rolemodel" BEGIN INSERT INTO "rolemodel_fts"("rolemodel_fts", rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END;
+CREATE TRIGGER IF NOT EXISTS "rolemodel_fts_update" AFTER UPDATE ON "rolemodel" BEGIN INSERT INTO "rolemodel_fts"("rolemodel_fts", rowid, name, description) VALUES ('delete', old.id, old.name, old.description); INSERT INTO "rolemodel_fts"(rowid, name, description) VALUES (new.id, new.name, new.description); END;
+INSERT INTO "rolemodel_fts"("rolemodel_fts") VALUES ('rebuild');
+-- downgrade --
+DROP TRIGGER IF EXISTS "rolemodel_fts_update";
+DROP TRIGGER IF EXISTS "rolemodel_fts_delete";
+DROP TRIGGER IF EXISTS "rolemodel_fts_insert";
+DROP TABLE IF EXISTS "rolemodel_fts";
@@ -0,0 +1,63 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "permissionmodel" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "position" INT NOT NULL,
+    "role_id" INT NOT NULL REFERENCES "rolemodel" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_permissionm_role_id_1d5bff" ON "permissionmodel" ("role_id");
+CREATE TABLE IF NOT EXISTS "permissionactionmodel" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "action_id" VARCHAR(255) NOT NULL,
+    "position" INT NOT NULL,
+    "permission_id" INT NOT NULL REFERENCES "permissionmodel" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_permissiona_action__e25f75" ON "permissionactionmodel" ("action_id");
+CREATE INDEX IF NOT EXISTS "idx_permissiona_permiss_648ccd" ON "permissionactionmodel" ("permission_id");
+CREATE TABLE IF NOT EXISTS "permissiondatabasemodel" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "database_pattern" VARCHAR(255) NOT NULL,
+    "position" INT NOT NULL,
+    "permission_id" INT NOT NULL REFERENCES "permissionmodel" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_permissiond_databas_ddb840" ON "permissiondatabasemodel" ("database_pattern");
+CREATE INDEX IF NOT EXISTS "idx_permissiond_permiss_f7457b" ON "permissiondatabasemodel" ("permission_id");
+INSERT INTO "permissionmodel" ("role_id", "position")
+    SELECT "rolemodel"."id", "rule"."key"
+    FROM "rolemodel", json_each("rolemodel"."permissions") AS "rule"
+    ORDER BY "rolemodel"."id", "rule"."key";
+INSERT INTO "permissiondatabasemodel" ("permission_id", "database_pattern", "position")
+    SELECT "permissionmodel"."id", "database"."value", "database"."key"
+    FROM "rolemodel", json_each("rolemodel"."permissions") AS "rule"
+    JOIN "permissionmodel" ON "permissionmodel"."role_id" = "rolemodel"."id" AND "permissionmodel"."position" = "rule"."key",
+    json_each("rule"."value", '$.databases') AS "database";
+INSERT INTO "permissionactionmodel" ("permission_id", "action_id", "position")
+    SELECT "permissionmodel"."id", "action"."value", "action"."key"
+    FROM "rolemodel", json_each("rolemodel"."permissions") AS "rule"
+    JOIN "permissionmodel" ON "permissionmodel"."role_id" = "rolemodel"."id" AND "permissionmodel"."position" = "rule"."key",
+    json_each("rule"."value", '$.action_ids') AS "action";
+ALTER TABLE "rolemodel" DROP COLUMN "permissions";
+-- downgrade --
+ALTER TABLE "rolemodel" ADD COLUMN "permissions" TEXT NOT NULL DEFAULT '[]';
+UPDATE "rolemodel" SET "permissions" = (
+    SELECT json_group_array(json_object(
+        'databases', json((
+            SELECT json_group_array("database_pattern") FROM (
+                SELECT "database_pattern" FROM "permissiondatabasemodel"
+                WHERE "permission_id" = "rule"."id" ORDER BY "position"
+            )
+        )),
+        'action_ids', json((
+            SELECT json_group_array("action_id") FROM (
+                SELECT "action_id" FROM "permissionactionmodel"
+                WHERE "permission_id" = "rule"."id" ORDER BY "position"
+            )
+        ))
+    ))
+    FROM (
+        SELECT "id" FROM "permissionmodel"
+        WHERE "role_id" = "rolemodel"."id" ORDER BY "position"
+    ) AS "rule"
+);
+DROP TABLE IF EXISTS "permissionactionmodel";
+DROP TABLE IF EXISTS "permissiondatabasemodel";
+DROP TABLE IF EXISTS "permissionmodel";
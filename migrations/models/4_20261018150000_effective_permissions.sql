@@ -0,0 +1,17 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "effectivepermissionmodel" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "database_pattern" VARCHAR(255) NOT NULL,
+    "action_ids" TEXT NOT NULL,
+    "user_id" VARCHAR(255) NOT NULL REFERENCES "usermodel" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_effectivepe_user_id_0965ca" UNIQUE ("user_id", "database_pattern")
+);
+INSERT INTO "effectivepermissionmodel" ("user_id", "database_pattern", "action_ids")
+    SELECT "user_role"."usermodel_id", "database"."database_pattern", json_group_array(DISTINCT "action"."action_id")
+    FROM "user_role"
+    JOIN "permissionmodel" "rule" ON "rule"."role_id" = "user_role"."rolemodel_id"
+    JOIN "permissiondatabasemodel" "database" ON "database"."permission_id" = "rule"."id"
+    JOIN "permissionactionmodel" "action" ON "action"."permission_id" = "rule"."id"
+    GROUP BY "user_role"."usermodel_id", "database"."database_pattern";
+-- downgrade --
+DROP TABLE IF EXISTS "effectivepermissionmodel";
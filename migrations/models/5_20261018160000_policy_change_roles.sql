@@ -0,0 +1,4 @@
+-- upgrade --
+ALTER TABLE "policychangemodel" ADD "role_ids" TEXT NOT NULL DEFAULT '[]';
+-- downgrade --
+ALTER TABLE "policychangemodel" DROP COLUMN "role_ids";
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# Copyright API authors
+"""Benchmark of permission evaluation on synthetic policy stores.
+
+Stores are generated deterministically from a seed in an in-memory SQLite database,
+so results of different versions can be compared. Results are printed as JSON.
+
+Usage:
+    PYTHONPATH=. python test/benchmarks/permissions.py [--scale small|medium|large]
+        [--roles 10 100] [--roles-per-user 1 10] [--mixes exact prefix glob mixed]
+        [--candidates 10 1000] [--seed 0] [--repeat 3] [--output results.json] [--baseline baseline.json]
+
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import random
+from typing import Any, Dict, List, Tuple
+
+from tortoise import Tortoise
+
+from api import settings
+from api.cache import policy_cache, policy_generation, role_count_cache, role_index_cache
+from api.models import (
+    EffectivePermissionModel,
+    PermissionActionModel,
+    PermissionDatabaseModel,
+    PermissionModel,
+    RoleModel,
+    UserModel,
+)
+from api.settings import ActionType
+from api.sql_evaluation import filter_permitted_databases_in_sql
+from api.utils import match_exist_in_databases
+from timing import measure, measure_async
+
+SCALES = {
+    'small': {
+        'roles': [10, 100],
+        'roles_per_user': [1, 10],
+        'mixes': ['exact', 'prefix', 'glob', 'mixed'],
+        'candidates': [10, 1000],
+    },
+    'medium': {
+        'roles': [100, 1000],
+        'roles_per_user': [10, 100],
+        'mixes': ['exact', 'prefix', 'glob', 'mixed'],
+        'candidates': [10, 10000, 100000],
+    },
+    'large': {
+        'roles': [1000, 10000],
+        'roles_per_user': [100, 500],
+        'mixes': ['exact', 'prefix', 'glob', 'mixed'],
+        'candidates': [10, 100000, 1000000],
+    },
+}
+
+USER_ID = 'benchmark_user'
+RULES_PER_ROLE = 3
+PATTERNS_PER_RULE = 2
+ACTIONS_PER_RULE = 2
+# Number of single database checks timed per run
+SINGLE_CHECKS = 100
+MATCH_CHECKS = 10000
+
+
+def make_pattern(rnd: random.Random, mix: str) -> str:
+    """Returns a database pattern of the mix.
+
+    Args:
+        rnd (random.Random)
+        mix (str): 'exact', 'prefix', 'glob' or 'mixed'.
+
+    Returns:
+        (str)
+
+    """
+    if mix == 'mixed':
+        mix = rnd.choices(['exact', 'prefix', 'glob'], weights=[60, 25, 15])[0]
+    number = rnd.randrange(1000)
+    if mix == 'exact':
+        return f'database-{number}'
+    if mix == 'prefix':
+        return f'project-{number % 100}-*'
+    return rnd.choice([
+        f'*-{number}-test',
+        f'database-{number}?',
+        f'x[0-{number % 10}]-{number}*',
+        f'*{number}*',
+    ])
+
+
+def make_candidates(rnd: random.Random, number_of_candidates: int) -> List[str]:
+    """Returns database ids to check.
+
+    Args:
+        rnd (random.Random)
+        number_of_candidates (int)
+
+    Returns:
+        (List[str])
+
+    """
+    candidates = []
+    for i in range(number_of_candidates):
+        number = rnd.randrange(1000)
+        candidates.append(rnd.choice([
+            f'database-{number}',
+            f'project-{number % 100}-{i}',
+            f'x{number % 10}-{number}-test',
+            f'other-{i}',
+        ]))
+    return candidates
+
+
+async def build_store(
+    rnd: random.Random,
+    number_of_roles: int,
+    roles_per_user: int,
+    mix: str,
+) -> List[str]:
+    """Create roles and a user holding some of them.
+
+    Args:
+        rnd (random.Random)
+        number_of_roles (int)
+        roles_per_user (int)
+        mix (str)
+
+    Returns:
+        (List[str]): Database patterns of the user.
+
+    """
+    action_ids = ActionType.keys()
+    roles = [RoleModel(id=i, name=f'role{i}', description='') for i in range(1, number_of_roles + 1)]
+    rules, databases, actions = [], [], []
+    patterns_by_role_id: Dict[int, List[str]] = {}
+    for role in roles:
+        for position in range(RULES_PER_ROLE):
+            rule_id = len(rules) + 1
+            rules.append(PermissionModel(id=rule_id, role_id=role.id, position=position))
+            for pattern_position in range(PATTERNS_PER_RULE):
+                database_pattern = make_pattern(rnd, mix)
+                patterns_by_role_id.setdefault(role.id, []).append(database_pattern)
+                databases.append(PermissionDatabaseModel(
+                    permission_id=rule_id,
+                    database_pattern=database_pattern,
+                    position=pattern_position,
+                ))
+            for action_position, action_id in enumerate(rnd.sample(action_ids, ACTIONS_PER_RULE)):
+                actions.append(PermissionActionModel(
+                    permission_id=rule_id,
+                    action_id=action_id,
+                    position=action_position,
+                ))
+    await RoleModel.bulk_create(roles)
+    await PermissionModel.bulk_create(rules)
+    await PermissionDatabaseModel.bulk_create(databases)
+    await PermissionActionModel.bulk_create(actions)
+
+    user_role_ids = sorted(role.id for role in rnd.sample(roles, roles_per_user))
+    user = await UserModel.create(id=USER_ID)
+    await user.roles.add(*await RoleModel.filter(id__in=user_role_ids))
+    await EffectivePermissionModel.refresh([USER_ID])
+    return [pattern for role_id in user_role_ids for pattern in patterns_by_role_id[role_id]]
+
+
+def clear_caches():
+    """Clear caches of the process between stores."""
+    for cache in (policy_cache, role_count_cache, role_index_cache):
+        cache.clear()
+    policy_generation.reset()
+
+
+async def run_case(
+    case: Dict[str, Any],
+    candidates_list: List[int],
+    seed: int,
+    repeat: int,
+) -> List[Dict[str, Any]]:
+    """Build a store and time operations on it.
+
+    Args:
+        case (Dict[str, Any]): Parameters of the store.
+        candidates_list (List[int]): Numbers of candidate database ids.
+        seed (int)
+        repeat (int)
+
+    Returns:
+        (List[Dict[str, Any]]): Results.
+
+    """
+    rnd = random.Random('{}-{roles}-{roles_per_user}-{mix}'.format(seed, **case))
+    await Tortoise.init(db_url='sqlite://:memory:', modules={'models': ['api.models']})
+    await Tortoise.generate_schemas()
+    clear_caches()
+    results = []
+    try:
+        user_patterns = await build_store(rnd, case['roles'], case['roles_per_user'], case['mix'])
+        user = await UserModel.get(id=USER_ID)
+        action = getattr(ActionType, 'databases:read')
+
+        for number_of_candidates in candidates_list:
+            # Seeded separately, so that candidates do not depend on other numbers of candidates
+            candidates = make_candidates(random.Random(f'{seed}-{number_of_candidates}'), number_of_candidates)
+            single_candidates = candidates[:SINGLE_CHECKS]
+            match_candidates = candidates[:MATCH_CHECKS]
+
+            def run_match():
+                for database_id in match_candidates:
+                    match_exist_in_databases(database_id, user_patterns)
+
+            async def run_get_permitted_actions():
+                for database_id in single_candidates:
+                    await user.get_permitted_actions(database_id)
+
+            async def run_is_user_permitted_action():
+                for database_id in single_candidates:
+                    await user.is_user_permitted_action(action, database_id)
+
+            async def run_filter_permitted_databases():
+                await UserModel.filter_permitted_databases_of_user(USER_ID, action, candidates)
+
+            async def run_filter_permitted_databases_in_sql():
+                await filter_permitted_databases_in_sql(
+                    USER_ID,
+                    action,
+                    candidates,
+                    values_limit=settings.PERMITTED_DATABASES['SQL_VALUES_LIMIT'],
+                )
+
+            measurements = [
+                ('match_exist_in_databases', measure(run_match, repeat, len(match_candidates))),
+                ('get_permitted_actions', await measure_async(
+                    run_get_permitted_actions, repeat, len(single_candidates),
+                )),
+                ('is_user_permitted_action', await measure_async(
+                    run_is_user_permitted_action, repeat, len(single_candidates),
+                )),
+                ('filter_permitted_databases', await measure_async(run_filter_permitted_databases, repeat)),
+                ('filter_permitted_databases_in_sql', await measure_async(
+                    run_filter_permitted_databases_in_sql, repeat,
+                )),
+            ]
+            for operation, measurement in measurements:
+                results.append({
+                    'case': {**case, 'candidates': number_of_candidates, 'user_patterns': len(user_patterns)},
+                    'operation': operation,
+                    **measurement,
+                })
+    finally:
+        await Tortoise.close_connections()
+    return results
+
+
+def get_result_key(result: Dict[str, Any]) -> Tuple:
+    """Returns the key identifying a result across runs.
+
+    Args:
+        result (Dict[str, Any])
+
+    Returns:
+        (Tuple)
+
+    """
+    case = result['case']
+    return (case['roles'], case['roles_per_user'], case['mix'], case['candidates'], result['operation'])
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any]):
+    """Add ratios of per call time to the baseline to results.
+
+    Args:
+        results (List[Dict[str, Any]])
+        baseline (Dict[str, Any]): Output of a previous run.
+
+    """
+    baseline_results = {get_result_key(result): result for result in baseline['results']}
+    for result in results:
+        baseline_result = baseline_results.get(get_result_key(result))
+        if baseline_result:
+            result['baseline_ratio'] = result['per_call_seconds'] / baseline_result['per_call_seconds']
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run benchmarks.
+
+    Args:
+        args (argparse.Namespace)
+
+    Returns:
+        (Dict[str, Any]): Machine-readable results.
+
+    """
+    scale = SCALES[args.scale]
+    roles_list = args.roles or scale['roles']
+    roles_per_user_list = args.roles_per_user or scale['roles_per_user']
+    mixes = args.mixes or scale['mixes']
+    candidates_list = args.candidates or scale['candidates']
+
+    results = []
+    for roles, roles_per_user, mix in itertools.product(roles_list, roles_per_user_list, mixes):
+        if roles_per_user > roles:
+            continue
+        case = {'roles': roles, 'roles_per_user': roles_per_user, 'mix': mix}
+        results.extend(await run_case(case, candidates_list, args.seed, args.repeat))
+    return {
+        'benchmark': 'permissions',
+        'scale': args.scale,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--roles', type=int, nargs='+', help='Numbers of roles, overriding the scale.')
+    parser.add_argument('--roles-per-user', type=int, nargs='+', help='Numbers of roles of the user.')
+    parser.add_argument('--mixes', choices=['exact', 'prefix', 'glob', 'mixed'], nargs='+')
+    parser.add_argument('--candidates', type=int, nargs='+', help='Numbers of candidate database ids.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='File to write results to instead of stdout.')
+    parser.add_argument('--baseline', help='Results of a previous run to compare with.')
+    args = parser.parse_args()
+
+    output = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(output['results'], json.load(f))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
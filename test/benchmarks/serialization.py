@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# Copyright API authors
+"""Benchmark of serializing roles with marshmallow schemas and api.serializers.
+
+Usage:
+    PYTHONPATH=. python test/benchmarks/serialization.py [--roles 1000] [--repeat 5]
+
+"""
+
+import argparse
+import json
+from types import SimpleNamespace
+from typing import Dict, List
+
+from api.schemas import RoleDetailSchema
+from api.serializers import dump_roles
+from api.settings import ActionType
+from timing import measure
+
+
+class Role(SimpleNamespace):
+    """Role returning copies of permissions like RoleModel."""
+
+    @property
+    def permissions(self) -> List[Dict]:
+        return [
+            {'databases': list(permission['databases']), 'action_ids': list(permission['action_ids'])}
+            for permission in self._permissions
+        ]
+
+
+def make_roles(number_of_roles: int) -> List[Role]:
+    """Returns roles with a few permissions each, like GET /roles?per_page=0.
+
+    Args:
+        number_of_roles (int)
+
+    Returns:
+        (List[Role])
+
+    """
+    action_ids = ActionType.keys()
+    return [
+        Role(
+            id=i,
+            name=f'role{i}',
+            description=f'Description of role{i}',
+            _permissions=[
+                {
+                    'databases': [f'project{i}-*', f'database{i}-{j}'],
+                    'action_ids': action_ids[j::5],
+                }
+                for j in range(3)
+            ],
+        )
+        for i in range(1, number_of_roles + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--roles', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    roles = make_roles(args.roles)
+
+    def dump_with_schema() -> bytes:
+        return json.dumps({'roles': RoleDetailSchema(many=True).dump(roles)}).encode()
+
+    def dump_fast() -> bytes:
+        return json.dumps({'roles': dump_roles(roles)}).encode()
+
+    assert json.loads(dump_with_schema()) == json.loads(dump_fast()), 'Outputs differ'
+    schema_seconds = measure(dump_with_schema, args.repeat)['min_seconds']
+    fast_seconds = measure(dump_fast, args.repeat)['min_seconds']
+    print(json.dumps({
+        'benchmark': 'serialization',
+        'roles': args.roles,
+        'bytes': len(dump_fast()),
+        'schema_seconds': schema_seconds,
+        'fast_seconds': fast_seconds,
+        'speedup': schema_seconds / fast_seconds,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Copyright API authors
+"""Timing helpers shared by benchmarks."""
+
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+
+def summarize(durations: List[float], calls: int) -> Dict[str, Any]:
+    """Summarize durations of repeated runs.
+
+    Args:
+        durations (List[float]): Seconds of each run.
+        calls (int): Number of calls of the measured operation in a run.
+
+    Returns:
+        (Dict[str, Any]): Machine-readable summary.
+
+    """
+    return {
+        'calls': calls,
+        'repeat': len(durations),
+        'min_seconds': min(durations),
+        'median_seconds': statistics.median(durations),
+        'per_call_seconds': min(durations) / max(calls, 1),
+    }
+
+
+def measure(function: Callable[[], Any], repeat: int, calls: int = 1) -> Dict[str, Any]:
+    """Time runs of a function.
+
+    Args:
+        function (Callable[[], Any])
+        repeat (int): Number of runs.
+        calls (int): Number of calls of the measured operation in a run.
+
+    Returns:
+        (Dict[str, Any])
+
+    """
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - started_at)
+    return summarize(durations, calls)
+
+
+async def measure_async(function: Callable[[], Awaitable[Any]], repeat: int, calls: int = 1) -> Dict[str, Any]:
+    """Time runs of a coroutine function.
+
+    Args:
+        function (Callable[[], Awaitable[Any]])
+        repeat (int): Number of runs.
+        calls (int): Number of calls of the measured operation in a run.
+
+    Returns:
+        (Dict[str, Any])
+
+    """
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        await function()
+        durations.append(time.perf_counter() - started_at)
+    return summarize(durations, calls)
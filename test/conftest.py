@@ -3,6 +3,13 @@ from tortoise.contrib.test import finalizer, initializer
 
 from api import server
 from api import settings
+from api.cache import (
+    policy_cache,
+    policy_generation,
+    role_count_cache,
+    role_index_cache,
+    user_profile_cache,
+)
 from api.settings import ActionType
 from api.utils import get_auth0_client
 
@@ -21,6 +28,11 @@ def initialize_tests(request):
         settings.TORTOISE_ORM['apps']['models']['models'],
         app_label='models',
     )
+    policy_cache.clear()
+    policy_generation.reset()
+    user_profile_cache.clear()
+    role_count_cache.clear()
+    role_index_cache.clear()
     request.addfinalizer(finalizer)
 
 
@@ -78,11 +90,12 @@ async def setup_testdb(auth0_existing_userid):
         }],
     )
 
-    from api.models import UserModel
+    from api.models import EffectivePermissionModel, UserModel
     user = await UserModel.create(
         id=auth0_existing_userid,
     )
     await user.roles.add(role1, role2, role3, role4)
+    await EffectivePermissionModel.refresh([user.id])
     return {
         'existing_user_id': auth0_existing_userid,
     }
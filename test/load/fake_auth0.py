@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# Copyright API authors
+"""Local stand-in of the Auth0 token and Management API users endpoints.
+
+Point the API at it with ``AUTH0_DOMAIN=http://127.0.0.1:<port>``.
+Latency and errors can be injected to see how the API behaves when Auth0 is slow or failing.
+
+Usage:
+    python test/load/fake_auth0.py [--port 8081] [--users 1000] [--latency 0.05] [--jitter 0.02]
+        [--error-rate 0.01] [--error-status 503]
+
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import urllib.parse
+
+TOKEN_PREFIX = 'fake-token-'
+
+
+def make_users(number_of_users: int) -> List[Dict]:
+    """Returns profiles of synthetic users.
+
+    Args:
+        number_of_users (int)
+
+    Returns:
+        (List[Dict])
+
+    """
+    return [
+        {
+            'user_id': 'auth0|{:06d}'.format(i),
+            'name': 'user{}'.format(i),
+            'email': 'user{}@example.com'.format(i),
+        }
+        for i in range(1, number_of_users + 1)
+    ]
+
+
+class FakeAuth0:
+    """State and behavior of the stand-in, independent of HTTP."""
+
+    def __init__(
+        self,
+        users: List[Dict],
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        error_status: int = 503,
+        token_ttl: int = 86400,
+        seed: int = 0,
+    ):
+        """Initialize stand-in.
+
+        Args:
+            users (List[Dict]): Profiles of users.
+            latency (float): Seconds added to every response.
+            jitter (float): Maximum seconds added randomly to the latency.
+            error_rate (float): Ratio of requests failing with error_status.
+            error_status (int): Status code of injected errors, e.g. 429 or 503.
+            token_ttl (int): Seconds until issued tokens expire.
+            seed (int): Seed of random latency and errors.
+
+        """
+        self.users = users
+        self.users_by_id = {user['user_id']: user for user in users}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ttl = token_ttl
+        self.number_of_requests = 0
+        self.number_of_tokens = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self._lock:
+            self.number_of_requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            return delay, self._random.random() < self.error_rate
+
+    def handle(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str]) -> Tuple[int, Dict]:
+        """Returns a response to a request.
+
+        Args:
+            method (str)
+            path (str)
+            query (Dict[str, str])
+            headers (Dict[str, str]): Headers with lower case names.
+
+        Returns:
+            status (int)
+            body (Dict)
+
+        """
+        delay, is_error = self._draw()
+        if delay > 0:
+            time.sleep(delay)
+        if is_error:
+            return self.error_status, self._error(self.error_status, 'Injected error')
+
+        if method == 'POST' and path == '/oauth/token':
+            with self._lock:
+                self.number_of_tokens += 1
+                token = '{}{}'.format(TOKEN_PREFIX, self.number_of_tokens)
+            return 200, {'access_token': token, 'expires_in': self.token_ttl, 'token_type': 'Bearer'}
+
+        if not headers.get('authorization', '').startswith('Bearer {}'.format(TOKEN_PREFIX)):
+            return 401, self._error(401, 'Missing or invalid token')
+
+        if method == 'GET' and path == '/api/v2/users':
+            return 200, self._list_users(query)
+        if method == 'GET' and path.startswith('/api/v2/users/'):
+            user = self.users_by_id.get(urllib.parse.unquote(path[len('/api/v2/users/'):]))
+            if user is None:
+                return 404, {**self._error(404, 'The user does not exist.'), 'errorCode': 'inexistent_user'}
+            return 200, dict(user)
+        return 404, self._error(404, 'Not found')
+
+    def _list_users(self, query: Dict[str, str]) -> Dict:
+        page = int(query.get('page', 0))
+        per_page = int(query.get('per_page', 50))
+        users = self.users
+        # Only the wildcard search of the API is supported, e.g. '*name*' and 'name*'
+        search = query.get('q', '').strip('*')
+        if search:
+            users = [
+                user for user in users
+                if any(search in user.get(key, '') for key in ('name', 'email', 'user_id'))
+            ]
+        page_users = [dict(user) for user in users[page * per_page:(page + 1) * per_page]]
+        return {
+            'start': page * per_page,
+            'limit': per_page,
+            'length': len(page_users),
+            'total': len(users),
+            'users': page_users,
+        }
+
+    @staticmethod
+    def _error(status: int, message: str) -> Dict:
+        return {'statusCode': status, 'error': 'Error', 'message': message}
+
+
+class FakeAuth0Server:
+    """HTTP server of FakeAuth0 running in a background thread."""
+
+    def __init__(self, fake_auth0: FakeAuth0, host: str = '127.0.0.1', port: int = 0):
+        """Initialize server.
+
+        Args:
+            fake_auth0 (FakeAuth0)
+            host (str)
+            port (int): 0 picks a free port.
+
+        """
+        self.fake_auth0 = fake_auth0
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                url = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                status, body = fake_auth0.handle(
+                    self.command,
+                    url.path,
+                    dict(urllib.parse.parse_qsl(url.query)),
+                    {key.lower(): value for key, value in self.headers.items()},
+                )
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def domain(self) -> str:
+        """Value of AUTH0_DOMAIN pointing at this server."""
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self) -> 'FakeAuth0Server':
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-auth0', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Add options of FakeAuth0 to a parser.
+
+    Args:
+        parser (argparse.ArgumentParser)
+
+    """
+    parser.add_argument('--users', type=int, default=1000, help='Number of users.')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to Auth0 responses.')
+    parser.add_argument('--jitter', type=float, default=0, help='Maximum random seconds added to the latency.')
+    parser.add_argument('--error-rate', type=float, default=0, help='Ratio of failing Auth0 requests.')
+    parser.add_argument('--error-status', type=int, default=503, help='Status code of failing Auth0 requests.')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def create_fake_auth0(args: argparse.Namespace) -> FakeAuth0:
+    """Create FakeAuth0 from parsed options.
+
+    Args:
+        args (argparse.Namespace)
+
+    Returns:
+        (FakeAuth0)
+
+    """
+    return FakeAuth0(
+        make_users(args.users),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeAuth0Server(create_fake_auth0(args), host=args.host, port=args.port).start()
+    print('AUTH0_DOMAIN={}'.format(server.domain))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# Copyright API authors
+"""Load test of the API server with a local stand-in of Auth0.
+
+The API is served by uvicorn on a temporary SQLite database seeded with synthetic roles and users,
+and driven over HTTP by concurrent workers with a mixed workload.
+Throughput and p50/p95/p99 latency per route are printed as JSON.
+
+Usage:
+    PYTHONPATH=. python test/load/harness.py [--duration 30] [--concurrency 16]
+        [--mix permitted-actions=40,permitted-databases=30,users=10,roles=20]
+        [--latency 0.05] [--error-rate 0.01] [--output results.json]
+
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import requests
+
+from fake_auth0 import FakeAuth0Server, add_arguments, create_fake_auth0, make_users
+
+ACTION_IDS = ['metadata:read', 'databases:read', 'file:write']
+DEFAULT_MIX = 'permitted-actions=40,permitted-databases=30,users=10,roles=20'
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse weights of routes.
+
+    Args:
+        mix (str): e.g. 'permitted-actions=40,roles=20'.
+
+    Returns:
+        (Dict[str, float]): Weights keyed by route.
+
+    """
+    weights = {}
+    for item in mix.split(','):
+        route, weight = item.split('=')
+        if route not in REQUEST_BUILDERS:
+            raise ValueError('Unknown route: {}'.format(route))
+        weights[route] = float(weight)
+    return weights
+
+
+def get_role_permissions(role_number: int) -> List[Dict]:
+    """Returns permissions of a synthetic role.
+
+    Args:
+        role_number (int)
+
+    Returns:
+        (List[Dict])
+
+    """
+    return [{
+        'databases': ['database-{}'.format(role_number), 'project-{}-*'.format(role_number % 10)],
+        'action_ids': [ACTION_IDS[role_number % len(ACTION_IDS)], 'databases:read'],
+    }]
+
+
+async def seed_database(number_of_roles: int, user_ids: List[str], roles_per_user: int):
+    """Create schemas, roles and role assignments.
+
+    Args:
+        number_of_roles (int)
+        user_ids (List[str])
+        roles_per_user (int)
+
+    """
+    from tortoise import Tortoise
+
+    from api import settings
+    from api.models import PolicyChangeModel, RoleModel, UserModel
+
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    try:
+        roles = [
+            await RoleModel.create(name='role{}'.format(i), description='', permissions=get_role_permissions(i))
+            for i in range(1, number_of_roles + 1)
+        ]
+        for i, user_id in enumerate(user_ids):
+            user = await UserModel.create(id=user_id)
+            await user.roles.add(*[roles[(i + j) % len(roles)] for j in range(roles_per_user)])
+        await PolicyChangeModel.record(None)
+    finally:
+        await Tortoise.close_connections()
+
+
+class ApiServer:
+    """API server run by uvicorn in a background thread."""
+
+    def __init__(self, host: str, port: int):
+        import uvicorn
+
+        from api import server
+
+        config = uvicorn.Config(server.api, host=host, port=port, log_level='warning', lifespan='on')
+        self._server = uvicorn.Server(config)
+        # Signals can only be handled in the main thread
+        self._server.install_signal_handlers = lambda: None
+        # Server.run expects the event loop of the main thread, so the thread runs its own loop
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._server.serve()), name='api', daemon=True)
+        self.url = 'http://{}:{}'.format(host, port)
+
+    def start(self, timeout: float = 30) -> 'ApiServer':
+        """Start serving and wait until the server is ready."""
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError('API server did not start')
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.should_exit = True
+        self._thread.join()
+
+
+def build_permitted_actions(rnd: random.Random, context: Dict) -> Tuple[str, str, Dict]:
+    return 'GET', '/permitted-actions', {
+        'params': {
+            'user_id': rnd.choice(context['user_ids']),
+            'database_id': 'database-{}'.format(rnd.randrange(context['roles'])),
+        },
+    }
+
+
+def build_permitted_databases(rnd: random.Random, context: Dict) -> Tuple[str, str, Dict]:
+    return 'GET', '/permitted-databases', {
+        'json': {
+            'user_id': rnd.choice(context['user_ids']),
+            'database_ids': [
+                rnd.choice(['database-{}', 'project-{}-a', 'other-{}']).format(rnd.randrange(context['roles']))
+                for _ in range(context['databases_per_request'])
+            ],
+        },
+    }
+
+
+def build_users(rnd: random.Random, context: Dict) -> Tuple[str, str, Dict]:
+    return 'GET', '/users', {
+        'params': {'page': rnd.randrange(1, 5), 'per_page': 25},
+    }
+
+
+def build_roles(rnd: random.Random, context: Dict) -> Tuple[str, str, Dict]:
+    return 'GET', '/roles', {
+        'params': {'page': rnd.randrange(1, 5), 'per_page': 25},
+    }
+
+
+REQUEST_BUILDERS: Dict[str, Callable[[random.Random, Dict], Tuple[str, str, Dict]]] = {
+    'permitted-actions': build_permitted_actions,
+    'permitted-databases': build_permitted_databases,
+    'users': build_users,
+    'roles': build_roles,
+}
+
+
+def run_worker(
+    worker_id: int,
+    base_url: str,
+    weights: Dict[str, float],
+    context: Dict,
+    started_at: float,
+    measured_from: float,
+    finished_at: float,
+    records: List[Tuple[str, int, float]],
+):
+    """Send requests until finished_at and record those sent after measured_from.
+
+    Args:
+        worker_id (int): Seed of the worker.
+        base_url (str)
+        weights (Dict[str, float]): Weights of routes.
+        context (Dict): Synthetic data used by request builders.
+        started_at (float): Time to start sending.
+        measured_from (float): End of warm up.
+        finished_at (float)
+        records (List[Tuple[str, int, float]]): Route, status code and seconds of each request.
+
+    """
+    rnd = random.Random('{}-{}'.format(context['seed'], worker_id))
+    routes, route_weights = list(weights.keys()), list(weights.values())
+    session = requests.Session()
+    while time.perf_counter() < started_at:
+        time.sleep(0.001)
+    while True:
+        sent_at = time.perf_counter()
+        if sent_at >= finished_at:
+            break
+        route = rnd.choices(routes, weights=route_weights)[0]
+        method, path, kwargs = REQUEST_BUILDERS[route](rnd, context)
+        try:
+            status_code = session.request(method, base_url + path, timeout=30, **kwargs).status_code
+        except requests.RequestException:
+            status_code = 0
+        if sent_at >= measured_from:
+            records.append((route, status_code, time.perf_counter() - sent_at))
+
+
+def get_percentile(sorted_values: List[float], percentile: float) -> float:
+    """Returns a percentile by the nearest-rank method.
+
+    Args:
+        sorted_values (List[float])
+        percentile (float): 0 to 100.
+
+    Returns:
+        (float)
+
+    """
+    rank = max(1, -(-len(sorted_values) * percentile // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(records: List[Tuple[str, int, float]], duration: float) -> Dict[str, Dict[str, Any]]:
+    """Summarize records per route.
+
+    Args:
+        records (List[Tuple[str, int, float]])
+        duration (float): Seconds of measurement.
+
+    Returns:
+        (Dict[str, Dict[str, Any]]): Summaries keyed by route, and 'all' for all routes.
+
+    """
+    records_by_route: Dict[str, List[Tuple[str, int, float]]] = {'all': records}
+    for record in records:
+        records_by_route.setdefault(record[0], []).append(record)
+
+    summaries = {}
+    for route, route_records in sorted(records_by_route.items()):
+        latencies = sorted(record[2] for record in route_records)
+        status_codes: Dict[str, int] = {}
+        for record in route_records:
+            status_codes[str(record[1])] = status_codes.get(str(record[1]), 0) + 1
+        summaries[route] = {
+            'requests': len(route_records),
+            'errors': sum(1 for record in route_records if not 200 <= record[1] < 400),
+            'status_codes': status_codes,
+            'throughput_rps': len(route_records) / duration,
+            'p50_ms': get_percentile(latencies, 50) * 1000 if latencies else None,
+            'p95_ms': get_percentile(latencies, 95) * 1000 if latencies else None,
+            'p99_ms': get_percentile(latencies, 99) * 1000 if latencies else None,
+            'max_ms': latencies[-1] * 1000 if latencies else None,
+        }
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of measurement.')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds of requests excluded from results.')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent workers.')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Weights of routes.')
+    parser.add_argument('--roles', type=int, default=100, help='Number of roles.')
+    parser.add_argument('--roles-per-user', type=int, default=3)
+    parser.add_argument('--databases-per-request', type=int, default=50)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090, help='Port of the API server.')
+    parser.add_argument('--auth0-domain', help='Use this Auth0 instead of the local stand-in.')
+    parser.add_argument('--output', help='File to write results to instead of stdout.')
+    add_arguments(parser)
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    fake_auth0_server = None
+    if args.auth0_domain:
+        os.environ['AUTH0_DOMAIN'] = args.auth0_domain
+    else:
+        fake_auth0_server = FakeAuth0Server(create_fake_auth0(args)).start()
+        os.environ.update({
+            'AUTH0_DOMAIN': fake_auth0_server.domain,
+            'AUTH0_CLIENT_ID': 'load-test',
+            'AUTH0_CLIENT_SECRET': 'load-test',
+        })
+    user_ids = [user['user_id'] for user in make_users(args.users)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Settings read the database URL when imported
+        os.environ['DB_URL'] = 'sqlite://{}'.format(os.path.join(directory, 'db.sqlite3'))
+        asyncio.run(seed_database(args.roles, user_ids, min(args.roles_per_user, args.roles)))
+        api_server = ApiServer(args.host, args.port).start()
+        try:
+            context = {
+                'seed': args.seed,
+                'roles': args.roles,
+                'user_ids': user_ids,
+                'databases_per_request': args.databases_per_request,
+            }
+            started_at = time.perf_counter() + 0.1
+            measured_from = started_at + args.warmup
+            finished_at = measured_from + args.duration
+            records: List[Tuple[str, int, float]] = []
+            workers = [
+                threading.Thread(
+                    target=run_worker,
+                    args=(i, api_server.url, weights, context, started_at, measured_from, finished_at, records),
+                )
+                for i in range(args.concurrency)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            api_server.stop()
+            if fake_auth0_server is not None:
+                fake_auth0_server.stop()
+
+    output = {
+        'benchmark': 'load',
+        'python': platform.python_version(),
+        'config': {
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'mix': weights,
+            'roles': args.roles,
+            'users': args.users,
+            'roles_per_user': args.roles_per_user,
+            'auth0': args.auth0_domain or {
+                'latency': args.latency,
+                'jitter': args.jitter,
+                'error_rate': args.error_rate,
+                'error_status': args.error_status,
+            },
+        },
+        'routes': summarize(records, args.duration),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
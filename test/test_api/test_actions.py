@@ -1,6 +1,7 @@
 import json
 
 from api import server
+from api.settings import ActionType
 
 
 class TestActionsResource:
@@ -9,6 +10,22 @@ class TestActionsResource:
         data = json.loads(r.text)
         assert r.status_code == 200
         assert 'actions' in data.keys()
+        assert data['actions'] == ActionType.list()
+
+    def test_get_actions_304(self, api):
+        r = api.requests.get(url=api.url_for(server.ActionsResource))
+        assert r.headers['Cache-Control'].startswith('public')
+
+        r = api.requests.get(url=api.url_for(server.ActionsResource), headers={'If-None-Match': r.headers['ETag']})
+        assert r.status_code == 304
+        assert r.content == b''
+
+    def test_get_actions_etag_is_fixed(self, api):
+        # Keys are in a fixed order, so every process sends the same body and ETag
+        r = api.requests.get(url=api.url_for(server.ActionsResource))
+        assert r.content == json.dumps({'actions': ActionType.list()}).encode()
+        r = api.requests.get(url=api.url_for(server.ActionResource, action_id='metadata:write'))
+        assert r.content == json.dumps(getattr(ActionType, 'metadata:write').describe()).encode()
 
 
 class TestActionResource:
@@ -19,6 +36,16 @@ class TestActionResource:
         assert 'action_id' in data.keys()
         assert 'name' in data.keys()
 
+    def test_get_action_304(self, api):
+        url = api.url_for(server.ActionResource, action_id='metadata:write')
+        r = api.requests.get(url=url)
+        assert r.headers['Content-Type'] == 'application/json'
+        assert r.headers['ETag'] != api.requests.get(url=api.url_for(server.ActionsResource)).headers['ETag']
+
+        r = api.requests.get(url=url, headers={'If-None-Match': r.headers['ETag']})
+        assert r.status_code == 304
+        assert r.content == b''
+
     def test_get_action_404(self, api):
         r = api.requests.get(url=api.url_for(server.ActionResource, action_id='action_that_does_not_exist'))
         assert r.status_code == 404
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from api import server, settings
+from api.capability import CapabilityVerifier
+from api.settings import ActionType
+
+CAPABILITY_TOKEN_SECRET_KEY = 'test_capability_token_secret_key'
+
+
+@pytest.fixture
+def capability_token_settings(monkeypatch, setup_testdb):
+    monkeypatch.setitem(settings.CAPABILITY_TOKEN, 'SECRET_KEY', CAPABILITY_TOKEN_SECRET_KEY)
+    monkeypatch.setattr(server, 'get_jwt_payload_from_request', lambda req: {'sub': setup_testdb['existing_user_id']})
+
+
+def test_post_capability_token(setup_testdb, capability_token_settings, api):
+    r = api.requests.post(
+        url=api.url_for(
+            server.CapabilityTokenResource,
+        ),
+        # Users cannot get tokens of other users
+        params={
+            'user_id': 'other_user_id',
+        },
+    )
+    assert r.status_code == 200
+    assert r.headers['Cache-Control'] == 'no-store'
+    data = json.loads(r.text)
+    assert data['user_id'] == setup_testdb['existing_user_id']
+
+    capability = CapabilityVerifier(CAPABILITY_TOKEN_SECRET_KEY).verify(data['token'])
+    assert capability.user_id == setup_testdb['existing_user_id']
+    assert capability.expires_at == data['expires_at']
+    assert capability.is_user_permitted_action(getattr(ActionType, 'metadata:write'), 'database1') is True
+    assert capability.is_user_permitted_action(getattr(ActionType, 'metadata:write'), 'database3') is False
+
+
+def test_post_capability_token_invalid_token_403(api):
+    r = api.requests.post(
+        url=api.url_for(
+            server.CapabilityTokenResource,
+        ),
+        headers={'authorization': 'Bearer invalid_token'},
+    )
+    assert r.status_code == 403
+
+
+def test_post_capability_token_without_secret_key_503(setup_testdb, capability_token_settings, api, monkeypatch):
+    monkeypatch.setitem(settings.CAPABILITY_TOKEN, 'SECRET_KEY', None)
+    r = api.requests.post(
+        url=api.url_for(
+            server.CapabilityTokenResource,
+        ),
+    )
+    assert r.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_check_settings_warns_without_capability_token_secret_key(monkeypatch, caplog):
+    monkeypatch.setitem(settings.CAPABILITY_TOKEN, 'SECRET_KEY', None)
+    await server.check_settings()
+    assert 'CAPABILITY_TOKEN_SECRET_KEY' in caplog.text
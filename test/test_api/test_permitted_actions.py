@@ -25,6 +25,31 @@ def test_get_permitted_actions(setup_testdb, api):
     assert not diff
 
 
+def test_get_permitted_actions_304(setup_testdb, api):
+    params = {
+        'database_id': 'database1',
+        'user_id': setup_testdb['existing_user_id'],
+    }
+    r = api.requests.get(url=api.url_for(server.PermittedActionsResource), params=params)
+    etag = r.headers['ETag']
+
+    r = api.requests.get(
+        url=api.url_for(server.PermittedActionsResource),
+        params=params,
+        headers={'If-None-Match': etag},
+    )
+    assert r.status_code == 304
+    assert r.content == b''
+
+    # Other databases have other ETags
+    r = api.requests.get(
+        url=api.url_for(server.PermittedActionsResource),
+        params={**params, 'database_id': 'database2'},
+        headers={'If-None-Match': etag},
+    )
+    assert r.status_code == 200
+
+
 def test_get_permitted_actions_empty(setup_testdb, api):
     r = api.requests.get(
         url=api.url_for(
@@ -122,3 +147,64 @@ def test_is_permitted_invalid_token_403(api):
         headers={'authorization': 'Bearer invalid_token'},
     )
     assert r.status_code == 403
+
+
+def test_permitted_actions_bulk_200(setup_testdb, api):
+    r = api.requests.post(
+        url=api.url_for(
+            server.PermittedActionsBulkResource,
+        ),
+        json=[
+            {
+                'user_id': setup_testdb['existing_user_id'],
+                'action_id': getattr(ActionType, 'metadata:read').name,
+                'database_id': 'database1',
+            },
+            {
+                'user_id': setup_testdb['existing_user_id'],
+                'action_id': getattr(ActionType, 'metadata:read').name,
+                'database_id': 'database10',
+            },
+            {
+                'user_id': 'user_that_does_not_exist',
+                'action_id': getattr(ActionType, 'metadata:read').name,
+                'database_id': 'database1',
+            },
+            {
+                'user_id': setup_testdb['existing_user_id'],
+                'action_id': getattr(ActionType, 'databases:read').name,
+                'database_id': 'database3',
+            },
+        ],
+    )
+    assert r.status_code == 200
+    data = json.loads(r.text)
+    assert data == [True, False, False, True]
+
+
+def test_permitted_actions_bulk_invalid_action_400(setup_testdb, api):
+    r = api.requests.post(
+        url=api.url_for(
+            server.PermittedActionsBulkResource,
+        ),
+        json=[{
+            'user_id': setup_testdb['existing_user_id'],
+            'action_id': 'action_that_does_not_exist',
+            'database_id': 'database1',
+        }],
+    )
+    assert r.status_code == 400
+
+
+def test_permitted_actions_bulk_invalid_token_403(api):
+    r = api.requests.post(
+        url=api.url_for(
+            server.PermittedActionsBulkResource,
+        ),
+        json=[{
+            'action_id': getattr(ActionType, 'metadata:read').name,
+            'database_id': 'database1',
+        }],
+        headers={'authorization': 'Bearer invalid_token'},
+    )
+    assert r.status_code == 403
@@ -44,3 +44,68 @@ def test_get_permitted_databases_invalid_token_403(api):
         headers={'authorization': 'Bearer invalid_token'},
     )
     assert r.status_code == 403
+
+
+def test_get_permitted_databases_ndjson(setup_testdb, api):
+    r = api.requests.get(
+        url=api.url_for(
+            server.PermittedDatabasesResource,
+        ),
+        params={
+            'user_id': setup_testdb['existing_user_id'],
+        },
+        data='"database1"\n"database3"\n\n"database2"\n"database3"',
+        headers={'content-type': 'application/x-ndjson'},
+    )
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines == [
+        {'database_id': 'database3', 'selected_index': 1},
+        {'database_id': 'database3', 'selected_index': 3},
+    ]
+
+
+def test_get_permitted_databases_ndjson_multiple_chunks(setup_testdb, api, monkeypatch):
+    monkeypatch.setitem(server.settings.PERMITTED_DATABASES, 'STREAM_CHUNK_SIZE', 7)
+    monkeypatch.setitem(server.settings.PERMITTED_DATABASES, 'STREAM_SPOOL_MAX_SIZE', 64)
+    body = ''.join('"database{}"\n'.format(i % 4 + 1) for i in range(100))
+
+    def iterate_body():
+        # Chunks split lines in the middle
+        for start in range(0, len(body), 5):
+            yield body[start:start + 5].encode()
+
+    r = api.requests.get(
+        url=api.url_for(
+            server.PermittedDatabasesResource,
+        ),
+        params={
+            'user_id': setup_testdb['existing_user_id'],
+        },
+        data=iterate_body(),
+        headers={'content-type': 'application/x-ndjson'},
+    )
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines == [
+        {'database_id': 'database3', 'selected_index': i}
+        for i in range(100) if i % 4 == 2
+    ]
+
+
+def test_get_permitted_databases_ndjson_invalid_line(setup_testdb, api):
+    r = api.requests.get(
+        url=api.url_for(
+            server.PermittedDatabasesResource,
+        ),
+        params={
+            'user_id': setup_testdb['existing_user_id'],
+        },
+        data='"database3"\nnot json\n',
+        headers={'content-type': 'application/x-ndjson'},
+    )
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0] == {'database_id': 'database3', 'selected_index': 0}
+    assert 'detail' in lines[-1]
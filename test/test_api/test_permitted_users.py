@@ -0,0 +1,52 @@
+import json
+
+from api import server
+from api.settings import ActionType
+
+
+def test_get_permitted_users(setup_testdb, api):
+    r = api.requests.get(
+        url=api.url_for(
+            server.PermittedUsersResource,
+        ),
+        params={
+            'action_id': getattr(ActionType, 'metadata:write').name,
+            'database_id': 'database1',
+        },
+    )
+    assert r.status_code == 200
+    data = json.loads(r.text)
+    assert [role['name'] for role in data['roles']] == ['role1', 'role2']
+    assert set(data['roles'][0].keys()) == {'role_id', 'name', 'description'}
+    assert data['user_ids'] == [setup_testdb['existing_user_id']]
+    assert data['total'] == 1
+
+
+def test_get_permitted_users_empty(setup_testdb, api):
+    r = api.requests.get(
+        url=api.url_for(
+            server.PermittedUsersResource,
+        ),
+        params={
+            'action_id': getattr(ActionType, 'metadata:write').name,
+            'database_id': 'database_that_anything_not_permitted',
+        },
+    )
+    assert r.status_code == 200
+    data = json.loads(r.text)
+    assert data['roles'] == []
+    assert data['user_ids'] == []
+    assert data['total'] == 0
+
+
+def test_get_permitted_users_invalid_action_400(api):
+    r = api.requests.get(
+        url=api.url_for(
+            server.PermittedUsersResource,
+        ),
+        params={
+            'action_id': 'invalid_action',
+            'database_id': 'database1',
+        },
+    )
+    assert r.status_code == 400
@@ -0,0 +1,81 @@
+import json
+
+from api import server
+from api.settings import ActionType
+from api.snapshot import PolicySnapshotEvaluator
+
+
+def test_get_policy_snapshot(setup_testdb, api):
+    r = api.requests.get(
+        url=api.url_for(
+            server.PolicySnapshotResource,
+        ),
+    )
+    assert r.status_code == 200
+    data = json.loads(r.text)
+    assert data['full'] is True
+    assert r.headers['ETag'] == '"{}"'.format(data['version'])
+    assert [role['role_id'] for role in data['roles']] == [1, 2, 3, 4]
+
+    evaluator = PolicySnapshotEvaluator(data)
+    assert evaluator.is_user_permitted_action(
+        setup_testdb['existing_user_id'],
+        getattr(ActionType, 'metadata:write'),
+        'database1',
+    ) is True
+
+    # Not modified
+    r = api.requests.get(
+        url=api.url_for(
+            server.PolicySnapshotResource,
+        ),
+        headers={'If-None-Match': r.headers['ETag']},
+    )
+    assert r.status_code == 304
+    assert r.content == b''
+
+
+def test_get_policy_snapshot_since(setup_testdb, api):
+    r = api.requests.delete(url=api.url_for(server.RoleResource, role_id=1))
+    assert r.status_code == 200
+    r = api.requests.get(url=api.url_for(server.PolicySnapshotResource))
+    evaluator = PolicySnapshotEvaluator(json.loads(r.text))
+
+    r = api.requests.patch(
+        url=api.url_for(
+            server.RoleResource,
+            role_id=2,
+        ),
+        json={
+            'permissions': [{
+                'databases': ['database3'],
+                'action_ids': [getattr(ActionType, 'metadata:write').name],
+            }],
+        },
+    )
+    assert r.status_code == 200
+
+    r = api.requests.get(
+        url=api.url_for(
+            server.PolicySnapshotResource,
+        ),
+        params={
+            'since': evaluator.version,
+        },
+    )
+    assert r.status_code == 200
+    data = json.loads(r.text)
+    assert data['full'] is False
+    assert [role['role_id'] for role in data['roles']] == [2]
+
+    evaluator.apply(data)
+    assert evaluator.is_user_permitted_action(
+        setup_testdb['existing_user_id'],
+        getattr(ActionType, 'metadata:write'),
+        'database1',
+    ) is False
+    assert evaluator.is_user_permitted_action(
+        setup_testdb['existing_user_id'],
+        getattr(ActionType, 'metadata:write'),
+        'database3',
+    ) is True
@@ -109,6 +109,47 @@ class TestRolesResource:
         assert data['length'] == 4
         assert len(data['roles']) == 4
 
+    def test_get_roles_200_with_cursor(self, api, setup_testdb):
+        role_names = []
+        params = {
+            'per_page': 3,
+            'cursor': 'start',
+        }
+        for _ in range(2):
+            r = api.requests.get(
+                url=api.url_for(server.RolesResource),
+                params=params,
+            )
+            assert r.status_code == 200
+            data = json.loads(r.text)
+            assert data['total'] == 4
+            role_names += [role['name'] for role in data['roles']]
+            params['cursor'] = data['next_cursor']
+
+        assert role_names == ['role1', 'role2', 'role3', 'role4']
+        assert data['next_cursor'] is None
+
+    def test_get_roles_200_without_total(self, api, setup_testdb):
+        r = api.requests.get(
+            url=api.url_for(server.RolesResource),
+            params={
+                'include_total': 'false',
+            },
+        )
+        assert r.status_code == 200
+        data = json.loads(r.text)
+        assert data['total'] is None
+        assert data['length'] == 4
+
+    def test_get_roles_400_invalid_cursor(self, api):
+        r = api.requests.get(
+            url=api.url_for(server.RolesResource),
+            params={
+                'cursor': 'invalid cursor',
+            },
+        )
+        assert r.status_code == 400
+
     def test_get_roles_400_illegal_page_string(self, api):
         r = api.requests.get(
             url=api.url_for(server.RolesResource),
@@ -230,6 +271,25 @@ class TestRoleResource:
         assert 'action_id' in data['permissions'][0]['actions'][0].keys()
         assert 'name' in data['permissions'][0]['actions'][0].keys()
 
+    def test_get_role_304(self, api, setup_testdb):
+        url = api.url_for(server.RoleResource, role_id=1)
+        r = api.requests.get(url=url)
+        etag = r.headers['ETag']
+        assert r.headers['Cache-Control'] == 'private, no-cache'
+
+        r = api.requests.get(url=url, headers={'If-None-Match': etag})
+        assert r.status_code == 304
+        assert r.headers['ETag'] == etag
+        assert r.content == b''
+
+        # Changed role is sent again
+        r = api.requests.patch(url=url, json={'name': 'new name'})
+        assert r.status_code == 200
+        r = api.requests.get(url=url, headers={'If-None-Match': etag})
+        assert r.status_code == 200
+        assert json.loads(r.text)['name'] == 'new name'
+        assert r.headers['ETag'] != etag
+
     def test_get_role_404(self, api, setup_testdb):
         r = api.requests.get(
             url=api.url_for(
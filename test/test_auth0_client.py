@@ -0,0 +1,186 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from auth0.v3.exceptions import Auth0Error
+import pytest
+
+from api.auth0_client import (
+    AsyncAuth0Users,
+    Auth0ClientManager,
+    Auth0TokenManager,
+    PooledRestClient,
+    create_session,
+    parse_domain,
+)
+from api.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTokenEndpoint:
+    def __init__(self, expires_in=86400):
+        self.expires_in = expires_in
+        self.number_of_calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.number_of_calls += 1
+            return {
+                'access_token': f'token{self.number_of_calls}',
+                'expires_in': self.expires_in,
+            }
+
+
+def test_token_manager_caches_token_until_expiration():
+    timer = FakeTimer()
+    fetch_token = FakeTokenEndpoint(expires_in=3600)
+    token_manager = Auth0TokenManager(fetch_token, refresh_margin=60, timer=timer)
+
+    assert token_manager.get_token() == 'token1'
+    timer.now = 3539
+    assert token_manager.get_token() == 'token1'
+    assert fetch_token.number_of_calls == 1
+
+    timer.now = 3540
+    assert token_manager.get_token() == 'token2'
+
+    token_manager.invalidate()
+    assert token_manager.get_token() == 'token3'
+
+
+def test_token_manager_refreshes_once_for_concurrent_callers():
+    fetch_token = FakeTokenEndpoint()
+    token_manager = Auth0TokenManager(fetch_token, refresh_margin=60)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(executor.map(lambda _: token_manager.get_token(), range(32)))
+
+    assert set(tokens) == {'token1'}
+    assert fetch_token.number_of_calls == 1
+
+
+def test_client_manager_shares_client_and_session():
+    timer = FakeTimer()
+    token_manager = Auth0TokenManager(FakeTokenEndpoint(expires_in=3600), refresh_margin=60, timer=timer)
+    client_manager = Auth0ClientManager('example.auth0.com', token_manager, create_session(4), timeout=5)
+
+    client = client_manager.get_client()
+    assert client_manager.get_client() is client
+    assert isinstance(client.users.client, PooledRestClient)
+    assert client.users.client.base_headers['Authorization'] == 'Bearer token1'
+
+    timer.now = 3600
+    refreshed_client = client_manager.get_client()
+    assert refreshed_client is not client
+    assert refreshed_client.users.client.base_headers['Authorization'] == 'Bearer token2'
+    assert refreshed_client.users.client.session is client.users.client.session
+    assert refreshed_client.users.protocol == 'https'
+
+
+def test_client_manager_uses_protocol_of_domain():
+    protocol, domain = parse_domain('http://127.0.0.1:8081/')
+    assert (protocol, domain) == ('http', '127.0.0.1:8081')
+    assert parse_domain('https://example.auth0.com') == ('https', 'example.auth0.com')
+    assert parse_domain('example.auth0.com') == ('https', 'example.auth0.com')
+    assert parse_domain(None) == ('https', None)
+
+    token_manager = Auth0TokenManager(FakeTokenEndpoint(), refresh_margin=60)
+    client_manager = Auth0ClientManager(domain, token_manager, create_session(4), timeout=5, protocol=protocol)
+    assert client_manager.get_client().users._url() == 'http://127.0.0.1:8081/api/v2/users'
+
+
+class SlowUsersClientManager:
+    """Client manager whose users endpoints block like HTTP calls."""
+
+    class Client:
+        class Users:
+            def get(self, id):
+                time.sleep(0.2)
+                return {'user_id': id}
+
+        users = Users()
+
+    def get_client(self):
+        return self.Client()
+
+
+@pytest.mark.asyncio
+async def test_async_users_do_not_block_event_loop():
+    auth0_users = AsyncAuth0Users(SlowUsersClientManager(), ThreadPoolExecutor(max_workers=2))
+    started_at = time.monotonic()
+
+    async def count_ticks():
+        ticks = 0
+        while time.monotonic() - started_at < 0.3:
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+
+    user1, user2, ticks = await asyncio.gather(
+        auth0_users.get(id='user1'),
+        auth0_users.get(id='user2'),
+        count_ticks(),
+    )
+    assert user1 == {'user_id': 'user1'}
+    assert user2 == {'user_id': 'user2'}
+    assert ticks > 10
+
+
+class CountingUsersClientManager:
+    """Client manager counting calls of users endpoints."""
+
+    def __init__(self, existing_user_ids):
+        self.existing_user_ids = existing_user_ids
+        self.number_of_calls = 0
+
+    def get_client(self):
+        return self
+
+    @property
+    def users(self):
+        return self
+
+    def get(self, id):
+        self.number_of_calls += 1
+        if id not in self.existing_user_ids:
+            raise Auth0Error(404, 'inexistent_user', 'The user does not exist.')
+        return {'user_id': id}
+
+
+@pytest.mark.asyncio
+async def test_async_users_cache_profiles():
+    client_manager = CountingUsersClientManager(['user1'])
+    profile_cache = TTLCache(max_size=10, ttl=60)
+    auth0_users = AsyncAuth0Users(
+        client_manager,
+        ThreadPoolExecutor(max_workers=1),
+        profile_cache=profile_cache,
+        negative_ttl=10,
+    )
+
+    user = await auth0_users.get(id='user1')
+    user['roles'] = []
+    assert await auth0_users.get(id='user1') == {'user_id': 'user1'}
+    assert client_manager.number_of_calls == 1
+
+    errors = []
+    for _ in range(2):
+        with pytest.raises(Auth0Error) as exc_info:
+            await auth0_users.get(id='user2')
+        errors.append(exc_info.value)
+    assert client_manager.number_of_calls == 2
+    assert errors[0] is not errors[1]
+    assert (errors[1].status_code, errors[1].error_code) == (404, 'inexistent_user')
+
+    profile_cache.invalidate('user1')
+    await auth0_users.get(id='user1')
+    assert client_manager.number_of_calls == 3
@@ -0,0 +1,97 @@
+from api.cache import GenerationWatermark, TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_expiration():
+    timer = FakeTimer()
+    cache = TTLCache(max_size=10, ttl=5, timer=timer)
+    cache.set('key', 'value')
+    assert cache.get('key') == 'value'
+
+    timer.now = 4.9
+    assert 'key' in cache
+
+    timer.now = 5
+    assert cache.get('key') is None
+    assert len(cache) == 0
+
+    cache.set('key', 'value', ttl=1)
+    timer.now = 6
+    assert cache.get('key', 'default') == 'default'
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('key1', 1)
+    cache.set('key2', 2)
+    assert cache.get('key1') == 1
+    cache.set('key3', 3)
+
+    assert cache.get('key1') == 1
+    assert cache.get('key2') is None
+    assert cache.get('key3') == 3
+
+
+def test_ttl_cache_invalidation():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set('key1', 1)
+    cache.set('key2', 2)
+    cache.set('key3', 3)
+
+    cache.invalidate('key1')
+    assert 'key1' not in cache
+    cache.invalidate_many(['key2', 'key_not_cached'])
+    assert 'key2' not in cache
+    assert 'key3' in cache
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_ttl_cache_discards_value_loaded_before_invalidation():
+    cache = TTLCache(max_size=10, ttl=60)
+    version = cache.version
+    cache.invalidate('key')
+    cache.set('key', 'stale', version=version)
+    assert 'key' not in cache
+
+    cache.set('key', 'fresh', version=cache.version)
+    assert cache.get('key') == 'fresh'
+
+
+def test_ttl_cache_disabled():
+    cache = TTLCache(max_size=0, ttl=60)
+    cache.set('key', 'value')
+    assert 'key' not in cache
+
+
+def test_generation_watermark():
+    timer = FakeTimer()
+    watermark = GenerationWatermark(check_interval=1, timer=timer)
+    assert watermark.generation is None
+    assert watermark.is_check_due() is True
+
+    watermark.update(3)
+    assert watermark.generation == 3
+    assert watermark.is_check_due() is False
+
+    timer.now = 1
+    assert watermark.is_check_due() is True
+
+    # Generations made by this process
+    watermark.update(3)
+    watermark.advance(4)
+    assert watermark.generation == 4
+    assert watermark.is_check_due() is False
+    watermark.advance(6)
+    assert watermark.generation == 4
+    assert watermark.is_check_due() is True
+
+    watermark.reset()
+    assert watermark.generation is None
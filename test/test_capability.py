@@ -0,0 +1,73 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from api.capability import CapabilityVerifier, InvalidCapabilityToken, issue_capability_token, remap_mask
+from api.settings import ActionType
+
+SECRET_KEY = 'test_secret_key'
+
+
+def test_verify_capability_token():
+    pattern_masks = {
+        'database1': getattr(ActionType, 'metadata').bit,
+        'project-*': getattr(ActionType, 'databases:read').bit,
+    }
+    token = issue_capability_token('test_user_id', pattern_masks, SECRET_KEY, ttl=60, generation=3, now=1000)
+    capability = CapabilityVerifier(SECRET_KEY, timer=lambda: 1030).verify(token)
+
+    assert capability.user_id == 'test_user_id'
+    assert capability.expires_at == 1060
+    assert capability.generation == 3
+    assert capability.is_user_permitted_action(getattr(ActionType, 'metadata:write:add'), 'database1') is True
+    assert capability.is_user_permitted_action(getattr(ActionType, 'metadata:write'), 'project-1') is False
+    assert capability.get_permitted_actions('project-1') == [getattr(ActionType, 'databases:read')]
+    assert capability.filter_permitted_databases(
+        getattr(ActionType, 'databases:read'),
+        ['project-1', 'database1', 'project-2'],
+    ) == (['project-1', 'project-2'], [0, 2])
+
+
+def test_verify_capability_token_invalid():
+    token = issue_capability_token('test_user_id', {}, SECRET_KEY, ttl=60, now=1000)
+
+    with pytest.raises(InvalidCapabilityToken, match='signature'):
+        CapabilityVerifier('other_secret_key', timer=lambda: 1000).verify(token)
+    with pytest.raises(InvalidCapabilityToken, match='expired'):
+        CapabilityVerifier(SECRET_KEY, timer=lambda: 1061).verify(token)
+    assert CapabilityVerifier(SECRET_KEY, leeway=5, timer=lambda: 1061).verify(token).user_id == 'test_user_id'
+    with pytest.raises(InvalidCapabilityToken, match='Malformed'):
+        CapabilityVerifier(SECRET_KEY).verify('invalid_token')
+
+    # Forged payload
+    header, payload, signature = token.split('.')
+    forged_payload = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    forged_payload['permissions'] = {'*': getattr(ActionType, 'databases').bit}
+    forged_payload = base64.urlsafe_b64encode(json.dumps(forged_payload).encode()).rstrip(b'=').decode()
+    with pytest.raises(InvalidCapabilityToken, match='signature'):
+        CapabilityVerifier(SECRET_KEY, timer=lambda: 1000).verify('.'.join([header, forged_payload, signature]))
+
+
+def test_verify_capability_token_not_object():
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+
+    def sign(header, payload):
+        signing_input = '{}.{}'.format(header, payload).encode()
+        signature = hmac.new(SECRET_KEY.encode(), signing_input, hashlib.sha256).digest()
+        return '.'.join([header, payload, base64.urlsafe_b64encode(signature).rstrip(b'=').decode()])
+
+    with pytest.raises(InvalidCapabilityToken, match='Malformed'):
+        CapabilityVerifier(SECRET_KEY).verify(sign(encode([]), encode({})))
+    with pytest.raises(InvalidCapabilityToken, match='Malformed'):
+        CapabilityVerifier(SECRET_KEY).verify(sign(encode({'alg': 'HS256', 'typ': 'JWT'}), encode([])))
+
+
+def test_remap_mask():
+    action_ids = ['metadata:read', 'unknown_action', 'databases']
+    expected = getattr(ActionType, 'metadata:read').bit | getattr(ActionType, 'databases').bit
+    assert remap_mask(0b101, action_ids) == expected
+    assert remap_mask(0b010, action_ids) == 0
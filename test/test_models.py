@@ -1,11 +1,20 @@
+import asyncio
 import os
 
 import pytest
 from tortoise.contrib import test
+from tortoise.exceptions import NoValuesFetched
+from tortoise.transactions import in_transaction
 
+from api.cache import policy_cache, policy_generation
 from api.models import (
+    EffectivePermissionModel,
     UserModel,
     RoleModel,
+    PermissionModel,
+    PermissionDatabaseModel,
+    PolicyChangeModel,
+    PolicyGenerationModel,
 )
 from api.settings import ActionType
 
@@ -39,6 +48,7 @@ async def setup_db_for_test_permission_check():
         id=user_id,
     )
     await user.roles.add(role1, role2)
+    await EffectivePermissionModel.refresh([user_id])
     return {
         'user_id': user_id,
     }
@@ -131,6 +141,282 @@ async def test_filter_permitted_databases(setup_db_for_test_permission_check):
     ) == ([], [])
 
 
+@pytest.mark.asyncio
+async def test_get_compiled_policies(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    policies = await UserModel.get_compiled_policies([user_id, 'unknown_user_id', user_id])
+
+    assert set(policies.keys()) == {user_id, 'unknown_user_id'}
+    assert policies[user_id].is_permitted(getattr(ActionType, 'metadata:read'), 'database1') is True
+    assert policies['unknown_user_id'].is_permitted(getattr(ActionType, 'metadata:read'), 'database1') is False
+
+
+@pytest.mark.asyncio
+async def test_get_cached_policy(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    policy = await UserModel.get_cached_policy(user_id)
+    assert policy.is_permitted(getattr(ActionType, 'metadata:read'), 'database1') is True
+    assert await UserModel.get_cached_policy(user_id) is policy
+
+    # Cached policy is kept until invalidation
+    user = await UserModel.get(id=user_id)
+    await user.roles.clear()
+    await EffectivePermissionModel.refresh([user_id])
+    assert await UserModel.get_cached_policy(user_id) is policy
+
+    policy_cache.invalidate_many(await UserModel.get_user_ids_with_role(999))
+    policy_cache.invalidate(user_id)
+    policy = await UserModel.get_cached_policy(user_id)
+    assert policy.is_permitted(getattr(ActionType, 'metadata:read'), 'database1') is False
+
+
+@pytest.mark.asyncio
+async def test_get_user_ids_with_role(setup_db_for_test_permission_check):
+    role = await RoleModel.get(name='role1')
+    assert await UserModel.get_user_ids_with_role(role.id) == [setup_db_for_test_permission_check['user_id']]
+    assert await UserModel.get_user_ids_with_role(role.id + 100) == []
+
+
+@pytest.mark.asyncio
+async def test_sync_policy_cache(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    policy = await UserModel.get_cached_policy(user_id)
+    assert await PolicyChangeModel.get_generation() == 0
+
+    # Change made by another process is not reflected in the local cache
+    user = await UserModel.get(id=user_id)
+    await user.roles.clear()
+    await EffectivePermissionModel.refresh([user_id])
+    await PolicyChangeModel.create(user_ids=['another_user_id'])
+    await PolicyChangeModel.sync_policy_cache(force=True)
+    assert await UserModel.get_cached_policy(user_id) is policy
+
+    await PolicyChangeModel.create(user_ids=[user_id])
+    assert await PolicyChangeModel.get_generation() == 2
+    await PolicyChangeModel.sync_policy_cache(force=True)
+    assert policy_generation.generation == 2
+    assert not await UserModel.get_cached_policy(user_id)
+
+
+@pytest.mark.asyncio
+async def test_record_policy_change(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    await UserModel.get_cached_policy(user_id)
+    assert user_id in policy_cache
+
+    assert await PolicyChangeModel.record([user_id]) == 1
+    assert user_id not in policy_cache
+
+    await UserModel.get_cached_policy(user_id)
+    assert await PolicyChangeModel.record(None) == 2
+    assert len(policy_cache) == 0
+
+    # Changes written in a failed transaction are rolled back with the log
+    with pytest.raises(RuntimeError):
+        async with in_transaction(PolicyChangeModel._meta.default_connection) as connection:
+            await RoleModel.filter(name='role1').using_db(connection).delete()
+            await PolicyChangeModel.write([user_id], [], using_db=connection)
+            raise RuntimeError()
+    assert await PolicyChangeModel.get_generation() == 2
+    assert (await PolicyGenerationModel.get(id=1)).generation == 2
+    assert await RoleModel.exists(name='role1')
+
+
+@pytest.mark.asyncio
+async def test_advance_policy_generation(setup_db_for_test_permission_check):
+    # The counter starts from changes logged before it existed
+    await PolicyChangeModel.create(user_ids=[])
+    async with in_transaction(PolicyChangeModel._meta.default_connection) as connection:
+        change = await PolicyChangeModel.write([], [], using_db=connection)
+    assert change.id == 2
+
+    async with in_transaction(PolicyChangeModel._meta.default_connection) as connection:
+        assert await PolicyGenerationModel.advance(connection) == 3
+        change = await PolicyChangeModel.write([], [], using_db=connection)
+    assert change.id == 4
+    assert await PolicyChangeModel.get_generation() == 4
+
+
+@pytest.mark.asyncio
+async def test_get_cached_generation(setup_db_for_test_permission_check):
+    assert await PolicyChangeModel.get_cached_generation() == 0
+
+    # Changes of this process are seen without waiting for the next check
+    await PolicyChangeModel.record([setup_db_for_test_permission_check['user_id']])
+    assert await PolicyChangeModel.get_cached_generation() == 1
+
+    # Changes of other processes are seen at the next check
+    await PolicyChangeModel.create(user_ids=[])
+    assert await PolicyChangeModel.get_cached_generation() == 1
+    await PolicyChangeModel.sync_policy_cache(force=True)
+    assert await PolicyChangeModel.get_cached_generation() == 2
+
+
+@pytest.mark.asyncio
+async def test_get_role_summaries(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    role_summaries = await UserModel.get_role_summaries([user_id, 'unknown_user_id'])
+
+    assert list(role_summaries.keys()) == [user_id]
+    assert [role['name'] for role in role_summaries[user_id]] == ['role1', 'role2']
+    assert set(role_summaries[user_id][0].keys()) == {'id', 'name', 'description'}
+
+
+@pytest.mark.asyncio
+async def test_set_roles(setup_db_for_test_permission_check):
+    user = await UserModel.get(id=setup_db_for_test_permission_check['user_id'])
+    role2 = await RoleModel.get(name='role2')
+    role3 = await RoleModel.create(name='role3')
+
+    await user.set_roles([role2, role3])
+    assert sorted(role.name for role in await user.roles.all()) == ['role2', 'role3']
+
+    await user.set_roles([])
+    assert await user.roles.all() == []
+
+
+@pytest.mark.asyncio
+async def test_set_roles_concurrently(setup_db_for_test_permission_check, monkeypatch):
+    user_id = setup_db_for_test_permission_check['user_id']
+    role2 = await RoleModel.get(name='role2')
+    role3 = await RoleModel.create(name='role3')
+    locked_user_ids = []
+    lock = UserModel.lock
+
+    async def record_lock(user_ids, using_db):
+        locked_user_ids.append(list(user_ids))
+        await lock(user_ids, using_db)
+
+    monkeypatch.setattr(UserModel, 'lock', record_lock)
+    users = [await UserModel.get(id=user_id) for _ in range(2)]
+    await asyncio.gather(*[user.set_roles([role2, role3]) for user in users])
+    assert locked_user_ids == [[user_id], [user_id]]
+    assert sorted(role.name for role in await users[0].roles.all()) == ['role2', 'role3']
+
+
+@pytest.mark.asyncio
+async def test_role_permissions(setup_db_for_test_permission_check):
+    role = await RoleModel.get(name='role2')
+    with pytest.raises(NoValuesFetched):
+        role.permissions
+
+    await RoleModel.fetch_permissions([role])
+    assert role.permissions == [{
+        'databases': ['testpostfix*', '*testprefix', 'test?single'],
+        'action_ids': ['metadata:write', 'metadata:read:public', 'databases:read'],
+    }]
+
+    permissions = [
+        {'databases': ['database2'], 'action_ids': ['admin']},
+        {'databases': [], 'action_ids': []},
+    ]
+    await role.set_permissions(permissions)
+    assert role.permissions == permissions
+    role_permissions = await RoleModel.get_permissions([role.id])
+    assert role_permissions == {role.id: permissions}
+
+
+@pytest.mark.asyncio
+async def test_delete_role_permissions(setup_db_for_test_permission_check):
+    role = await RoleModel.get(name='role2')
+    await RoleModel.filter(id=role.id).delete()
+
+    assert not await PermissionModel.filter(role_id=role.id).exists()
+    assert not await PermissionDatabaseModel.filter(database_pattern='testpostfix*').exists()
+
+
+@pytest.mark.asyncio
+async def test_get_role_index(setup_db_for_test_permission_check):
+    role1 = await RoleModel.get(name='role1')
+    role2 = await RoleModel.get(name='role2')
+    action = getattr(ActionType, 'metadata:write')
+
+    role_index = await RoleModel.get_role_index()
+    assert role_index.find_role_ids(action, 'database1') == [role1.id]
+    assert role_index.find_role_ids(action, 'testpostfix1') == [role2.id]
+    assert await RoleModel.get_role_index() is role_index
+
+    await role2.set_permissions([{'databases': ['database1'], 'action_ids': ['metadata:write']}])
+    await PolicyChangeModel.record(await UserModel.get_user_ids_with_role(role2.id))
+    role_index = await RoleModel.get_role_index()
+    assert role_index.find_role_ids(action, 'database1') == [role1.id, role2.id]
+    assert role_index.find_role_ids(action, 'testpostfix1') == []
+
+
+@pytest.mark.asyncio
+async def test_get_user_ids_with_roles(setup_db_for_test_permission_check):
+    role1 = await RoleModel.get(name='role1')
+    role2 = await RoleModel.get(name='role2')
+    other_user = await UserModel.create(id='other_user_id')
+    await other_user.set_roles([role2])
+
+    assert await UserModel.get_user_ids_with_roles([role1.id, role2.id]) == (['other_user_id', 'test_user_id'], 2)
+    assert await UserModel.get_user_ids_with_roles([role1.id, role2.id], offset=1, limit=1) == (['test_user_id'], 2)
+    assert await UserModel.get_user_ids_with_roles([role1.id], search='other') == ([], 0)
+    assert await UserModel.get_user_ids_with_roles([]) == ([], 0)
+
+
+@pytest.mark.asyncio
+async def test_effective_permissions(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    role1 = await RoleModel.get(name='role1')
+    metadata_mask = getattr(ActionType, 'metadata').bit
+
+    pattern_masks = await EffectivePermissionModel.load_pattern_masks([user_id, 'unknown_user_id'])
+    assert pattern_masks['unknown_user_id'] == {}
+    assert pattern_masks[user_id]['database1'] == metadata_mask
+    assert pattern_masks[user_id] == (await EffectivePermissionModel.compute_pattern_masks([user_id]))[user_id]
+
+    # Action ids are stored, and ids of actions removed from settings grant nothing
+    effective_permission = await EffectivePermissionModel.get(user_id=user_id, database_pattern='database1')
+    assert effective_permission.action_ids == ['metadata']
+    effective_permission.action_ids = ['metadata', 'removed:action']
+    await effective_permission.save()
+    assert (await EffectivePermissionModel.load_pattern_masks([user_id]))[user_id]['database1'] == metadata_mask
+
+    # Recorded changes refresh users holding the role
+    await role1.set_permissions([{'databases': ['database2'], 'action_ids': ['metadata']}])
+    await PolicyChangeModel.record(await UserModel.get_user_ids_with_role(role1.id))
+    pattern_masks = await EffectivePermissionModel.load_pattern_masks([user_id])
+    assert 'database1' not in pattern_masks[user_id]
+    assert pattern_masks[user_id]['database2'] == metadata_mask
+
+    # Rebuild restores changes not recorded
+    await EffectivePermissionModel.filter(user_id=user_id).delete()
+    await PolicyChangeModel.record(None)
+    assert (await EffectivePermissionModel.load_pattern_masks([user_id]))[user_id]['database2'] == metadata_mask
+
+
+@pytest.mark.asyncio
+async def test_get_snapshot(setup_db_for_test_permission_check):
+    user_id = setup_db_for_test_permission_check['user_id']
+    role1 = await RoleModel.get(name='role1')
+    role2 = await RoleModel.get(name='role2')
+    version = await PolicyChangeModel.record([user_id], role_ids=[role1.id, role2.id])
+
+    snapshot = await PolicyChangeModel.get_snapshot()
+    assert snapshot['version'] == version
+    assert snapshot['full'] is True
+    assert [role['role_id'] for role in snapshot['roles']] == [role1.id, role2.id]
+    assert snapshot['roles'][0]['permissions'] == [{'databases': ['database1'], 'action_ids': ['metadata']}]
+    assert snapshot['user_roles'] == {user_id: [role1.id, role2.id]}
+
+    # Delta contains changed roles and users only
+    await RoleModel.filter(id=role2.id).delete()
+    new_version = await PolicyChangeModel.record([user_id], role_ids=[role2.id])
+    delta = await PolicyChangeModel.get_snapshot(version)
+    assert delta['version'] == new_version
+    assert (delta['since'], delta['full']) == (version, False)
+    assert delta['roles'] == []
+    assert delta['deleted_role_ids'] == [role2.id]
+    assert delta['user_roles'] == {user_id: [role1.id]}
+
+    # Unknown changes fall back to a full snapshot
+    await PolicyChangeModel.record(None)
+    assert (await PolicyChangeModel.get_snapshot(new_version))['full'] is True
+    assert (await PolicyChangeModel.get_snapshot(0))['full'] is True
+
+
 class TestRoleModel(test.TestCase):
 
     async def test_adding_role(self):
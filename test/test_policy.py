@@ -0,0 +1,110 @@
+from api.policy import CompiledPolicy, RoleIndex, is_literal_pattern, is_prefix_pattern
+from api.settings import ActionType
+
+
+def test_pattern_classification():
+    assert is_literal_pattern('database1') is True
+    assert is_literal_pattern('database*') is False
+    assert is_prefix_pattern('database*') is True
+    assert is_prefix_pattern('*') is True
+    assert is_prefix_pattern('*database') is False
+    assert is_prefix_pattern('data?base*') is False
+
+
+def test_compiled_policy_get_permitted_actions():
+    policy = CompiledPolicy([
+        {
+            'databases': ['database1', 'project-*'],
+            'action_ids': ['metadata:read'],
+        },
+        {
+            'databases': ['project-1', '*-test', 'db?'],
+            'action_ids': ['file:write', 'metadata:read'],
+        },
+        {
+            'databases': ['database1'],
+            'action_ids': [],
+        },
+    ])
+
+    assert policy.get_permitted_actions('database1') == [getattr(ActionType, 'metadata:read')]
+    assert policy.get_permitted_actions('project-1') == [
+        getattr(ActionType, 'metadata:read'),
+        getattr(ActionType, 'file:write'),
+    ]
+    assert policy.get_permitted_actions('project-2') == [getattr(ActionType, 'metadata:read')]
+    assert policy.get_permitted_actions('project-test') == [
+        getattr(ActionType, 'metadata:read'),
+        getattr(ActionType, 'file:write'),
+    ]
+    assert policy.get_permitted_actions('db1') == [
+        getattr(ActionType, 'metadata:read'),
+        getattr(ActionType, 'file:write'),
+    ]
+    assert policy.get_permitted_actions('db10') == []
+    assert policy.get_permitted_actions('project') == []
+
+
+def test_compiled_policy_is_permitted():
+    policy = CompiledPolicy([{
+        'databases': ['database*'],
+        'action_ids': ['metadata'],
+    }])
+
+    assert policy.is_permitted(getattr(ActionType, 'metadata:write:add'), 'database1') is True
+    assert policy.is_permitted(getattr(ActionType, 'metadata'), 'database1') is True
+    assert policy.is_permitted(getattr(ActionType, 'file:read'), 'database1') is False
+    assert policy.is_permitted(getattr(ActionType, 'metadata:read'), 'other') is False
+
+
+def test_compiled_policy_empty():
+    assert not CompiledPolicy([])
+    assert CompiledPolicy([]).get_permitted_actions('database1') == []
+
+
+def test_compiled_policy_filter_permitted_databases():
+    policy = CompiledPolicy([
+        {
+            'databases': ['database1', 'project-*', '*-test'],
+            'action_ids': ['databases:read'],
+        },
+        {
+            'databases': ['database2', 'other-*', 'db?'],
+            'action_ids': ['metadata'],
+        },
+        {
+            'databases': ['database3'],
+            'action_ids': ['databases'],
+        },
+    ])
+    database_ids = ['database1', 'database2', 'database3', 'project-1', 'a-test', 'other-1', 'db1', 'database1']
+
+    assert policy.filter_permitted_databases(getattr(ActionType, 'databases:read'), database_ids) == (
+        ['database1', 'database3', 'project-1', 'a-test', 'database1'],
+        [0, 2, 3, 4, 7],
+    )
+    assert policy.filter_permitted_databases(getattr(ActionType, 'metadata:read'), database_ids) == (
+        ['database2', 'other-1', 'db1'],
+        [1, 5, 6],
+    )
+    assert policy.filter_permitted_databases(getattr(ActionType, 'file:read'), database_ids) == ([], [])
+    assert policy.filter_permitted_databases(getattr(ActionType, 'databases:read'), []) == ([], [])
+
+
+def test_role_index_find_role_ids():
+    role_index = RoleIndex([
+        (1, 'database1', getattr(ActionType, 'file').bit),
+        (2, 'project-*', getattr(ActionType, 'file:write:delete').bit),
+        (3, 'project-[0-9]*', getattr(ActionType, 'file:write').bit),
+        (4, '*-test', getattr(ActionType, 'file:read').bit),
+        (5, 'database1', 0),
+        (6, 'database1', getattr(ActionType, 'metadata').bit),
+    ])
+    action = getattr(ActionType, 'file:write:delete')
+
+    assert role_index.find_role_ids(action, 'database1') == [1]
+    assert role_index.find_role_ids(action, 'project-1') == [2, 3]
+    assert role_index.find_role_ids(action, 'project-a') == [2]
+    assert role_index.find_role_ids(action, 'project-test') == [2]
+    assert role_index.find_role_ids(getattr(ActionType, 'file:read'), 'project-test') == [4]
+    assert role_index.find_role_ids(action, 'project') == []
@@ -0,0 +1,26 @@
+import pytest
+
+from api.models import RoleModel
+from api.search import create_role_search_index, escape_like, find_ranked_role_ids
+
+
+def test_escape_like():
+    assert escape_like('100%_done\\') == '100\\%\\_done\\\\'
+
+
+@pytest.mark.asyncio
+async def test_find_ranked_role_ids():
+    role1 = await RoleModel.create(name='project-alpha', description='')
+    assert await find_ranked_role_ids('alpha') is None
+
+    await create_role_search_index()
+    role2 = await RoleModel.create(name='beta', description='Role for ALPHA project')
+    role3 = await RoleModel.create(name='gamma', description='')
+
+    assert await find_ranked_role_ids('alpha') == [role1.id, role2.id]
+    assert await find_ranked_role_ids('al') is None
+
+    await RoleModel.filter(id=role3.id).update(name='alphabet')
+    await RoleModel.filter(id=role1.id).delete()
+    assert set(await find_ranked_role_ids('alpha')) == {role2.id, role3.id}
+    assert await find_ranked_role_ids('"quoted"') == []
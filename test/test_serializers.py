@@ -0,0 +1,74 @@
+import json
+from types import SimpleNamespace
+
+from api.schemas import (
+    PermittedDatabasesResourceOnGetResponseSchema,
+    RoleDetailSchema,
+    UserSchema,
+    get_schema,
+)
+from api.serializers import StaticResponse, dump_permitted_databases, dump_role_summary, dump_roles, dump_user
+from api.settings import ActionType
+
+
+def make_roles():
+    # PermissionDetailSchema modifies permissions in place
+    return [
+        SimpleNamespace(
+            id=1,
+            name='role1',
+            description='Description of role1',
+            permissions=[
+                {'databases': ['database1', 'project-*'], 'action_ids': ['metadata:read', 'file:write']},
+                {'databases': [], 'action_ids': []},
+            ],
+        ),
+        SimpleNamespace(
+            id=2,
+            name='ロール2',
+            description=None,
+            permissions=[{'databases': ['*'], 'action_ids': ActionType.keys()}],
+        ),
+    ]
+
+
+def test_dump_roles():
+    # Key order of schema dumps depends on the hash seed, so values are compared
+    assert dump_roles(make_roles()) == RoleDetailSchema(many=True).dump(make_roles())
+
+
+def test_dump_role_summary():
+    role_summaries = [{'id': 1, 'name': 'role1', 'description': 'Description of role1'}, {'id': 2, 'name': 'role2'}]
+    schema = RoleDetailSchema(many=True, only=['role_id', 'name', 'description'])
+    for roles in (make_roles(), role_summaries):
+        assert [dump_role_summary(role) for role in roles] == schema.dump(roles)
+
+
+def test_dump_user():
+    users = [
+        {'user_id': 'auth0|1', 'name': 'user1', 'roles': make_roles()},
+        {'user_id': 'auth0|2', 'roles': [{'id': 1, 'name': 'role1', 'description': None}]},
+        {'user_id': 'auth0|3', 'name': 'user3', 'email': 'user3@example.com'},
+    ]
+    assert [dump_user(user) for user in users] == UserSchema(many=True).dump(users)
+
+
+def test_dump_permitted_databases():
+    expected = PermittedDatabasesResourceOnGetResponseSchema().dump({
+        'database_ids': ['database1', 'database3'],
+        'selected_indices': [0, 2],
+    })
+    assert dump_permitted_databases(['database1', 'database3'], [0, 2]) == expected
+
+
+def test_get_schema():
+    assert get_schema(RoleDetailSchema) is get_schema(RoleDetailSchema)
+    assert get_schema(RoleDetailSchema, many=True).many is True
+
+
+def test_static_response():
+    data = {'actions': ActionType.list()}
+    static_response = StaticResponse(data)
+    assert static_response.body == json.dumps(data).encode()
+    assert static_response.etag == StaticResponse(data).etag
+    assert static_response.etag != StaticResponse(ActionType.list()[:1]).etag
@@ -0,0 +1,31 @@
+from api.settings import ActionType
+
+
+def test_action_bits_are_unique():
+    bits = [action.bit for action in ActionType]
+    assert len(set(bits)) == len(bits)
+    assert all(bit & (bit - 1) == 0 for bit in bits)
+
+
+def test_action_hierarchy_masks():
+    metadata = getattr(ActionType, 'metadata')
+    metadata_read = getattr(ActionType, 'metadata:read')
+    metadata_read_public = getattr(ActionType, 'metadata:read:public')
+
+    assert ActionType.from_mask(metadata_read.implies_mask) == [metadata_read, metadata_read_public]
+    assert ActionType.from_mask(metadata_read_public.implied_by_mask) == [
+        metadata,
+        metadata_read,
+        metadata_read_public,
+    ]
+
+    assert metadata_read_public.is_permitted_by(metadata.bit) is True
+    assert metadata_read_public.is_permitted_by(metadata_read_public.bit) is True
+    assert metadata.is_permitted_by(metadata_read.bit) is False
+    assert getattr(ActionType, 'file:read').is_permitted_by(metadata.bit) is False
+
+
+def test_action_masks_round_trip():
+    actions = [getattr(ActionType, 'databases:read'), getattr(ActionType, 'job:execute')]
+    assert ActionType.from_mask(ActionType.to_mask(actions)) == actions
+    assert ActionType.from_mask(0) == []
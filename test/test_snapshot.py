@@ -0,0 +1,60 @@
+import pytest
+
+from api.settings import ActionType
+from api.snapshot import PolicySnapshotEvaluator
+
+SNAPSHOT = {
+    'version': 2,
+    'since': None,
+    'full': True,
+    'roles': [
+        {
+            'role_id': 1,
+            'permissions': [{'databases': ['database1', 'project-*'], 'action_ids': ['metadata:read']}],
+        },
+        {
+            'role_id': 2,
+            'permissions': [{'databases': ['*-test'], 'action_ids': ['databases', 'unknown_action']}],
+        },
+    ],
+    'deleted_role_ids': [],
+    'user_roles': {'test_user_id': [1, 2], 'other_user_id': [2]},
+}
+
+
+def test_policy_snapshot_evaluator():
+    evaluator = PolicySnapshotEvaluator(SNAPSHOT)
+    metadata_read = getattr(ActionType, 'metadata:read')
+
+    assert evaluator.version == 2
+    assert evaluator.get_permitted_actions('test_user_id', 'project-1') == [getattr(ActionType, 'metadata:read')]
+    assert evaluator.is_user_permitted_action('other_user_id', getattr(ActionType, 'databases:write'), 'a-test') is True
+    assert evaluator.is_user_permitted_action('other_user_id', metadata_read, 'database1') is False
+    assert evaluator.get_permitted_actions('unknown_user_id', 'database1') == []
+    assert evaluator.filter_permitted_databases(
+        'test_user_id',
+        getattr(ActionType, 'metadata:read'),
+        ['database1', 'database2', 'project-1'],
+    ) == (['database1', 'project-1'], [0, 2])
+
+
+def test_policy_snapshot_evaluator_apply_delta():
+    evaluator = PolicySnapshotEvaluator(SNAPSHOT)
+    metadata_read = getattr(ActionType, 'metadata:read')
+    assert evaluator.is_user_permitted_action('test_user_id', metadata_read, 'database1') is True
+
+    evaluator.apply({
+        'version': 4,
+        'since': 2,
+        'full': False,
+        'roles': [{'role_id': 3, 'permissions': [{'databases': ['*'], 'action_ids': ['file:read']}]}],
+        'deleted_role_ids': [1],
+        'user_roles': {'test_user_id': [2, 3], 'other_user_id': []},
+    })
+    assert evaluator.version == 4
+    assert evaluator.is_user_permitted_action('test_user_id', metadata_read, 'database1') is False
+    assert evaluator.get_permitted_actions('test_user_id', 'database1') == [getattr(ActionType, 'file:read')]
+    assert evaluator.get_permitted_actions('other_user_id', 'a-test') == []
+
+    with pytest.raises(ValueError):
+        evaluator.apply({**SNAPSHOT, 'full': False, 'since': 3, 'version': 5})
@@ -0,0 +1,84 @@
+import fnmatch
+import sqlite3
+import sys
+
+import pytest
+
+from api.models import RoleModel, UserModel
+from api.settings import ActionType
+from api.sql_evaluation import (
+    filter_permitted_databases_in_sql,
+    to_postgres_like,
+    to_postgres_regex,
+    to_sqlite_glob,
+)
+
+# fnmatch translates empty ranges into invalid regular expressions before Python 3.9
+empty_range = pytest.mark.skipif(sys.version_info < (3, 9), reason='fnmatch cannot match empty ranges')
+DATABASE_PATTERNS = [
+    'database1', 'project-*', '*-test', 'test?single', 'a*b*c', 'x[0-4]y', 'x[!0-4]y',
+    '[]]', '[!]]', '[^a]', '[a-]', pytest.param('[z-a]', marks=empty_range),
+    pytest.param('[!z-a]', marks=empty_range), 'open[', '100%_done', '[*]?',
+]
+DATABASE_IDS = [
+    '', 'database1', 'database12', 'project-', 'project-a', 'a-test', 'test_single', 'testsingle',
+    'abc', 'aXbYc', 'x2y', 'x7y', ']', '^', 'a', '-', 'b', 'open[', '100%_done', '100a_done', '*a', '?a',
+]
+
+
+@pytest.mark.parametrize('database_pattern', DATABASE_PATTERNS)
+def test_to_sqlite_glob(database_pattern):
+    connection = sqlite3.connect(':memory:')
+    glob = to_sqlite_glob(database_pattern)
+    for database_id in DATABASE_IDS:
+        expected = fnmatch.fnmatchcase(database_id, database_pattern)
+        matched = glob is not None and connection.execute('SELECT ? GLOB ?', (database_id, glob)).fetchone()[0]
+        assert bool(matched) == expected, database_id
+
+
+def test_to_sqlite_glob_empty_range():
+    # Empty ranges match nothing, as fnmatch does from Python 3.9
+    assert to_sqlite_glob('[z-a]') is None
+    assert to_sqlite_glob('[!z-a]') == '?'
+
+
+def test_to_postgres_like():
+    assert to_postgres_like('100%_done*') == '100\\%\\_done%'
+    assert to_postgres_like('test?') == 'test_'
+    assert to_postgres_like('x[0-4]') is None
+
+
+def test_to_postgres_regex():
+    assert to_postgres_regex('x[!0-4]*.db') == '^x[^0-4].*\\.db$'
+    assert to_postgres_regex('[]a-]?') == '^[\\]a\\-].$'
+    assert to_postgres_regex('[z-a]') is None
+
+
+@pytest.mark.asyncio
+async def test_filter_permitted_databases_in_sql():
+    role1 = await RoleModel.create(
+        name='role1',
+        permissions=[{
+            'databases': ['database1', 'project-*', 'x[!0-4]y'],
+            'action_ids': ['databases:read'],
+        }],
+    )
+    role2 = await RoleModel.create(
+        name='role2',
+        permissions=[{
+            'databases': ['*-test'],
+            'action_ids': ['databases'],
+        }, {
+            'databases': ['*'],
+            'action_ids': ['metadata'],
+        }],
+    )
+    user = await UserModel.create(id='test_user_id')
+    await user.set_roles([role1, role2])
+
+    action = getattr(ActionType, 'databases:read')
+    database_ids = ['database1', 'database2', 'project-a', 'x2y', 'x7y', 'a-test']
+    expected = (['database1', 'project-a', 'x7y', 'a-test'], [0, 2, 4, 5])
+    assert await filter_permitted_databases_in_sql('test_user_id', action, database_ids) == expected
+    assert await filter_permitted_databases_in_sql('test_user_id', action, database_ids, values_limit=2) == expected
+    assert await filter_permitted_databases_in_sql('unknown_user_id', action, database_ids) == ([], [])
@@ -1,6 +1,17 @@
 import pytest
 
-from api.utils import match_exist_in_databases
+from api.utils import (
+    DatabasePatternMatcher,
+    decode_cursor,
+    encode_cursor,
+    get_database_pattern_matcher,
+    is_etag_matched,
+    iterate_file,
+    iterate_ndjson_chunks,
+    make_etag,
+    match_exist_in_databases,
+    spool_byte_stream,
+)
 
 
 def test_match_exist_in_databases():
@@ -33,3 +44,87 @@ def test_match_exist_in_databases():
         'database9',
         ['database?', 'database1', 'database2', 'database3'],
     ) is True
+
+
+def test_database_pattern_matcher():
+    matcher = DatabasePatternMatcher(['database*', '*test', 'db?', '[ab]x', 'database1'])
+    assert len(matcher) == 5
+
+    assert matcher.matches('database1') is True
+    assert matcher.matched_indices('database1') == [0, 4]
+    assert matcher.matched_indices('database_test') == [0, 1]
+    assert matcher.matched_indices('db1') == [2]
+    assert matcher.matched_indices('bx') == [3]
+    assert matcher.matches('cx') is False
+    assert matcher.matched_indices('cx') == []
+
+    empty_matcher = DatabasePatternMatcher([])
+    assert empty_matcher.matches('database1') is False
+    assert empty_matcher.matched_indices('database1') == []
+
+
+def test_get_database_pattern_matcher_cached():
+    patterns = ('database*', '*test')
+    assert get_database_pattern_matcher(patterns) is get_database_pattern_matcher(tuple(list(patterns)))
+
+
+@pytest.mark.asyncio
+async def test_iterate_ndjson_chunks():
+    async def byte_stream():
+        for data in [b'"database1"\n"data', b'base2"\n\n', b'"database3"\n"database4"']:
+            yield data
+
+    chunks = [chunk async for chunk in iterate_ndjson_chunks(byte_stream(), 3)]
+    assert chunks == [['database1', 'database2', 'database3'], ['database4']]
+
+
+@pytest.mark.asyncio
+async def test_iterate_ndjson_chunks_invalid_line():
+    async def byte_stream():
+        yield b'"database1"\n"database2"\nnot json\n"database3"'
+
+    chunks = []
+    with pytest.raises(ValueError):
+        async for chunk in iterate_ndjson_chunks(byte_stream(), 3):
+            chunks.append(chunk)
+    assert chunks == [['database1', 'database2']]
+
+
+@pytest.mark.asyncio
+async def test_spool_byte_stream():
+    async def byte_stream():
+        for i in range(100):
+            yield '"database{}"\n'.format(i).encode()
+
+    file = await spool_byte_stream(byte_stream(), 64)
+    # Moved to disk once larger than max_size
+    assert file._rolled is True
+    with file:
+        blocks = [data async for data in iterate_file(file, 100)]
+    assert all(len(data) <= 100 for data in blocks)
+    assert b''.join(blocks) == b''.join('"database{}"\n'.format(i).encode() for i in range(100))
+
+
+def test_cursor():
+    assert decode_cursor(encode_cursor({'id': 10})) == {'id': 10}
+
+    with pytest.raises(ValueError):
+        decode_cursor('invalid cursor')
+
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor([10]))
+
+
+def test_etag():
+    etag = make_etag(3, '/roles?page=1', '')
+    assert etag.startswith('"3-') and etag.endswith('"')
+    assert make_etag(3, '/roles?page=1', '') == etag
+    assert make_etag(4, '/roles?page=1', '') != etag
+    assert make_etag(3, '/roles?page=1', 'Bearer token') != etag
+    assert make_etag(3, '/roles?page=', '1') != etag
+
+    assert is_etag_matched(etag, etag) is True
+    assert is_etag_matched('"other", W/{}'.format(etag), etag) is True
+    assert is_etag_matched('*', etag) is True
+    assert is_etag_matched('"other"', etag) is False
+    assert is_etag_matched(None, etag) is False